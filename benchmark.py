@@ -0,0 +1,598 @@
+"""
+Benchmark offline do GeminiOCR: PDFs sintéticos e um modelo falso
+
+Mede páginas/s, latência por página (p50/p95/p99), pico de memória (RSS)
+e bytes gravados do process_document em várias concorrências, sem gastar
+cota da API. Cada configuração roda em um subprocesso próprio, para que o
+pico de RSS de uma não contamine a seguinte.
+
+Uso:
+    python benchmark.py --pages 50 --concurrency 1 4 16 --output atual.json
+    python benchmark.py --pages 50 --concurrency 1 4 16 --baseline anterior.json
+
+Com --baseline, o comando termina com código 1 se páginas/s ou a latência
+p95 piorarem mais que --tolerance em relação ao resultado anterior.
+
+Com --throttle-rate, parte das chamadas é recusada com 429, como quando a
+cota da API se esgota: o relatório mostra as novas tentativas, quantas
+vezes o RequestScheduler reduziu ou aumentou a concorrência e o menor
+limite atingido.
+
+Com --cascade, as páginas vão primeiro a um modelo falso mais rápido e
+barato, que devolve LaTeX quebrado em --fast-malformed-rate das chamadas,
+e só sobem para o modelo normal quando necessário; o custo estimado de
+cada execução (tokens x --price/--fast-price por milhão) permite comparar
+com a execução sem cascata:
+    python benchmark.py --concurrency 4 --output forte.json
+    python benchmark.py --concurrency 4 --cascade --output cascata.json
+
+Com --tail-alpha, a latência do modelo falso ganha uma cauda pesada
+(Pareto); --hedge-budget duplica as chamadas mais lentas que o p95 (ver
+hedging.py), e o relatório traz quantas cópias foram enviadas e quantas
+responderam primeiro:
+    python benchmark.py --concurrency 8 --tail-alpha 1.5 --output cauda.json
+    python benchmark.py --concurrency 8 --tail-alpha 1.5 --hedge-budget 0.1 --output copias.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+WORDS = (
+    "função derivada integral limite matriz vetor espaço conjunto número "
+    "teorema prova sequência série contínua intervalo valor médio ponto "
+    "onde seja então portanto existe todo para com sem que uma são pela"
+).split()
+
+FORMULAS = (
+    "f(x) = x^2 + 2x + 1",
+    "lim (1 + 1/n)^n = e",
+    "a^2 + b^2 = c^2",
+    "sum k = n(n + 1)/2",
+    "det(A - tI) = 0",
+)
+
+# Espaçamento entre linhas do texto sintético, em pontos
+LINE_HEIGHT = 14
+
+# Tokens contados por imagem pelo modelo falso
+IMAGE_TOKENS = 258
+
+
+def make_synthetic_pdf(path, pages=20, density=0.5, seed=0):
+    """
+    Gera um PDF com `pages` páginas de texto sintético
+
+    density (0 a 1) é a fração das linhas da página preenchidas; parte
+    das linhas traz fórmulas, como nas apostilas processadas.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    document = fitz.open()
+    try:
+        for _ in range(pages):
+            page = document.new_page()
+            max_lines = int((page.rect.height - 100) / LINE_HEIGHT)
+            for line in range(int(max_lines * density)):
+                if rng.random() < 0.15:
+                    text = rng.choice(FORMULAS)
+                else:
+                    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 14)))
+                page.insert_text((50, 60 + line * LINE_HEIGHT), text, fontsize=10)
+        document.save(path)
+    finally:
+        document.close()
+    return path
+
+
+class FakeAPIError(Exception):
+    """Falha temporária simulada; o RequestScheduler tenta novamente"""
+
+    def __init__(self, code=503):
+        super().__init__(f"{code} falha simulada")
+        self.code = code
+
+
+class FakeGeminiModel:
+    """
+    Substituto do genai.GenerativeModel, sem acesso à rede
+
+    Cada chamada espera latency ± jitter segundos, falha com probabilidade
+    error_rate (erro 503), é recusada de imediato por limite de uso com
+    probabilidade throttle_rate (erro 429, que reduz a concorrência do
+    RequestScheduler) e devolve cerca de response_chars caracteres por
+    página, com usage_metadata estimado; com probabilidade malformed_rate a
+    resposta termina no meio de uma fórmula (como um modelo mais fraco).
+    Com tail_alpha (ex.: 1.5), a latência sorteada é multiplicada por uma
+    variável de Pareto com esse expoente (mínimo 1): a maioria das chamadas
+    fica perto de latency, e algumas demoram muitas vezes mais.
+    Chamadas com várias páginas recebem os marcadores ===PÁGINA n===
+    esperados pelo GeminiOCR. tokens soma os tokens de todas as chamadas,
+    errors os erros 503 e throttled os 429.
+    """
+
+    def __init__(
+        self,
+        latency=0.3,
+        jitter=0.1,
+        error_rate=0.0,
+        response_chars=2000,
+        seed=None,
+        malformed_rate=0.0,
+        tail_alpha=None,
+        throttle_rate=0.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self.malformed_rate = malformed_rate
+        self.tail_alpha = tail_alpha
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        chunk = (
+            "Seja $f(x) = \\frac{1}{x}$ definida para $x \\neq 0$. "
+            "Então $f'(x) = -\\frac{1}{x^2}$ e a integral vale $\\ln|x| + C$. "
+            "A função não está definida na origem, e por isso o seu gráfico tem "
+            "uma assíntota vertical no eixo das ordenadas.\n"
+        )
+        # Trechos inteiros, para que as fórmulas fiquem fechadas
+        self._page_text = chunk * max(1, round(response_chars / len(chunk)))
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.tokens = 0
+
+    def _next_call(self):
+        """Sorteia a duração e o resultado da próxima chamada"""
+        with self._lock:
+            self.calls += 1
+            delay = self._random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+            if self.tail_alpha:
+                delay *= self._random.paretovariate(self.tail_alpha)
+            failed = self._random.random() < self.error_rate
+            malformed = self._random.random() < self.malformed_rate
+            self.errors += int(failed)
+            # Sorteio só quando ativado, para não mudar as sequências anteriores
+            throttled = bool(self.throttle_rate) and self._random.random() < self.throttle_rate
+            self.throttled += int(throttled)
+        if throttled:
+            return 0.0, 429, False
+        return max(0.0, delay), 503 if failed else None, malformed
+
+    def _respond(self, parts, malformed=False):
+        labels = [
+            part.split()[1].rstrip(":")
+            for part in parts
+            if isinstance(part, str) and part.startswith("Página ")
+        ]
+        if labels:
+            text = "\n".join(f"===PÁGINA {label}===\n{self._page_text}" for label in labels)
+        else:
+            text = self._page_text
+        if malformed:
+            text += "$\\frac{1}{"
+        prompt_tokens = sum(
+            len(part) // 4 if isinstance(part, str) else IMAGE_TOKENS for part in parts
+        )
+        output_tokens = len(text) // 4
+        with self._lock:
+            self.tokens += prompt_tokens + output_tokens
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+    def generate_content(self, parts, **kwargs):
+        delay, error, malformed = self._next_call()
+        time.sleep(delay)
+        if error:
+            raise FakeAPIError(error)
+        return self._respond(parts, malformed)
+
+    async def generate_content_async(self, parts, **kwargs):
+        delay, error, malformed = self._next_call()
+        await asyncio.sleep(delay)
+        if error:
+            raise FakeAPIError(error)
+        return self._respond(parts, malformed)
+
+
+def percentile(values, fraction):
+    """Percentil com interpolação linear (fraction entre 0 e 1)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _bytes_written():
+    """Bytes gravados pelo processo até agora (Linux), ou None"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb(who):
+    import resource
+
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss é dado em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def run_setting(
+    pdf_path,
+    concurrency,
+    mode="threads",
+    model_options=None,
+    ocr_options=None,
+    cascade_options=None,
+    hedge_options=None,
+):
+    """
+    Processa o PDF uma vez com o modelo falso e devolve as medidas
+
+    Deve ser chamada em um processo novo (ver run_benchmark), pois o pico
+    de RSS vale para o processo inteiro. As latências por página vêm do
+    manifesto (started_at/finished_at de cada página); o tempo por estágio
+    vem do resumo do documento em metrics. cascade_options é a lista dos
+    níveis da cascata ({"name", "price" e opções do modelo falso}, do mais
+    barato ao mais forte); sem ela, um único modelo de preço "price" em
+    model_options. hedge_options são as opções da HedgePolicy (None
+    desativa as cópias de chamadas lentas).
+    """
+    import resource
+
+    from cascade import ModelCascade, ModelTier
+    from hedging import HedgePolicy
+    from main import GeminiOCR
+    from metrics import Metrics
+    from scheduler import RequestScheduler
+
+    summaries = []
+
+    def keep_summary(event, metrics):
+        if event["event"] == "document":
+            summaries.append(event)
+
+    model_options = dict(model_options or {})
+    price = model_options.pop("price", 0.0)
+    cascade = None
+    if cascade_options:
+        tiers = []
+        for options in cascade_options:
+            options = dict(model_options, **options)
+            name, tier_price = options.pop("name"), options.pop("price", 0.0)
+            tiers.append(ModelTier(name, FakeGeminiModel(**options), tier_price))
+        cascade = ModelCascade(tiers)
+        models = [(tier.model, tier.price_per_million_tokens) for tier in tiers]
+        model = None
+    else:
+        model = FakeGeminiModel(**model_options)
+        models = [(model, price)]
+    hedging = (
+        # Pool com folga para a original e a cópia de cada worker
+        HedgePolicy(**dict({"max_workers": 2 * concurrency}, **hedge_options))
+        if hedge_options is not None
+        else None
+    )
+    ocr = GeminiOCR(
+        "benchmark",
+        model=model,
+        cascade=cascade,
+        hedging=hedging,
+        max_workers=concurrency,
+        # Limite de concorrência igual ao número de workers, como na linha
+        # de comando, para que os 429 reduzam de fato as chamadas simultâneas
+        scheduler=RequestScheduler(base_delay=0.05, max_delay=1.0, max_concurrency=concurrency),
+        metrics=Metrics([keep_summary]),
+        **(ocr_options or {}),
+    )
+
+    written = _bytes_written()
+    start = time.perf_counter()
+    try:
+        if mode == "asyncio":
+            asyncio.run(ocr.process_document_async(pdf_path))
+        else:
+            ocr.process_document(pdf_path)
+    finally:
+        ocr.close()
+    elapsed = time.perf_counter() - start
+    if written is not None:
+        written = _bytes_written() - written
+
+    base_path = os.path.splitext(pdf_path)[0]
+    done_pages = set()
+    latencies = []
+    with open(f"{base_path}_manifesto.jsonl", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["status"] != "done":
+                continue
+            done_pages.add(entry["page"])
+            if entry.get("started_at"):
+                latencies.append(entry["finished_at"] - entry["started_at"])
+
+    output_dir = os.path.dirname(pdf_path)
+    output_bytes = sum(
+        os.path.getsize(os.path.join(output_dir, name))
+        for name in os.listdir(output_dir)
+        if os.path.join(output_dir, name) != pdf_path
+    )
+
+    return {
+        "concurrency": concurrency,
+        "mode": mode,
+        "pages": len(done_pages),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(done_pages) / elapsed, 3),
+        "latency_p50": _round(percentile(latencies, 0.50)),
+        "latency_p95": _round(percentile(latencies, 0.95)),
+        "latency_p99": _round(percentile(latencies, 0.99)),
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "bytes_written": written,
+        "output_bytes": output_bytes,
+        "model_calls": sum(fake.calls for fake, _ in models),
+        "model_errors": sum(fake.errors for fake, _ in models),
+        "cost": round(sum(fake.tokens * price / 1e6 for fake, price in models), 6),
+        "tiers": cascade.summary()["tiers"] if cascade else None,
+        "model_throttled": sum(fake.throttled for fake, _ in models),
+        "api_retries": ocr.scheduler.retries,
+        "api_throttled": ocr.scheduler.throttled,
+        "concurrency_decreases": ocr.scheduler.decreases,
+        "concurrency_increases": ocr.scheduler.increases,
+        "min_concurrency_reached": ocr.scheduler.lowest_concurrency,
+        "final_concurrency": ocr.scheduler.concurrency,
+        "hedging": hedging.summary() if hedging else None,
+        "stages": summaries[-1]["stages"] if summaries else {},
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def run_benchmark(
+    pages=40,
+    density=0.5,
+    concurrency=(1, 4, 16),
+    mode="threads",
+    model_options=None,
+    ocr_options=None,
+    seed=0,
+    cascade_options=None,
+    hedge_options=None,
+):
+    """Executa cada concorrência em um subprocesso e devolve o relatório"""
+    work_dir = tempfile.mkdtemp(prefix="gemini_ocr_bench_")
+    try:
+        source_pdf = make_synthetic_pdf(
+            os.path.join(work_dir, "fonte.pdf"), pages=pages, density=density, seed=seed
+        )
+        results = []
+        for workers in concurrency:
+            # Cada execução usa um diretório limpo (sem progresso anterior)
+            run_dir = os.path.join(work_dir, f"c{workers}")
+            os.mkdir(run_dir)
+            pdf_path = shutil.copy(source_pdf, os.path.join(run_dir, "documento.pdf"))
+            result_path = os.path.join(run_dir, "resultado.json")
+            spec = {
+                "pdf_path": pdf_path,
+                "concurrency": workers,
+                "mode": mode,
+                "model_options": model_options or {},
+                "ocr_options": ocr_options or {},
+                "cascade_options": cascade_options,
+                "hedge_options": hedge_options,
+                "result_path": result_path,
+            }
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-one", json.dumps(spec)],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+            with open(result_path, encoding="utf-8") as f:
+                result = json.load(f)
+            results.append(result)
+            print(
+                f"concorrência {workers:>3}: {result['pages_per_second']:>8.2f} páginas/s, "
+                f"p95 {result['latency_p95']}s, RSS {result['peak_rss_mb']} MB, "
+                f"custo {result['cost']}, {result['api_retries']} novas tentativas "
+                f"({result['api_throttled']} por 429, concorrência mínima "
+                f"{result['min_concurrency_reached']})",
+                file=sys.stderr,
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": {
+            "pages": pages,
+            "density": density,
+            "mode": mode,
+            "seed": seed,
+            "model": model_options or {},
+            "ocr": ocr_options or {},
+            "cascade": cascade_options,
+            "hedging": hedge_options,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "created_at": time.time(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Lista as regressões em relação a um relatório anterior: queda de
+    páginas/s ou aumento da latência p95 acima de tolerance (fração)
+    """
+    previous = {result["concurrency"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["concurrency"])
+        if old is None:
+            continue
+        if result["pages_per_second"] < old["pages_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"concorrência {result['concurrency']}: páginas/s caiu de "
+                f"{old['pages_per_second']} para {result['pages_per_second']}"
+            )
+        if (
+            result["latency_p95"] is not None
+            and old["latency_p95"] is not None
+            and result["latency_p95"] > old["latency_p95"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"concorrência {result['concurrency']}: latência p95 subiu de "
+                f"{old['latency_p95']}s para {result['latency_p95']}s"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--density", type=float, default=0.5, help="fração das linhas preenchidas")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mode", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--latency", type=float, default=0.3, help="latência média do modelo (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="variação da latência (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de chamadas com erro 503")
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="fração de chamadas recusadas com 429"
+    )
+    parser.add_argument("--response-chars", type=int, default=2000)
+    parser.add_argument("--render-workers", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--streaming", action="store_true", help="modo streaming do GeminiOCR (documentos grandes)"
+    )
+    parser.add_argument("--price", type=float, default=5.0, help="preço por milhão de tokens")
+    parser.add_argument(
+        "--cascade", action="store_true", help="modelo rápido primeiro, o normal só quando necessário"
+    )
+    parser.add_argument("--fast-latency", type=float, default=0.1, help="latência do modelo rápido (s)")
+    parser.add_argument(
+        "--fast-malformed-rate", type=float, default=0.1, help="fração de LaTeX quebrado no modelo rápido"
+    )
+    parser.add_argument("--fast-price", type=float, default=0.3, help="preço do modelo rápido")
+    parser.add_argument(
+        "--tail-alpha", type=float, help="cauda pesada (Pareto) na latência, ex.: 1.5"
+    )
+    parser.add_argument(
+        "--hedge-budget", type=float, help="duplica as chamadas lentas, até esta fração a mais"
+    )
+    parser.add_argument("--hedge-quantile", type=float, default=0.95, help="limiar das cópias")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="arquivo JSON do relatório (padrão: saída padrão)")
+    parser.add_argument("--baseline", help="relatório anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        # Execução isolada, disparada por run_benchmark
+        spec = json.loads(args.run_one)
+        result = run_setting(
+            spec["pdf_path"],
+            spec["concurrency"],
+            spec["mode"],
+            spec["model_options"],
+            spec["ocr_options"],
+            spec["cascade_options"],
+            spec["hedge_options"],
+        )
+        with open(spec["result_path"], "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    report = run_benchmark(
+        pages=args.pages,
+        density=args.density,
+        concurrency=args.concurrency,
+        mode=args.mode,
+        model_options={
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "response_chars": args.response_chars,
+            "seed": args.seed,
+            "price": args.price,
+            "tail_alpha": args.tail_alpha,
+        },
+        ocr_options={
+            "render_workers": args.render_workers,
+            "batch_size": args.batch_size,
+            "streaming": args.streaming,
+        },
+        seed=args.seed,
+        cascade_options=[
+            {
+                "name": "rapido",
+                "latency": args.fast_latency,
+                "jitter": min(args.jitter, args.fast_latency),
+                "malformed_rate": args.fast_malformed_rate,
+                "price": args.fast_price,
+            },
+            {"name": "forte", "price": args.price},
+        ]
+        if args.cascade
+        else None,
+        hedge_options={"budget": args.hedge_budget, "quantile": args.hedge_quantile}
+        if args.hedge_budget
+        else None,
+    )
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regressão: {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
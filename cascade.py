@@ -0,0 +1,125 @@
+"""
+Cascata de modelos: cada página vai primeiro ao modelo mais rápido e
+barato, e só as páginas difíceis sobem para um modelo mais forte
+"""
+
+import threading
+
+from validation import PageValidator, math_density
+
+# Motivos para refazer uma página no nível seguinte da cascata
+ESCALATION_RULES = (
+    "short_output",
+    "malformed_latex",
+    "encoding_artifacts",
+    "text_ink_mismatch",
+    "math_density",
+)
+
+# Problema apontado pelo PageValidator -> regra de escalonamento
+_FLAG_RULES = {
+    "empty": "short_output",
+    "unbalanced_math": "malformed_latex",
+    "unbalanced_braces": "malformed_latex",
+    "broken_frac": "malformed_latex",
+    "unbalanced_environment": "malformed_latex",
+    "encoding_artifacts": "encoding_artifacts",
+    "low_text_density": "text_ink_mismatch",
+}
+
+
+class ModelTier:
+    """
+    Um nível da cascata: name é o nome do modelo (também usado na chave
+    do cache) e model o objeto com generate_content (e
+    generate_content_async); None cria o genai.GenerativeModel de name.
+    price_per_million_tokens serve apenas para estimar o custo de cada
+    nível (ver ModelCascade.summary).
+    """
+
+    def __init__(self, name, model=None, price_per_million_tokens=0.0):
+        self.name = name
+        self.model = model
+        self.price_per_million_tokens = price_per_million_tokens
+
+    def __repr__(self):
+        return f"ModelTier({self.name!r})"
+
+
+class ModelCascade:
+    """
+    Níveis de modelos, do mais rápido e barato ao mais forte, e as regras
+    que fazem uma página subir de nível
+
+    A resposta de um nível é aceita se nenhuma das regras em rules disparar:
+    "short_output" (texto vazio ou curto), "malformed_latex" ($, chaves,
+    \\frac ou \\begin/\\end quebrados), "encoding_artifacts",
+    "text_ink_mismatch" (pouco texto para a tinta da página) e
+    "math_density" (mais de max_math_density do texto em fórmulas, quando
+    há um nível acima: páginas de fórmulas densas vão para o modelo mais
+    forte mesmo sem erro aparente). As regras dos problemas de texto usam
+    o validator (PageValidator). A resposta do último nível é sempre aceita.
+
+    Da imagem da página só entra a cobertura de tinta (em
+    "text_ink_mismatch"): "math_density" mede as fórmulas no texto que o
+    nível devolveu, não na imagem. A assinatura do PageRenderer (hash
+    perceptual e tinta) não distingue uma página de fórmulas de uma de
+    prosa com a mesma tinta, então uma página de matemática densa ainda
+    passa pelo primeiro nível antes de subir.
+    """
+
+    def __init__(self, tiers, rules=ESCALATION_RULES, validator=None, max_math_density=0.3):
+        self.tiers = list(tiers)
+        if not self.tiers:
+            raise ValueError("Informe ao menos um nível de modelo")
+        unknown = set(rules) - set(ESCALATION_RULES)
+        if unknown:
+            raise ValueError(f"Regras de escalonamento desconhecidas: {', '.join(sorted(unknown))}")
+        self.rules = tuple(rules)
+        self.validator = validator or PageValidator()
+        self.max_math_density = max_math_density
+        # Chamadas, páginas aceitas e tokens de cada nível
+        self._usage = {tier.name: {"calls": 0, "pages": 0, "tokens": 0} for tier in self.tiers}
+        self._lock = threading.Lock()
+
+    def escalation_reasons(self, raw_text, text, ink=None):
+        """
+        Regras disparadas pela resposta de um nível (texto bruto do modelo
+        e texto limpo), na ordem de ESCALATION_RULES; vazia se a resposta
+        pode ser aceita
+        """
+        flags = self.validator.validate(raw_text, text, ink)["quality_flags"]
+        reasons = {_FLAG_RULES[flag] for flag in flags if flag in _FLAG_RULES}
+        if (
+            self.max_math_density is not None
+            and "short_output" not in reasons
+            and math_density(text) > self.max_math_density
+        ):
+            reasons.add("math_density")
+        return [rule for rule in ESCALATION_RULES if rule in reasons and rule in self.rules]
+
+    def record_call(self, tier, tokens=0):
+        """Contabiliza uma chamada ao nível e os tokens informados pela API"""
+        with self._lock:
+            self._usage[tier.name]["calls"] += 1
+            self._usage[tier.name]["tokens"] += tokens or 0
+
+    def record_page(self, tier):
+        """Contabiliza uma página cuja resposta foi aceita no nível"""
+        with self._lock:
+            self._usage[tier.name]["pages"] += 1
+
+    def summary(self):
+        """
+        Chamadas, páginas, tokens e custo estimado de cada nível desde a
+        criação da cascata, e o custo total: {"tiers": {...}, "cost": total}
+        """
+        with self._lock:
+            tiers = {
+                tier.name: dict(
+                    self._usage[tier.name],
+                    cost=self._usage[tier.name]["tokens"] * tier.price_per_million_tokens / 1e6,
+                )
+                for tier in self.tiers
+            }
+        return {"tiers": tiers, "cost": sum(usage["cost"] for usage in tiers.values())}
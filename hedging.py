@@ -0,0 +1,194 @@
+"""
+Requisições duplicadas (hedging): uma chamada ao modelo que demora mais
+que o normal ganha uma cópia, e vale a primeira resposta
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class HedgePolicy:
+    """
+    Decide quando duplicar uma chamada lenta e executa as duas
+
+    O limiar é adaptativo: o quantil quantile (0.95 = p95) das latências
+    das últimas window chamadas, a partir de min_samples chamadas (antes
+    disso nada é duplicado), e nunca abaixo de min_delay segundos. Uma
+    chamada que passa do limiar recebe uma cópia; vale a primeira resposta
+    bem-sucedida, e a outra é cancelada. budget limita as cópias a essa
+    fração das chamadas (0.05 = no máximo 5% de requisições a mais). Uma
+    chamada respondida pela cópia entra nas latências com o tempo que
+    esperou até então, para que a cauda continue representada.
+
+    Com threads, depois do aquecimento a original e a cópia rodam em um
+    pool de max_workers threads (use ao menos o dobro das chamadas
+    simultâneas, para que nenhuma fique na fila), e quem chama recebe a
+    primeira resposta sem esperar a outra. Uma requisição em andamento não
+    pode ser interrompida: a perdedora termina em segundo plano, mas não
+    tenta de novo (ver scheduler.RequestScheduler.call). close encerra o
+    pool e deve ser chamado uma vez, quando ninguém mais usa a política.
+    """
+
+    def __init__(
+        self, quantile=0.95, budget=0.05, min_samples=20, window=200, min_delay=0.0, max_workers=32
+    ):
+        self.quantile = quantile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # Contadores para o resumo da execução
+        self.requests = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def threshold(self):
+        """Limiar atual em segundos, ou None enquanto há poucas medidas"""
+        with self._lock:
+            if len(self._latencies) < max(1, self.min_samples):
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _start(self):
+        with self._lock:
+            self.requests += 1
+        return self.threshold()
+
+    def _try_hedge(self):
+        """Reserva uma cópia, se o orçamento permitir"""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _finish(self, seconds, hedge_won=False):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.hedges_won += int(hedge_won)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hedge"
+                )
+            return self._executor
+
+    def call(self, fn, on_hedge=None):
+        """
+        Executa fn(cancelled) (a chamada completa, com as novas tentativas)
+        e, se ela passar do limiar, uma cópia em paralelo; devolve a
+        primeira resposta bem-sucedida e só levanta a exceção se as duas
+        falharem. cancelled é um threading.Event ligado quando a outra
+        cópia já respondeu: fn deve então desistir (levantando
+        concurrent.futures.CancelledError) em vez de tentar de novo.
+        on_hedge(won), se informada, é chamada para cada cópia enviada,
+        com won=True se a resposta usada foi a dela.
+        """
+        delay = self._start()
+        started = time.monotonic()
+        if delay is None:
+            # Aquecimento: nada a duplicar, a chamada roda na própria thread
+            result = fn(threading.Event())
+            self._finish(time.monotonic() - started)
+            return result
+
+        executor = self._get_executor()
+        primary_cancelled = threading.Event()
+        primary = executor.submit(fn, primary_cancelled)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._try_hedge():
+            result = primary.result()
+            self._finish(time.monotonic() - started)
+            return result
+
+        hedge_cancelled = threading.Event()
+        hedge = executor.submit(fn, hedge_cancelled)
+        cancelled = {primary: primary_cancelled, hedge: hedge_cancelled}
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Se as duas terminaram juntas, vale a original
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    for loser in pending:
+                        cancelled[loser].set()
+                    won = future is hedge
+                    self._finish(time.monotonic() - started, won)
+                    if on_hedge is not None:
+                        on_hedge(won)
+                    return future.result()
+            if not pending:
+                if on_hedge is not None:
+                    on_hedge(False)
+                return primary.result()
+
+    async def call_async(self, fn, on_hedge=None):
+        """Versão assíncrona de call: fn() deve retornar um awaitable"""
+        delay = self._start()
+        started = time.monotonic()
+        if delay is None:
+            result = await fn()
+            self._finish(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(fn())
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._try_hedge():
+                result = await primary
+                self._finish(time.monotonic() - started)
+                return result
+        except BaseException:
+            primary.cancel()
+            raise
+
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, hedge):
+                    if task in done and not task.cancelled() and task.exception() is None:
+                        won = task is hedge
+                        self._finish(time.monotonic() - started, won)
+                        if on_hedge is not None:
+                            on_hedge(won)
+                        return task.result()
+                if not pending:
+                    if on_hedge is not None:
+                        on_hedge(False)
+                    return primary.result()
+        finally:
+            # A perdedora (ou as duas, se a tarefa foi cancelada) é cancelada
+            for task in pending:
+                task.cancel()
+
+    def summary(self):
+        """Chamadas, cópias enviadas, cópias vencedoras e o limiar atual"""
+        with self._lock:
+            counts = {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedges_won": self.hedges_won,
+            }
+        threshold = self.threshold()
+        counts["threshold"] = None if threshold is None else round(threshold, 4)
+        return counts
+
+    def close(self):
+        """Encerra as threads das chamadas (as perdedoras não são esperadas)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,107 @@
+"""
+Codificação da imagem de cada página enviada ao modelo
+"""
+
+from io import BytesIO
+
+# Resolução base do PDF (pontos por polegada)
+PDF_DPI = 72
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class PageImageEncoder:
+    """
+    Rasteriza uma página e produz os bytes enviados à API
+
+    dpi define a resolução (144 equivale ao antigo fitz.Matrix(2, 2));
+    color pode ser "rgb", "gray" ou "bilevel" (preto e branco);
+    image_format pode ser "png", "jpeg" ou "webp", com quality para os
+    formatos com perdas; max_dimension limita o maior lado da imagem,
+    reduzindo a resolução já na rasterização.
+
+    Sempre que possível a imagem é codificada direto do pixmap pelo
+    PyMuPDF; o Pillow só é usado (a partir de pix.samples, sem passar
+    por PNG) para WebP e para a conversão em preto e branco.
+    """
+
+    def __init__(
+        self,
+        dpi=144,
+        color="rgb",
+        image_format="png",
+        quality=85,
+        max_dimension=None,
+        bilevel_threshold=160,
+    ):
+        if color not in ("rgb", "gray", "bilevel"):
+            raise ValueError(f"Modo de cor inválido: {color}")
+        if image_format not in MIME_TYPES:
+            raise ValueError(f"Formato de imagem inválido: {image_format}")
+        self.dpi = dpi
+        self.color = color
+        self.image_format = image_format
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.bilevel_threshold = bilevel_threshold
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.image_format]
+
+    def render(self, page, clip=None):
+        """
+        Rasteriza a página respeitando dpi, cor e dimensão máxima; clip
+        (fitz.Rect, em pontos) rasteriza só uma região, na mesma escala
+        """
+        import fitz  # PyMuPDF
+
+        zoom = self.dpi / PDF_DPI
+        if self.max_dimension:
+            largest_side = max(page.rect.width, page.rect.height) * zoom
+            if largest_side > self.max_dimension:
+                zoom *= self.max_dimension / largest_side
+
+        colorspace = fitz.csRGB if self.color == "rgb" else fitz.csGRAY
+        return page.get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False, clip=clip
+        )
+
+    def to_image(self, pix):
+        """Cria a imagem PIL diretamente dos bytes do pixmap"""
+        from PIL import Image
+
+        mode = "RGB" if pix.n == 3 else "L"
+        return Image.frombytes(
+            mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride
+        )
+
+    def encode_pixmap(self, pix):
+        """Codifica o pixmap no formato configurado"""
+        if self.color != "bilevel" and self.image_format == "png":
+            return pix.tobytes("png")
+        if self.color != "bilevel" and self.image_format == "jpeg":
+            return pix.tobytes("jpeg", jpg_quality=self.quality)
+
+        image = self.to_image(pix)
+        if self.color == "bilevel":
+            threshold = self.bilevel_threshold
+            image = image.point(lambda value: 255 if value >= threshold else 0, mode="1")
+
+        buffer = BytesIO()
+        if self.image_format == "png":
+            image.save(buffer, format="PNG", optimize=True)
+        elif self.image_format == "jpeg":
+            image.convert("L").save(buffer, format="JPEG", quality=self.quality)
+        else:
+            image.save(buffer, format="WEBP", quality=self.quality)
+        return buffer.getvalue()
+
+    def encode_page(self, page):
+        """
+        Rasteriza e codifica a página, devolvendo o blob aceito pelo SDK
+        ({"mime_type", "data"}), sem decodificar a imagem novamente
+        """
+        pix = self.render(page)
+        data = self.encode_pixmap(pix)
+        return {"mime_type": self.mime_type, "data": data}
@@ -0,0 +1,296 @@
+"""
+Fila persistente (SQLite) de documentos e execução em lote
+"""
+
+import asyncio
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from sharding import document_output_base
+
+# Extensões aceitas ao expandir diretórios
+DOCUMENT_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+DEFAULT_QUEUE_PATH = "gemini_ocr_fila.sqlite3"
+
+
+def collect_documents(patterns):
+    """
+    Expande diretórios (recursivamente) e padrões glob em uma lista
+    ordenada, sem repetições, de PDFs e imagens
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        found.add(os.path.join(root, name))
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(DOCUMENT_EXTENSIONS):
+                    found.add(path)
+    return sorted(os.path.abspath(path) for path in found)
+
+
+class JobQueue:
+    """
+    Fila de documentos com o estado de cada documento e de cada página
+
+    Documentos passam por queued -> running -> done (ou failed). Um
+    documento que ficou em running por uma interrupção volta para a fila
+    em recover(); como o GeminiOCR retoma pelo manifesto, as páginas já
+    concluídas não são enviadas de novo.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                total_pages INTEGER,
+                output TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                document_id INTEGER NOT NULL REFERENCES documents (id),
+                page INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (document_id, page)
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status);
+            """
+        )
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def add(self, paths, requeue_failed=False):
+        """
+        Enfileira os documentos ainda desconhecidos; com requeue_failed,
+        devolve também à fila os que falharam. Retorna quantos entraram.
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            for path in paths:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (path, status, created_at, updated_at) "
+                    "VALUES (?, 'queued', ?, ?)",
+                    (path, now, now),
+                )
+                if not cursor.rowcount and requeue_failed:
+                    cursor = self._conn.execute(
+                        "UPDATE documents SET status = 'queued', error = NULL, updated_at = ? "
+                        "WHERE path = ? AND status = 'failed'",
+                        (now, path),
+                    )
+                added += cursor.rowcount
+            self._conn.commit()
+        return added
+
+    def recover(self):
+        """Devolve à fila os documentos interrompidos no meio"""
+        return self._execute(
+            "UPDATE documents SET status = 'queued', updated_at = ? WHERE status = 'running'",
+            (time.time(),),
+        ).rowcount
+
+    def claim(self):
+        """Retira o próximo documento da fila (id, path), ou None se vazia"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, path FROM documents WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE documents SET status = 'running', attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            self._conn.commit()
+            return row["id"], row["path"]
+
+    def start_pages(self, document_id, total_pages, pages=None):
+        """
+        Registra o total de páginas e cria as páginas ainda desconhecidas
+        (pages, quando só uma parte do documento é processada)
+        """
+        if pages is None:
+            pages = range(total_pages)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET total_pages = ?, updated_at = ? WHERE id = ?",
+                (total_pages, now, document_id),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (document_id, page, status, updated_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                ((document_id, page, now) for page in pages),
+            )
+            self._conn.commit()
+
+    def done_pages(self, document_id):
+        """Número de páginas concluídas do documento"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE document_id = ? AND status = 'done'",
+                (document_id,),
+            ).fetchone()[0]
+
+    def page_done(self, document_id, page):
+        self._execute(
+            "INSERT OR REPLACE INTO pages (document_id, page, status, updated_at) "
+            "VALUES (?, ?, 'done', ?)",
+            (document_id, page, time.time()),
+        )
+
+    def finish(self, document_id, output):
+        self._execute(
+            "UPDATE documents SET status = 'done', output = ?, error = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (output, time.time(), document_id),
+        )
+
+    def fail(self, document_id, error):
+        self._execute(
+            "UPDATE documents SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+            (error, time.time(), document_id),
+        )
+
+    def counts(self):
+        """Número de documentos em cada estado"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS total FROM documents GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["total"] for row in rows}
+
+    def documents(self, status=None):
+        """Documentos (como dicionários) com as páginas concluídas"""
+        sql = (
+            "SELECT d.*, (SELECT COUNT(*) FROM pages p WHERE p.document_id = d.id "
+            "AND p.status = 'done') AS done_pages FROM documents d"
+        )
+        params = ()
+        if status is not None:
+            sql += " WHERE d.status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY d.id", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobRunner:
+    """
+    Processa a fila com um único GeminiOCR, vários documentos por vez
+
+    Até `documents` documentos ficam em andamento no mesmo loop de eventos
+    e dividem o limite global de chamadas à API (max_workers do GeminiOCR);
+    assim que um termina, o próximo da fila começa, e as páginas de um
+    documento pequeno ou lento não deixam a API ociosa.
+
+    on_page(path, página, concluídas, total) e on_document(path, saída,
+    erro) são chamados a cada página e a cada documento concluídos.
+    page_range ou shard restringem cada PDF a uma parte das páginas (ver
+    GeminiOCR.process_document); o total passa a ser o da parte.
+    """
+
+    def __init__(
+        self,
+        ocr,
+        queue,
+        documents=4,
+        on_page=None,
+        on_document=None,
+        page_range=None,
+        shard=None,
+    ):
+        self.ocr = ocr
+        self.queue = queue
+        self.documents = max(1, int(documents))
+        self.page_range = page_range
+        self.shard = shard
+        self.on_page = on_page
+        self.on_document = on_document
+
+    def run(self):
+        """Processa a fila até esvaziá-la (bloqueante)"""
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"{recovered} documentos interrompidos voltaram para a fila")
+        await asyncio.gather(*(self._worker() for _ in range(self.documents)))
+        return self.queue.counts()
+
+    async def _worker(self):
+        while True:
+            job = self.queue.claim()
+            if job is None:
+                return
+            await self._process(*job)
+
+    async def _process(self, document_id, path):
+        output, error = None, None
+        try:
+            if path.lower().endswith(".pdf"):
+                output = await self._process_pdf(document_id, path)
+            else:
+                output = await self.ocr.process_document_async(path)
+                if output is None:
+                    error = "falha no processamento da imagem"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            self.queue.finish(document_id, output)
+        else:
+            print(f"Erro em {path}: {error}")
+            self.queue.fail(document_id, error)
+        if self.on_document is not None:
+            self.on_document(path, output, error)
+
+    async def _process_pdf(self, document_id, path):
+        # O PDF é aberto na thread de renderização do GeminiOCR
+        total_pages = await self.ocr.page_count_async(path)
+        output_base, start, stop = document_output_base(
+            path, total_pages, self.page_range, self.shard
+        )
+        self.queue.start_pages(document_id, stop - start, range(start, stop))
+
+        done = self.queue.done_pages(document_id)
+        async for page_num, _ in self.ocr.iter_pages_async(
+            path, page_range=self.page_range, shard=self.shard
+        ):
+            self.queue.page_done(document_id, page_num)
+            done += 1
+            if self.on_page is not None:
+                self.on_page(path, page_num, done, stop - start)
+
+        return self.ocr.output_path(output_base)
@@ -1,28 +1,272 @@
 import re
 import os
+import html
 import json
-from io import BytesIO
+import hashlib
+import time
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from PIL import Image
 
+from cache import OCRCache
+from cascade import ModelCascade, ModelTier
+from hedging import HedgePolicy
+from image_encoder import PageImageEncoder
+from manifest import PageManifest
+from metrics import BYTE_BUCKETS, CHAR_BUCKETS, NULL_METRICS, format_summary
+from normalizer import TextNormalizer
+from page_filters import PageFilter
+from page_store import PageStore
+from rendering import PageRenderer, render_page
+from scheduler import RequestScheduler, error_status
+from search_index import DEFAULT_INDEX_PATH, SearchIndex
+from revisions import align_revisions, document_fingerprints, page_fingerprint
+from sharding import (
+    document_output_base,
+    find_shards,
+    format_pages,
+    plan_merge,
+    resolve_page_range,
+    shard_file_base,
+)
+from tiling import PageTiler
+from validation import PageValidator
+from writers import HtmlWriter, create_writers
+
+# Separador das páginas na resposta de uma chamada com várias páginas
+_BATCH_MARKER = re.compile(r"^[ \t]*=+[ \t]*P[ÁA]GINA[ \t]+(\d+)[ \t]*=+[ \t]*$", re.M | re.I)
+
+# Estimativa de tokens por página (prompt + imagem + resposta), usada para
+# reservar o limite de tokens por minuto antes de cada chamada
+ESTIMATED_PAGE_TOKENS = 2000
+
+# Páginas entre cada gravação do arquivo de progresso, que lista todas as
+# páginas processadas: regravá-lo a cada página custaria O(n²) em documentos
+# grandes. O manifesto continua registrando cada página, e a retomada usa
+# o manifesto, então nada se perde entre duas gravações.
+PROGRESS_INTERVAL = 100
+
 
 class GeminiOCR:
-    def __init__(self, api_key):
+    # Instruções enviadas ao modelo junto com cada página
+    prompt = r"""
+        Analise esta imagem e extraia:
+        1. Texto completo preservando a formatação
+        2. Equações matemáticas em LaTeX (use $$ para display mode, $ para inline)
+        3. Mantenha a precisão técnica do conteúdo
+        4. Preserve símbolos especiais e notações matemáticas
+        
+        IMPORTANTE para notação matemática:
+        1. Use \arcsin (não extarcsen ou arcsen)
+        2. Use \arccos (não extarccos ou arccos)
+        3. Use \arctan (não extarctan ou arctan)
+        4. Use \sin (não sen)
+        5. Use \cos (não cos)
+        6. Use \tan (não tan)
+        7. Use \sqrt{} para raiz quadrada
+        8. Use \frac{}{} para frações
+        
+        Para expressões matemáticas:
+        - Use $ $ para equações inline
+        - Use $$ $$ para equações em display mode
+        - Preserve todos os parênteses e sinais
+        - Mantenha a formatação precisa das funções trigonométricas
+        
+        Mantenha a estrutura do documento e a formatação original.
+        """
+
+    # Instruções adicionais quando várias páginas vão na mesma chamada
+    batch_prompt = """
+        As próximas {count} imagens são páginas consecutivas do documento
+        ({pages}), nesta ordem. Transcreva cada página separadamente, seguindo
+        as regras acima, e comece a transcrição de cada uma com uma linha
+        contendo apenas o marcador ===PÁGINA n===, onde n é o número da página.
+        Não escreva nada antes do primeiro marcador.
+        """
+
+    # Instruções adicionais quando a imagem é um recorte de uma página densa
+    tile_prompt = """
+        Esta imagem é o recorte {index} de {count} de uma página, na ordem de
+        leitura. Transcreva apenas o conteúdo do recorte, seguindo as regras
+        acima, sem títulos ou comentários sobre o recorte.
+        """
+
+    def __init__(
+        self,
+        api_key,
+        max_workers=1,
+        render_workers=0,
+        render_queue_depth=None,
+        cache=None,
+        model_name="gemini-1.5-flash",
+        preview_interval=0,
+        text_layer=False,
+        image_encoder=None,
+        blank_ink_threshold=None,
+        duplicate_distance=None,
+        scheduler=None,
+        batch_size=1,
+        normalizer=None,
+        model=None,
+        metrics=None,
+        streaming=False,
+        output_formats=("html",),
+        validator=None,
+        html_split=None,
+        tiler=None,
+        cascade=None,
+        hedging=None,
+    ):
         """
         Inicializa o GeminiOCR com a chave API do Gemini
+
+        max_workers define quantas páginas podem estar em processamento
+        na API ao mesmo tempo (1 = processamento sequencial).
+        render_workers > 0 rasteriza as páginas em um pool de processos,
+        adiantando até render_queue_depth páginas enquanto a API responde.
+        cache pode ser True (cache no caminho padrão), o caminho de um
+        arquivo SQLite ou uma instância de OCRCache; None desativa o cache.
+        preview_interval > 0 remonta o HTML a cada N páginas para
+        pré-visualização; com 0 ele é montado apenas ao final.
+        text_layer=True aproveita a camada de texto de páginas nativamente
+        digitais (sem fórmulas nem codificação quebrada), sem chamar a API.
+        image_encoder (PageImageEncoder) controla resolução, cor, formato e
+        tamanho das imagens enviadas; o padrão equivale a PNG colorido a 2x.
+        blank_ink_threshold (ex.: 0.002) pula páginas cuja fração coberta por
+        tinta fique abaixo do valor; duplicate_distance (ex.: 8, de 256 bits)
+        reaproveita o resultado de páginas quase idênticas (distância de Hamming
+        do hash perceptual) já processadas no mesmo documento.
+        scheduler (RequestScheduler) define limites de requisições/tokens
+        por minuto e a política de novas tentativas; o padrão apenas repete
+        falhas temporárias (429/5xx) com espera exponencial.
+        batch_size > 1 envia até esse número de páginas por chamada à API,
+        separando a resposta por página; se a separação for ambígua, as
+        páginas do lote são refeitas uma a uma.
+        normalizer (TextNormalizer) define a limpeza do texto devolvido pelo
+        modelo, ex.: TextNormalizer(preserve_math_newlines=True).
+        model substitui o genai.GenerativeModel por outro objeto com
+        generate_content (e generate_content_async), ex.: o modelo falso
+        de benchmark.py.
+        metrics (metrics.Metrics) registra o tempo de cada estágio, contadores
+        e histogramas e os envia aos sinks configurados; None desativa.
+        streaming=True limita a memória que depende do conteúdo das páginas
+        em documentos muito grandes: o cache de imagens e fontes do MuPDF é
+        esvaziado a cada página, e imagens e textos prontos vão para o
+        disco. O registro de cada página (entrada do manifesto, índice do
+        PageStore, conjuntos de páginas prontas, decisões e assinaturas dos
+        filtros) continua na memória até o fim do documento, então o uso
+        ainda cresce um pouco com o número de páginas (ver README).
+        output_formats escolhe os arquivos gerados para cada PDF: "html"
+        (montado ao final), "jsonl" (um registro por página, com texto,
+        hashes e tempos) e "markdown", ou funções que criam um OutputWriter
+        (ver writers.py); o primeiro formato é o arquivo devolvido.
+        validator (PageValidator) dá uma nota a cada página devolvida pelo
+        modelo; a nota e os problemas vão para o manifesto, e as páginas
+        marcadas podem ser refeitas com reprocess_pages.
+        html_split divide o HTML de documentos grandes em vários arquivos:
+        um número de páginas por arquivo ou "chapters" (um arquivo por
+        capítulo do sumário do PDF); None gera um único arquivo.
+        tiler (tiling.PageTiler) divide páginas densas ou grandes em
+        recortes enviados em paralelo e unidos na ordem de leitura; None
+        envia sempre a página inteira.
+        cascade (cascade.ModelCascade) envia cada página primeiro ao nível
+        mais barato e só refaz no nível seguinte as páginas que disparam
+        uma regra de escalonamento; o nível e os motivos vão para o
+        manifesto ("tier" e "escalations"). O primeiro nível substitui
+        model e model_name.
+        hedging (hedging.HedgePolicy) duplica as chamadas que passam do
+        limiar de latência (ex.: o p95 observado), dentro de um orçamento
+        de requisições extras, e usa a primeira resposta; None desativa.
+        As threads compartilhadas (cópias e renderização assíncrona) são
+        encerradas por close, depois do último documento.
         """
         self.api_key = api_key
-        import google.generativeai as genai
+        # Cascata de modelos (o primeiro nível é o modelo padrão)
+        self.cascade = cascade
+        if cascade is not None:
+            for tier in cascade.tiers:
+                if tier.model is None:
+                    import google.generativeai as genai
 
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+                    genai.configure(api_key=api_key)
+                    tier.model = genai.GenerativeModel(tier.name)
+            model, model_name = cascade.tiers[0].model, cascade.tiers[0].name
+        self.model_name = model_name
+        if model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        # Instrumentação de desempenho (sem custo quando desativada)
+        self.metrics = metrics or NULL_METRICS
+        # Memória limitada para documentos muito grandes
+        self.streaming = streaming
+        # Formatos de saída dos PDFs
+        self.output_formats = tuple(output_formats)
+        if not self.output_formats:
+            raise ValueError("Informe ao menos um formato de saída")
+        if html_split is not None and html_split != "chapters":
+            html_split = int(html_split)
+            if html_split < 1:
+                raise ValueError("html_split deve ser um número de páginas ou 'chapters'")
+        self.html_split = html_split
+        # Validação do resultado de cada página
+        self.validator = validator or PageValidator()
         # Para acompanhar o progresso do PDF
         self.current_page = 0
         self.total_pages = 0
-        self.processed_pages = []
+        self.processed_pages = set()
+        # Número máximo de requisições simultâneas à API
+        self.max_workers = max(1, int(max_workers))
+        # Processos dedicados à rasterização das páginas (0 = no próprio processo)
+        self.render_workers = max(0, int(render_workers))
+        self.render_queue_depth = render_queue_depth
+        # Cache de respostas do modelo, compartilhado entre documentos
+        if cache is True:
+            cache = OCRCache()
+        elif isinstance(cache, str):
+            cache = OCRCache(cache)
+        self.cache = cache
+        # Páginas entre cada remontagem do HTML de pré-visualização
+        self.preview_interval = max(0, int(preview_interval))
+        # Usa o texto nativo do PDF quando ele for confiável
+        self.text_layer = text_layer
+        # Conversão das páginas em imagens para a API
+        self.image_encoder = image_encoder or PageImageEncoder()
+        # Filtros de páginas em branco e repetidas (None = desativado)
+        self.blank_ink_threshold = blank_ink_threshold
+        self.duplicate_distance = duplicate_distance
+        # Limite de taxa, novas tentativas e concorrência adaptativa da API
+        self.scheduler = scheduler or RequestScheduler()
+        if not self.scheduler.metrics.enabled:
+            self.scheduler.metrics = self.metrics
+        # Cópias das chamadas lentas (None = desativado)
+        self.hedging = hedging
+        # Páginas enviadas em cada chamada à API
+        self.batch_size = max(1, int(batch_size))
+        # Recortes de páginas densas
+        self.tiler = tiler
+        # Limpeza do texto devolvido pelo modelo
+        self.normalizer = normalizer or TextNormalizer()
+        # Recursos da API assíncrona, criados sob demanda e compartilhados
+        # por todos os documentos processados no mesmo loop de eventos
+        self._async_loop = None
+        self._async_semaphore = None
+        self._async_render_executor = None
 
-    def process_document(self, file_path, start_page=0):
+    def process_document(
+        self, file_path, start_page=0, max_workers=None, page_range=None, shard=None
+    ):
         """
         Interface principal para processamento de documento (PDF ou imagem)
+
+        max_workers sobrescreve, apenas para este documento, o número de
+        páginas processadas em paralelo definido no construtor.
+        page_range=(início, fim), como em range, ou shard=(i, n) (ou "i/n")
+        processam apenas parte do PDF, com arquivos de saída próprios
+        (<nome>_parte_<a>-<b>_*), para dividir um documento grande entre
+        processos ou máquinas; merge_shards junta as partes depois.
         """
         try:
             file_ext = file_path.lower().split(".")[-1]
@@ -30,7 +274,15 @@ class GeminiOCR:
             file_base = os.path.basename(file_path).rsplit(".", 1)[0]
 
             if file_ext == "pdf":
-                return self._process_pdf(file_path, output_dir, file_base, start_page)
+                return self._process_pdf(
+                    file_path,
+                    output_dir,
+                    file_base,
+                    start_page,
+                    max_workers,
+                    page_range,
+                    shard,
+                )
             else:  # Assume que é uma imagem
                 return self._process_technical(file_path, Image.open(file_path))
 
@@ -38,17 +290,296 @@ class GeminiOCR:
             print(f"Erro no processamento: {e}")
             return None
 
-    def _process_pdf(self, pdf_path, output_dir, file_base, start_page=0):
+    async def process_document_async(
+        self, file_path, start_page=0, page_range=None, shard=None
+    ):
+        """
+        Versão assíncrona de process_document
+
+        Vários documentos podem ser processados ao mesmo tempo no mesmo loop
+        de eventos (ex.: asyncio.gather); o total de chamadas à API em
+        andamento, somando todos eles, é limitado por max_workers.
+        """
+        try:
+            file_ext = file_path.lower().split(".")[-1]
+
+            if file_ext == "pdf":
+                async for _ in self.iter_pages_async(
+                    file_path, start_page, page_range, shard
+                ):
+                    pass
+                output_base = file_path.rsplit(".", 1)[0]
+                if page_range is not None or shard is not None:
+                    output_base, _, _ = document_output_base(
+                        file_path, await self.page_count_async(file_path), page_range, shard
+                    )
+                output_path = self.output_path(output_base)
+                print(f"Arquivo salvo em: {output_path}")
+                return output_path
+            else:  # Assume que é uma imagem
+                output_path = f"{file_path.rsplit('.', 1)[0]}_tecnico.html"
+                content, _, _ = await self._process_page_content_async(
+                    Image.open(file_path), 1, 1
+                )
+                # Imagem avulsa: uma página, já concluída
+                self._save_html_file(output_path, content, {0}, 1)
+                return output_path
+
+        except Exception as e:
+            print(f"Erro no processamento: {e}")
+            return None
+
+    async def page_count_async(self, pdf_path):
+        """
+        Número de páginas de um PDF, lido na thread de renderização (o
+        PyMuPDF só é usado por ela, e o loop de eventos não espera o disco)
+        """
+        import fitz  # PyMuPDF
+
+        def count():
+            with fitz.open(pdf_path) as pdf_document:
+                return len(pdf_document)
+
+        _, render_executor = self._get_async_resources()
+        return await asyncio.get_running_loop().run_in_executor(render_executor, count)
+
+    def close(self):
+        """
+        Encerra as threads compartilhadas entre documentos (renderização
+        assíncrona e cópias de chamadas lentas); chame uma vez, depois do
+        último documento
+        """
+        if self.hedging is not None:
+            self.hedging.close()
+        if self._async_render_executor is not None:
+            self._async_render_executor.shutdown(wait=True)
+            self._async_render_executor = None
+
+    def _get_async_resources(self):
+        """
+        Semáforo de chamadas à API do loop de eventos atual e thread única
+        de renderização
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            # O semáforo fica preso ao loop em que foi usado: cada asyncio.run
+            # (um loop novo) recebe o seu
+            self._async_loop = loop
+            self._async_semaphore = asyncio.Semaphore(self.max_workers)
+        if self._async_render_executor is None:
+            # O PyMuPDF não é seguro entre threads: uma única thread renderiza
+            # as páginas de todos os documentos
+            self._async_render_executor = ThreadPoolExecutor(max_workers=1)
+        return self._async_semaphore, self._async_render_executor
+
+    async def iter_pages_async(self, pdf_path, start_page=0, page_range=None, shard=None):
+        """
+        Processa um PDF de forma assíncrona, gerando (página, html) à medida
+        que cada página fica pronta (fora de ordem)
+
+        Usa os mesmos arquivos de saída, manifesto e retomada do modo
+        síncrono (inclusive page_range e shard, ver process_document); o
+        HTML final é montado, em ordem, ao término. Lotes de várias páginas
+        e a detecção de páginas repetidas existem apenas no modo síncrono.
+        """
+        import fitz  # PyMuPDF
+
+        loop = asyncio.get_running_loop()
+        semaphore, render_executor = self._get_async_resources()
+
+        pdf_document = await loop.run_in_executor(render_executor, fitz.open, pdf_path)
+        total_pages = len(pdf_document)
+        try:
+            output_base, range_start, range_stop = document_output_base(
+                pdf_path, total_pages, page_range, shard
+            )
+        except ValueError:
+            await loop.run_in_executor(render_executor, pdf_document.close)
+            raise
+        output_html = f"{output_base}_processado.html"
+        progress_file = f"{output_base}_progresso.json"
+        store_file = f"{output_base}_paginas.dat"
+        manifest_file = f"{output_base}_manifesto.jsonl"
+        first_page = max(range_start, min(start_page, total_pages - 1))
+
+        # Estado local: vários documentos podem estar em andamento ao mesmo tempo
+        store, manifest, processed_pages = self._open_page_state(
+            store_file, manifest_file, output_html
+        )
+        if first_page == range_start:
+            first_page = self._first_pending_page(processed_pages, range_start, range_stop)
+        html_split = await loop.run_in_executor(render_executor, self._html_split, pdf_document)
+        writers = create_writers(
+            self.output_formats, output_base, self._render_html, html_split
+        )
+        metrics_start = self.metrics.snapshot()
+        pages_to_process = [
+            page_num
+            for page_num in range(first_page, range_stop)
+            if page_num not in processed_pages
+        ]
+        print(
+            f"Iniciando processamento assíncrono de {pdf_path}: "
+            f"{len(pages_to_process)} de {range_stop - range_start} páginas"
+        )
+
+        async def process(page_num):
+            rendered = await loop.run_in_executor(
+                render_executor,
+                render_page,
+                pdf_document,
+                page_num,
+                self.image_encoder,
+                self.text_layer,
+                # Sem páginas em branco nem cascata, só a tinta, usada pela validação
+                True if self.blank_ink_threshold is not None or self.cascade is not None else "ink",
+                self.streaming,
+                self.tiler,
+            )
+            self._record_render(rendered)
+            signature = rendered["signature"] or {}
+            if rendered["text"] is not None:
+                text = html.escape(rendered["text"], quote=False)
+                content = self._format_page(
+                    self._clean_text(text), page_num + 1, total_pages
+                )
+                return page_num, content, "text_layer", signature, None
+            if (
+                self.blank_ink_threshold is not None
+                and signature
+                and signature["ink"] < self.blank_ink_threshold
+            ):
+                content = self._format_page(
+                    '<p class="page-note">Página em branco</p>',
+                    page_num + 1,
+                    total_pages,
+                )
+                return page_num, content, "blank", signature, None
+
+            async with semaphore:
+                manifest.mark_started(page_num)
+                content, raw_text, route = await self._process_page_content_async(
+                    rendered["image"],
+                    page_num + 1,
+                    total_pages,
+                    rendered["tiles"],
+                    signature.get("ink"),
+                )
+            return page_num, content, "api", dict(signature, **route), raw_text
+
+        # As tarefas são criadas sob demanda: no máximo 2 * max_workers
+        # páginas deste documento em andamento (renderizadas ou na API)
+        page_iter = iter(pages_to_process)
+        tasks = set()
+
+        def start_tasks():
+            for page_num in page_iter:
+                tasks.add(asyncio.ensure_future(process(page_num)))
+                if len(tasks) >= 2 * self.max_workers:
+                    break
+
+        finished_pages = set(processed_pages)
+        last_processed = None
+        try:
+            start_tasks()
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                tasks -= done
+                start_tasks()
+                for task in done:
+                    page_num, content = self._finish_async_page(
+                        task.result(), pdf_path, store, manifest, writers, total_pages
+                    )
+                    processed_pages.add(page_num)
+                    finished_pages.add(page_num)
+
+                    # last_page só avança enquanto não houver lacunas
+                    next_page = first_page if last_processed is None else last_processed + 1
+                    while next_page in finished_pages and next_page < total_pages:
+                        last_processed = next_page
+                        next_page += 1
+                    if len(finished_pages) % PROGRESS_INTERVAL == 0:
+                        self._update_progress_file(
+                            progress_file, last_processed, processed_pages, total_pages
+                        )
+                    yield page_num, content
+
+            print(
+                f"Processamento completo! {len(processed_pages)}/{range_stop - range_start} páginas processadas."
+            )
+            self._report_flagged_pages(pdf_path, manifest, processed_pages)
+            self._report_cascade(manifest, processed_pages)
+            self._report_hedging()
+            summary = self.metrics.finish_document(pdf_path, metrics_start)
+            if summary:
+                print(format_summary(summary))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if finished_pages:
+                self._update_progress_file(
+                    progress_file, last_processed, processed_pages, total_pages
+                )
+            if len(store):
+                self._finalize_outputs(
+                    writers, pdf_path, store, manifest, processed_pages, total_pages
+                )
+            for writer in writers:
+                writer.close()
+            store.close()
+            manifest.close()
+            await loop.run_in_executor(render_executor, pdf_document.close)
+
+    def _finish_async_page(self, result, pdf_path, store, manifest, writers, total_pages):
+        """Grava uma página concluída no modo assíncrono"""
+        page_num, content, source, signature, raw_text = result
+        extra = dict(signature)
+        if raw_text is not None:
+            extra.update(self._validate_page(page_num, raw_text, content, signature.get("ink")))
+        with self.metrics.timer("store"):
+            offset, length, digest = store.append(page_num, content)
+            manifest.mark_done(
+                page_num, offset, length, digest, source=source, **extra
+            )
+        self._write_page(writers, pdf_path, page_num, content, manifest, total_pages)
+        self._record_page(pdf_path, manifest, page_num, source)
+        return page_num, content
+
+    def _process_pdf(
+        self,
+        pdf_path,
+        output_dir,
+        file_base,
+        start_page=0,
+        max_workers=None,
+        page_range=None,
+        shard=None,
+    ):
         """
         Processa um arquivo PDF, extraindo e processando cada página
+
+        As páginas são enviadas à API por um pool limitado de threads; os
+        resultados podem chegar fora de ordem, mas o HTML é sempre montado
+        na ordem das páginas.
         """
         try:
             import fitz  # PyMuPDF
 
-            # Abre o PDF
-            pdf_document = fitz.open(pdf_path)
-            self.total_pages = len(pdf_document)
-            self.current_page = max(0, min(start_page, self.total_pages - 1))
+            workers = max(1, int(max_workers or self.max_workers))
+
+            # Abre o PDF apenas para contar as páginas
+            with fitz.open(pdf_path) as pdf_document:
+                self.total_pages = len(pdf_document)
+                html_split = self._html_split(pdf_document)
+
+            # Apenas um intervalo de páginas, com arquivos de saída próprios
+            page_range = resolve_page_range(self.total_pages, page_range, shard)
+            range_start, range_stop = page_range or (0, self.total_pages)
+            if page_range is not None:
+                file_base = shard_file_base(file_base, page_range)
+                print(f"Processando a parte com as páginas {range_start + 1} a {range_stop}")
+            self.current_page = max(range_start, min(start_page, self.total_pages - 1))
 
             # Arquivo de saída único
             output_html = os.path.join(output_dir, f"{file_base}_processado.html")
@@ -56,88 +587,331 @@ class GeminiOCR:
             # Arquivo de controle de progresso
             progress_file = os.path.join(output_dir, f"{file_base}_progresso.json")
 
-            # Carrega progresso anterior se existir
-            if os.path.exists(progress_file):
-                with open(progress_file, "r", encoding="utf-8") as f:
-                    progress_data = json.load(f)
-                    self.processed_pages = progress_data.get("processed_pages", [])
+            # Fragmentos HTML das páginas, gravados apenas por acréscimo
+            store_file = os.path.join(output_dir, f"{file_base}_paginas.dat")
 
-                    if (
-                        self.current_page == 0
-                        and progress_data.get("last_page") is not None
-                    ):
-                        # Se não especificou uma página de início, continua de onde parou
-                        self.current_page = progress_data.get("last_page") + 1
-                        print(
-                            f"Continuando de onde parou: página {self.current_page + 1}"
-                        )
-            else:
-                self.processed_pages = []
+            # Manifesto com o estado, a posição e o hash de cada página
+            manifest_file = os.path.join(output_dir, f"{file_base}_manifesto.jsonl")
+
+            # Relatório do motivo de cada página ter ido (ou não) para a API
+            report_file = os.path.join(output_dir, f"{file_base}_relatorio.json")
+
+            # Carrega as páginas já armazenadas a partir do manifesto (o
+            # arquivo de progresso é só um relatório e não é lido)
+            store, manifest, self.processed_pages = self._open_page_state(
+                store_file, manifest_file, output_html
+            )
+            if self.current_page == range_start:
+                # Se não especificou uma página de início, continua de onde parou
+                self.current_page = self._first_pending_page(
+                    self.processed_pages, range_start, range_stop
+                )
+                if self.current_page > range_start:
+                    print(f"Continuando de onde parou: página {self.current_page + 1}")
 
             print(
                 f"Iniciando processamento do PDF com {self.total_pages} páginas a partir da página {self.current_page + 1}"
             )
+            if workers > 1:
+                print(f"Processando até {workers} páginas em paralelo")
+            writers = create_writers(
+                self.output_formats,
+                os.path.join(output_dir, file_base),
+                self._render_html,
+                html_split,
+            )
+            output_path = writers[0].path
+            metrics_start = self.metrics.snapshot()
 
-            # Inicializa ou carrega conteúdo HTML existente
-            existing_content = {}
-            if os.path.exists(output_html):
-                existing_content = self._extract_existing_content(output_html)
+            # Filtro de páginas em branco e repetidas, usando também as
+            # assinaturas das páginas de execuções anteriores
+            page_filter = None
+            if self.blank_ink_threshold is not None or self.duplicate_distance is not None:
+                page_filter = PageFilter(self.blank_ink_threshold, self.duplicate_distance)
+                for page_num in sorted(self.processed_pages):
+                    entry = manifest.entries[page_num]
+                    if "phash" in entry:
+                        page_filter.remember(page_num, entry)
 
-            try:
-                all_content = ""
-                last_processed = None
+            # Páginas concluídas (processadas agora ou já armazenadas)
+            finished_pages = set()
+            # Páginas enviadas à API e ainda sem resposta: future -> página
+            pending = {}
+            # Decisão da classificação de cada página (camada de texto x API)
+            decisions = {}
+            first_page = self.current_page
+            last_processed = None
+            # Bytes de imagem enviados à API nesta execução
+            uploaded_bytes = 0
+            uploaded_pages = 0
+            # Assinaturas das páginas em andamento
+            signatures = {}
+            # Tinta de cada página enviada, para as regras da cascata e a
+            # validação do resultado (até a página ser gravada)
+            page_inks = {}
+            # Página original -> páginas repetidas aguardando o resultado dela
+            waiting_duplicates = {}
 
-                for page_num in range(self.current_page, self.total_pages):
-                    self.current_page = page_num
+            def finish_page(page_num, content, source, raw_text=None, **extra):
+                """Grava uma página concluída e atualiza o progresso"""
+                nonlocal last_processed
+                self.current_page = page_num
+                extra.update(signatures.pop(page_num, None) or {})
+                ink = page_inks.pop(page_num, None)
+                if ink is not None:
+                    extra.setdefault("ink", ink)
+                if raw_text is not None:
+                    extra.update(
+                        self._validate_page(page_num, raw_text, content, extra.get("ink"))
+                    )
+                with self.metrics.timer("store"):
+                    offset, length, digest = store.append(page_num, content)
+                    manifest.mark_done(
+                        page_num, offset, length, digest, source=source, **extra
+                    )
+                self._write_page(
+                    writers, pdf_path, page_num, content, manifest, self.total_pages
+                )
+                self._record_page(pdf_path, manifest, page_num, source)
+                finished_pages.add(page_num)
 
-                    # Verifica se a página já foi processada
-                    if (
-                        page_num in self.processed_pages
-                        and page_num in existing_content
-                    ):
-                        print(f"Página {page_num + 1} já processada, pulando...")
-                        all_content += existing_content[page_num]
-                        continue
+                # Registra progresso
+                self.processed_pages.add(page_num)
+
+                # last_page só avança enquanto não houver lacunas, para
+                # que a retomada nunca pule uma página ainda pendente
+                next_page = first_page if last_processed is None else last_processed + 1
+                while next_page in finished_pages:
+                    last_processed = next_page
+                    next_page += 1
 
-                    print(f"Processando página {page_num + 1} de {self.total_pages}...")
+                # Atualiza o arquivo de progresso periodicamente (ele lista
+                # todas as páginas) e ao final, no bloco finally
+                if len(finished_pages) % PROGRESS_INTERVAL == 0:
+                    self._update_progress_file(progress_file, last_processed)
 
-                    # Extrai a página como imagem
-                    page = pdf_document[page_num]
-                    pix = page.get_pixmap(
-                        matrix=fitz.Matrix(2, 2)
-                    )  # Aumenta a resolução para melhor OCR
+                # Remonta a pré-visualização periodicamente, se configurado
+                if (
+                    self.preview_interval
+                    and len(finished_pages) % self.preview_interval == 0
+                ):
+                    self._assemble_html(output_html, store)
 
-                    # Converte para imagem PIL
-                    img = Image.open(BytesIO(pix.tobytes("png")))
+                print(f"Página {page_num + 1} processada com sucesso! Progresso salvo.")
 
-                    # Processa a imagem da página
-                    page_content = self._process_page_content(
-                        img, page_num + 1, self.total_pages
+                # Páginas repetidas que aguardavam esta página
+                for duplicate in waiting_duplicates.pop(page_num, []):
+                    finish_page(
+                        duplicate,
+                        self._reuse_page_content(content, duplicate + 1, self.total_pages),
+                        "duplicate",
+                        duplicate_of=page_num,
                     )
-                    all_content += page_content
 
-                    # Registra progresso
-                    if page_num not in self.processed_pages:
-                        self.processed_pages.append(page_num)
+            def collect_finished(return_when):
+                """Registra as páginas concluídas, na ordem em que terminarem"""
+                done, _ = wait(pending, return_when=return_when)
+                for future in sorted(done, key=pending.get):
+                    batch_pages = pending.pop(future)
+                    self.current_page = batch_pages[0]
+                    for page_num, (content, raw_text, route) in zip(
+                        batch_pages, future.result()
+                    ):
+                        finish_page(page_num, content, "api", raw_text, **route)
 
-                    last_processed = page_num
+            # Páginas aguardando para formar o próximo lote: (página, imagem)
+            batch = []
 
-                    # Atualiza arquivo de progresso após cada página
-                    self._update_progress_file(progress_file, last_processed)
+            def submit_batch(pages=None, tiles=None):
+                """
+                Envia o lote atual (ou pages, com os recortes da página)
+                para processamento em segundo plano
+                """
+                # Mantém no máximo `workers` chamadas em andamento
+                while len(pending) >= workers:
+                    collect_finished(FIRST_COMPLETED)
 
-                    # Salva o HTML atual após cada página (para não perder o trabalho)
-                    self._save_html_file(output_html, all_content)
+                pages = batch if pages is None else pages
+                batch_pages = [page_num for page_num, _ in pages]
+                for page_num in batch_pages:
+                    manifest.mark_started(page_num)
+                future = executor.submit(
+                    self._process_page_batch,
+                    [image for _, image in pages],
+                    [page_num + 1 for page_num in batch_pages],
+                    self.total_pages,
+                    tiles,
+                    [page_inks.get(page_num) for page_num in batch_pages],
+                )
+                pending[future] = batch_pages
+                pages.clear()
 
-                    print(
-                        f"Página {page_num + 1} processada com sucesso! Progresso salvo."
-                    )
+            # Verifica quais páginas já foram processadas
+            pages_to_process = []
+            for page_num in range(first_page, range_stop):
+                if page_num in self.processed_pages and page_num in store:
+                    print(f"Página {page_num + 1} já processada, pulando...")
+                    finished_pages.add(page_num)
+                else:
+                    pages_to_process.append(page_num)
+
+            # Estágio de renderização: produz as imagens à frente do OCR
+            renderer = PageRenderer(
+                pdf_path,
+                workers=self.render_workers,
+                queue_depth=self.render_queue_depth,
+                encoder=self.image_encoder,
+                text_layer=self.text_layer,
+                # Sem filtro nem cascata, só a tinta, usada pela validação
+                signature=True if page_filter is not None or self.cascade is not None else "ink",
+                release_memory=self.streaming,
+                tiler=self.tiler,
+            )
+
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    try:
+                        for page_num, rendered in renderer.iter_pages(
+                            pages_to_process
+                        ):
+                            self._record_render(rendered)
+                            if rendered["decision"] is not None:
+                                decisions[page_num] = rendered["decision"]
+
+                            # Camada de texto utilizável: dispensa a API
+                            if rendered["text"] is not None:
+                                print(
+                                    f"Página {page_num + 1}: usando a camada de texto do PDF"
+                                )
+                                text = html.escape(rendered["text"], quote=False)
+                                finish_page(
+                                    page_num,
+                                    self._format_page(
+                                        self._clean_text(text),
+                                        page_num + 1,
+                                        self.total_pages,
+                                    ),
+                                    "text_layer",
+                                )
+                                continue
+
+                            if page_filter is not None:
+                                signatures[page_num] = rendered["signature"]
+                                skip, original = page_filter.check(
+                                    page_num, rendered["signature"]
+                                )
+                                if skip == "blank":
+                                    print(f"Página {page_num + 1} em branco, pulando...")
+                                    finish_page(
+                                        page_num,
+                                        self._format_page(
+                                            '<p class="page-note">Página em branco</p>',
+                                            page_num + 1,
+                                            self.total_pages,
+                                        ),
+                                        "blank",
+                                    )
+                                    continue
+                                if skip == "duplicate":
+                                    print(
+                                        f"Página {page_num + 1} repete a página {original + 1}, reaproveitando o resultado"
+                                    )
+                                    # Sem assinatura pendente, a original já está gravada
+                                    if original in store and original not in signatures:
+                                        finish_page(
+                                            page_num,
+                                            self._reuse_page_content(
+                                                store.read(original),
+                                                page_num + 1,
+                                                self.total_pages,
+                                            ),
+                                            "duplicate",
+                                            duplicate_of=original,
+                                        )
+                                    else:
+                                        waiting_duplicates.setdefault(original, []).append(
+                                            page_num
+                                        )
+                                    continue
 
-                # Finaliza e salva o arquivo HTML completo
+                            self.current_page = page_num
+                            image = rendered["image"]
+                            tiles = rendered["tiles"]
+                            if rendered["signature"]:
+                                page_inks[page_num] = rendered["signature"]["ink"]
+                            image_bytes = sum(
+                                len(blob["data"]) for blob in (tiles or [image])
+                            )
+                            uploaded_bytes += image_bytes
+                            uploaded_pages += 1
+                            self.metrics.increment("uploaded_bytes_total", image_bytes)
+                            self.metrics.observe("image_bytes", image_bytes, BYTE_BUCKETS)
+                            print(
+                                f"Processando página {page_num + 1} de {self.total_pages}... "
+                                f"({image_bytes / 1024:.0f} KB"
+                                + (f" em {len(tiles)} recortes)" if tiles else ")")
+                            )
+
+                            # Página dividida em recortes: vai sozinha, fora dos lotes
+                            if tiles:
+                                submit_batch([(page_num, image)], tiles)
+                                continue
+
+                            # Processa as páginas em segundo plano, em lotes
+                            batch.append((page_num, image))
+                            if len(batch) >= self.batch_size:
+                                submit_batch()
+
+                        if batch:
+                            submit_batch()
+                        while pending:
+                            collect_finished(FIRST_COMPLETED)
+                    finally:
+                        # Em caso de erro, não inicia as páginas ainda na fila
+                        for future in pending:
+                            future.cancel()
+
+                # Finaliza e salva os arquivos de saída completos
+                self._finalize_outputs(writers, pdf_path, store, manifest)
                 print(
-                    f"Processamento completo! {len(self.processed_pages)}/{self.total_pages} páginas processadas."
+                    f"Processamento completo! {len(self.processed_pages)}/{range_stop - range_start} páginas processadas."
                 )
-                print(f"Arquivo HTML salvo em: {output_html}")
-                return output_html
+                self._report_flagged_pages(pdf_path, manifest, self.processed_pages)
+                self._report_cascade(manifest, self.processed_pages)
+                self._report_hedging()
+                if decisions:
+                    text_pages = sum(
+                        1 for decision in decisions.values() if decision["use_text_layer"]
+                    )
+                    print(
+                        f"Camada de texto: {text_pages} páginas sem chamada à API, "
+                        f"{len(decisions) - text_pages} enviadas ao Gemini "
+                        f"(relatório em {report_file})"
+                    )
+                if page_filter is not None:
+                    print(
+                        f"Páginas em branco puladas: {page_filter.blank_pages}; "
+                        f"repetidas reaproveitadas: {page_filter.duplicate_pages}"
+                    )
+                if uploaded_pages:
+                    print(
+                        f"Imagens enviadas: {uploaded_bytes / 1024:.0f} KB "
+                        f"({uploaded_bytes / 1024 / uploaded_pages:.0f} KB por página)"
+                    )
+                if self.cache is not None:
+                    print(
+                        f"Cache: {self.cache.hits} acertos, {self.cache.misses} falhas"
+                    )
+                if self.scheduler.retries:
+                    print(
+                        f"API: {self.scheduler.retries} novas tentativas "
+                        f"({self.scheduler.throttled} por limite de uso)"
+                    )
+                summary = self.metrics.finish_document(pdf_path, metrics_start)
+                if summary:
+                    print(format_summary(summary))
+                print(f"Arquivo salvo em: {output_path}")
+                return output_path
 
             except Exception as e:
                 print(f"\n=== ERRO DURANTE O PROCESSAMENTO ===")
@@ -156,11 +930,21 @@ class GeminiOCR:
                 print(f"===================================\n")
 
                 # Mesmo com erro, salva o que foi processado até agora
-                if all_content:
-                    self._save_html_file(output_html, all_content)
-                    return output_html
+                if len(store):
+                    self._finalize_outputs(writers, pdf_path, store, manifest)
+                    return output_path
                 return None
 
+            finally:
+                if finished_pages:
+                    self._update_progress_file(progress_file, last_processed)
+                for writer in writers:
+                    writer.close()
+                store.close()
+                manifest.close()
+                if decisions:
+                    self._update_decision_report(report_file, decisions)
+
         except ImportError:
             print("PyMuPDF (fitz) não está instalado. Instale com: pip install pymupdf")
             return None
@@ -168,6 +952,639 @@ class GeminiOCR:
             print(f"Erro ao processar PDF: {e}")
             return None
 
+    def merge_shards(self, pdf_path):
+        """
+        Junta as partes de um PDF processadas separadamente (page_range ou
+        shard), que devem estar ao lado do PDF, nos arquivos do documento
+        inteiro: páginas, manifesto, progresso e o HTML final, em ordem
+
+        A junção é determinística: uma página presente em mais de uma parte
+        vem da parte que começa primeiro. Devolve um dicionário com o HTML
+        gerado ("output"), as páginas juntadas, as lacunas (páginas que
+        nenhuma parte concluiu) e as sobreposições (página, partes, se os
+        conteúdos são iguais), ou None se nenhuma parte for encontrada.
+        Os arquivos do documento inteiro são recriados a cada junção.
+        """
+        import fitz  # PyMuPDF
+
+        with fitz.open(pdf_path) as pdf_document:
+            total_pages = len(pdf_document)
+            html_split = self._html_split(pdf_document)
+        output_dir = os.path.dirname(pdf_path)
+        file_base = os.path.basename(pdf_path).rsplit(".", 1)[0]
+        shards = find_shards(output_dir, file_base)
+        if not shards:
+            print(f"Nenhuma parte de {pdf_path} encontrada para juntar")
+            return None
+
+        output_base = os.path.join(output_dir, file_base)
+        store_file = f"{output_base}_paginas.dat"
+        manifest_file = f"{output_base}_manifesto.jsonl"
+        progress_file = f"{output_base}_progresso.json"
+
+        parts = {}
+        try:
+            for _, _, shard_base in shards:
+                shard_path = os.path.join(output_dir, shard_base)
+                manifest = PageManifest(f"{shard_path}_manifesto.jsonl")
+                store = PageStore(f"{shard_path}_paginas.dat", index=manifest.store_index())
+                parts[shard_base] = store, manifest
+
+            source, gaps, overlaps = plan_merge(
+                total_pages,
+                [
+                    (name, {page: digest for page, (_, _, digest) in store.index().items()})
+                    for name, (store, _) in parts.items()
+                ],
+            )
+
+            # Recria os arquivos do documento em temporários e só então os
+            # substitui, para que uma junção interrompida não deixe nada pela metade
+            for path in (store_file + ".tmp", manifest_file + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            merged_store = PageStore(store_file + ".tmp")
+            merged_manifest = PageManifest(manifest_file + ".tmp")
+            try:
+                for page_num in sorted(source):
+                    store, manifest = parts[source[page_num]]
+                    offset, length, digest = merged_store.append(
+                        page_num, store.read(page_num)
+                    )
+                    extra = {
+                        key: value
+                        for key, value in manifest.entries[page_num].items()
+                        if key not in ("page", "status", "offset", "length", "sha256")
+                    }
+                    merged_manifest.mark_done(
+                        page_num, offset, length, digest, shard=source[page_num], **extra
+                    )
+            finally:
+                merged_store.close()
+                merged_manifest.close()
+            os.replace(store_file + ".tmp", store_file)
+            os.replace(manifest_file + ".tmp", manifest_file)
+        finally:
+            for store, manifest in parts.values():
+                store.close()
+                manifest.close()
+
+        processed_pages = set(source)
+        self._update_progress_file(
+            progress_file, self._last_contiguous_page(processed_pages), processed_pages, total_pages
+        )
+
+        writers = create_writers(self.output_formats, output_base, self._render_html, html_split)
+        manifest = PageManifest(manifest_file)
+        store = PageStore(store_file, index=manifest.store_index())
+        try:
+            self._finalize_outputs(
+                writers, pdf_path, store, manifest, processed_pages, total_pages
+            )
+        finally:
+            store.close()
+            manifest.close()
+
+        print(
+            f"{len(shards)} partes juntadas: {len(processed_pages)}/{total_pages} páginas "
+            f"em {writers[0].path}"
+        )
+        if gaps:
+            print(f"Aviso: páginas ausentes em todas as partes: {format_pages(gaps)}")
+        conflicts = [page_num for page_num, _, same in overlaps if not same]
+        if overlaps:
+            print(
+                f"Aviso: páginas presentes em mais de uma parte: "
+                f"{format_pages(page_num for page_num, _, _ in overlaps)}"
+                + (f" (conteúdo diferente em {format_pages(conflicts)})" if conflicts else "")
+            )
+        return {
+            "output": writers[0].path,
+            "total_pages": total_pages,
+            "pages": len(processed_pages),
+            "shards": [shard_base for _, _, shard_base in shards],
+            "gaps": gaps,
+            "overlaps": overlaps,
+        }
+
+    def reprocess_pages(self, pdf_path, pages=None):
+        """
+        Refaz apenas algumas páginas de um PDF já processado e as recoloca
+        no resultado, sem repetir as demais
+
+        pages lista as páginas (a partir de 0, como start_page); None refaz
+        as páginas marcadas pela validação. O cache é ignorado para essas
+        páginas, e o resultado novo só substitui o anterior se a nota da
+        validação não piorar. Devolve {página: {"before", "after",
+        "replaced"}}.
+        """
+        import fitz  # PyMuPDF
+
+        output_dir = os.path.dirname(pdf_path)
+        file_base = os.path.basename(pdf_path).rsplit(".", 1)[0]
+        output_base = os.path.join(output_dir, file_base)
+        with fitz.open(pdf_path) as pdf_document:
+            html_split = self._html_split(pdf_document)
+        store, manifest, processed_pages = self._open_page_state(
+            f"{output_base}_paginas.dat",
+            f"{output_base}_manifesto.jsonl",
+            f"{output_base}_processado.html",
+        )
+        writers = create_writers(self.output_formats, output_base, self._render_html, html_split)
+        results = {}
+        try:
+            if pages is None:
+                pages = [
+                    page_num
+                    for page_num in sorted(processed_pages)
+                    if self.validator.is_flagged(manifest.entries[page_num])
+                ]
+
+            with fitz.open(pdf_path) as pdf_document:
+                total_pages = len(pdf_document)
+                pages = sorted(page_num for page_num in set(pages) if 0 <= page_num < total_pages)
+                if not pages:
+                    print("Nenhuma página para reprocessar")
+                    return results
+                print(f"Reprocessando as páginas {format_pages(pages)} de {pdf_path}")
+
+                def collect(pending, return_when):
+                    done, _ = wait(pending, return_when=return_when)
+                    for future in done:
+                        page_num, signature = pending.pop(future)
+                        try:
+                            content, raw_text, route = future.result()
+                        except Exception as e:
+                            print(f"Erro ao reprocessar a página {page_num + 1}: {e}")
+                            continue
+                        quality = self.validator.validate(
+                            raw_text, self._page_body(content), signature["ink"]
+                        )
+                        previous = manifest.entries.get(page_num, {})
+                        before = previous.get("quality") if page_num in processed_pages else None
+                        replaced = before is None or quality["quality"] >= before
+                        results[page_num] = {
+                            "before": before,
+                            "after": quality["quality"],
+                            "replaced": replaced,
+                        }
+                        if not replaced:
+                            continue
+                        offset, length, digest = store.append(page_num, content)
+                        manifest.mark_done(
+                            page_num,
+                            offset,
+                            length,
+                            digest,
+                            source="api",
+                            reprocessed=previous.get("reprocessed", 0) + 1,
+                            **signature,
+                            **quality,
+                            **route,
+                        )
+                        processed_pages.add(page_num)
+                        self._write_page(
+                            writers, pdf_path, page_num, content, manifest, total_pages
+                        )
+
+                # As páginas são renderizadas aqui (o PyMuPDF não é seguro
+                # entre threads) e enviadas à API em paralelo
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    pending = {}
+                    for page_num in pages:
+                        rendered = render_page(
+                            pdf_document,
+                            page_num,
+                            self.image_encoder,
+                            signature=True,
+                            tiler=self.tiler,
+                        )
+                        future = executor.submit(
+                            self._process_page_content,
+                            rendered["image"],
+                            page_num + 1,
+                            total_pages,
+                            True,
+                            rendered["tiles"],
+                            rendered["signature"]["ink"],
+                        )
+                        pending[future] = page_num, rendered["signature"]
+                        if len(pending) >= self.max_workers:
+                            collect(pending, FIRST_COMPLETED)
+                    while pending:
+                        collect(pending, FIRST_COMPLETED)
+
+            self._update_progress_file(
+                f"{output_base}_progresso.json",
+                self._last_contiguous_page(processed_pages),
+                processed_pages,
+                total_pages,
+            )
+            self._finalize_outputs(
+                writers, pdf_path, store, manifest, processed_pages, total_pages
+            )
+        finally:
+            for writer in writers:
+                writer.close()
+            store.close()
+            manifest.close()
+
+        replaced = [page_num for page_num, result in results.items() if result["replaced"]]
+        print(f"{len(replaced)} de {len(pages)} páginas substituídas em {writers[0].path}")
+        for page_num, result in sorted(results.items()):
+            print(
+                f"  página {page_num + 1}: nota {result['before']} -> {result['after']}"
+                + ("" if result["replaced"] else " (mantido o resultado anterior)")
+            )
+        return results
+
+    def process_revision(self, pdf_path, previous_pdf, max_distance=4):
+        """
+        Processa uma nova edição de um PDF já processado, enviando à API
+        apenas as páginas novas ou alteradas
+
+        Cada página recebe uma impressão digital (hash perceptual e hash da
+        camada de texto, ver revisions.py), alinhada às páginas do
+        resultado de previous_pdf, que deve estar ao lado dele; páginas
+        inseridas, removidas ou reordenadas não deslocam o resto. As páginas
+        iguais reaproveitam o resultado anterior. As impressões digitais
+        ficam no manifesto, então a próxima edição pode ser comparada mesmo
+        que o PDF anterior já não exista (inclusive substituído no mesmo
+        caminho). O relatório das diferenças vai para <nome>_revisao.json e
+        é devolvido, com o arquivo gerado em "output".
+        """
+        import fitz  # PyMuPDF
+
+        output_base = pdf_path.rsplit(".", 1)[0]
+        previous_base = previous_pdf.rsplit(".", 1)[0]
+        store_file = f"{output_base}_paginas.dat"
+        manifest_file = f"{output_base}_manifesto.jsonl"
+        previous_manifest_file = f"{previous_base}_manifesto.jsonl"
+        if not os.path.exists(previous_manifest_file):
+            raise ValueError(f"Nenhum resultado anterior de {previous_pdf} encontrado")
+
+        with fitz.open(pdf_path) as pdf_document:
+            total_pages = len(pdf_document)
+            fingerprints = document_fingerprints(pdf_document, self.streaming)
+
+        previous_manifest = PageManifest(previous_manifest_file)
+        previous_store = PageStore(
+            f"{previous_base}_paginas.dat", index=previous_manifest.store_index()
+        )
+        try:
+            previous_pages = sorted(
+                page_num for page_num in previous_manifest.done_pages() if page_num in previous_store
+            )
+            previous_fingerprints = {
+                page_num: previous_manifest.entries[page_num]["fingerprint"]
+                for page_num in previous_pages
+                if "fingerprint" in previous_manifest.entries[page_num]
+            }
+            missing = [
+                page_num for page_num in previous_pages if page_num not in previous_fingerprints
+            ]
+            if missing and os.path.abspath(previous_pdf) != os.path.abspath(pdf_path):
+                # Resultado anterior sem impressões digitais: calculadas do PDF anterior
+                with fitz.open(previous_pdf) as previous_document:
+                    for page_num in missing:
+                        if page_num < len(previous_document):
+                            previous_fingerprints[page_num] = page_fingerprint(
+                                previous_document[page_num]
+                            )
+            if len(previous_fingerprints) < len(previous_pages):
+                print(
+                    f"Aviso: {len(previous_pages) - len(previous_fingerprints)} páginas do "
+                    f"resultado anterior sem impressão digital serão refeitas"
+                )
+
+            changes, removed = align_revisions(previous_fingerprints, fingerprints, max_distance)
+
+            # Recria os arquivos da nova edição só com as páginas reaproveitadas
+            for path in (store_file + ".tmp", manifest_file + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            store = PageStore(store_file + ".tmp")
+            manifest = PageManifest(manifest_file + ".tmp")
+            try:
+                for page_num, status, previous_page in changes:
+                    if status not in ("unchanged", "moved"):
+                        continue
+                    content = self._reuse_page_content(
+                        previous_store.read(previous_page), page_num + 1, total_pages
+                    )
+                    offset, length, digest = store.append(page_num, content)
+                    extra = {
+                        key: value
+                        for key, value in previous_manifest.entries[previous_page].items()
+                        if key
+                        not in ("page", "status", "offset", "length", "sha256", "duplicate_of", "shard")
+                    }
+                    extra.update(fingerprint=fingerprints[page_num], reused_from=previous_page)
+                    manifest.mark_done(page_num, offset, length, digest, **extra)
+                processed_pages = set(store.pages())
+            finally:
+                store.close()
+                manifest.close()
+        finally:
+            previous_store.close()
+            previous_manifest.close()
+        os.replace(store_file + ".tmp", store_file)
+        os.replace(manifest_file + ".tmp", manifest_file)
+        self._update_progress_file(
+            f"{output_base}_progresso.json",
+            self._last_contiguous_page(processed_pages),
+            processed_pages,
+            total_pages,
+        )
+
+        summary = {status: 0 for status in ("unchanged", "moved", "modified", "inserted")}
+        for _, status, _ in changes:
+            summary[status] += 1
+        summary["removed"] = len(removed)
+        report = {
+            "document": pdf_path,
+            "previous": previous_pdf,
+            "total_pages": total_pages,
+            "summary": summary,
+            "pages": [
+                {
+                    "page": page_num + 1,
+                    "status": status,
+                    "previous_page": None if previous_page is None else previous_page + 1,
+                }
+                for page_num, status, previous_page in changes
+            ],
+            "removed": [page_num + 1 for page_num in removed],
+        }
+        with open(f"{output_base}_revisao.json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        to_process = [page_num for page_num in range(total_pages) if page_num not in processed_pages]
+        print(
+            f"Revisão de {previous_pdf}: {summary['unchanged']} páginas iguais, "
+            f"{summary['moved']} movidas, {summary['modified']} alteradas, "
+            f"{summary['inserted']} inseridas e {summary['removed']} removidas"
+        )
+        if to_process:
+            print(f"Páginas enviadas à API: {format_pages(to_process)}")
+
+        report["output"] = self.process_document(pdf_path)
+
+        # Guarda a impressão digital das páginas processadas agora
+        manifest = PageManifest(manifest_file)
+        try:
+            for page_num in sorted(manifest.done_pages()):
+                entry = manifest.entries[page_num]
+                if "fingerprint" not in entry:
+                    extra = {
+                        key: value
+                        for key, value in entry.items()
+                        if key not in ("page", "status", "offset", "length", "sha256")
+                    }
+                    manifest.mark_done(
+                        page_num,
+                        entry["offset"],
+                        entry["length"],
+                        entry["sha256"],
+                        fingerprint=fingerprints[page_num],
+                        **extra,
+                    )
+        finally:
+            manifest.close()
+        return report
+
+    def _validate_page(self, page_num, raw_text, content, ink=None):
+        """Nota e problemas de uma página devolvida pelo modelo"""
+        quality = self.validator.validate(raw_text, self._page_body(content), ink)
+        if quality["quality_flags"]:
+            print(
+                f"Aviso: página {page_num + 1} com possíveis problemas "
+                f"({', '.join(quality['quality_flags'])})"
+            )
+        return quality
+
+    def _report_flagged_pages(self, pdf_path, manifest, processed_pages):
+        """Lista as páginas marcadas pela validação ao fim do documento"""
+        flagged = [
+            page_num
+            for page_num in processed_pages
+            if self.validator.is_flagged(manifest.entries.get(page_num, {}))
+        ]
+        if flagged:
+            print(
+                f"Páginas marcadas pela validação: {format_pages(flagged)}. "
+                f"Para refazê-las: ocr.reprocess_pages('{pdf_path}')"
+            )
+
+    def _report_cascade(self, manifest, processed_pages):
+        """Resume em que nível da cascata as páginas foram respondidas"""
+        if self.cascade is None:
+            return
+        tiers = {}
+        reasons = {}
+        for page_num in processed_pages:
+            entry = manifest.entries.get(page_num, {})
+            if "tier" not in entry:
+                continue
+            tiers[entry["tier"]] = tiers.get(entry["tier"], 0) + 1
+            for escalation in entry["escalations"]:
+                for reason in escalation["reasons"]:
+                    reasons[reason] = reasons.get(reason, 0) + 1
+        if tiers:
+            print(
+                "Cascata de modelos: "
+                + ", ".join(
+                    f"{tier.name} {tiers[tier.name]} páginas"
+                    for tier in self.cascade.tiers
+                    if tier.name in tiers
+                )
+                + (
+                    " (escalonamentos: "
+                    + ", ".join(f"{reason} {count}" for reason, count in sorted(reasons.items()))
+                    + ")"
+                    if reasons
+                    else ""
+                )
+            )
+
+    def _report_hedging(self):
+        """Resume as cópias de chamadas lentas enviadas até aqui"""
+        if self.hedging is None or not self.hedging.hedges:
+            return
+        summary = self.hedging.summary()
+        print(
+            f"Cópias de chamadas lentas: {summary['hedges']} de {summary['requests']} chamadas, "
+            f"{summary['hedges_won']} responderam primeiro (limiar {summary['threshold']}s)"
+        )
+
+    def _first_pending_page(self, processed_pages, range_start, range_stop):
+        """Primeira página do intervalo ainda não concluída (ou range_stop)"""
+        page_num = range_start
+        while page_num < range_stop and page_num in processed_pages:
+            page_num += 1
+        return page_num
+
+    def _last_contiguous_page(self, processed_pages):
+        """Última página antes da primeira lacuna (last_page do progresso)"""
+        next_page = 0
+        while next_page in processed_pages:
+            next_page += 1
+        return next_page - 1 if next_page else None
+
+    def index_document(self, pdf_path, index):
+        """
+        Indexa no index (search_index.SearchIndex) as páginas já processadas
+        de um PDF, ex.: documentos processados antes do índice existir.
+        Páginas que não mudaram desde a última indexação são ignoradas.
+        Devolve quantas páginas foram (re)indexadas.
+        """
+        import fitz  # PyMuPDF
+
+        output_dir = os.path.dirname(pdf_path)
+        file_base = os.path.basename(pdf_path).rsplit(".", 1)[0]
+        output_base = os.path.join(output_dir, file_base)
+        with fitz.open(pdf_path) as pdf_document:
+            total_pages = len(pdf_document)
+        store, manifest, processed_pages = self._open_page_state(
+            f"{output_base}_paginas.dat",
+            f"{output_base}_manifesto.jsonl",
+            f"{output_base}_processado.html",
+        )
+        try:
+            records = (
+                self._page_record(
+                    pdf_path, page_num, store.read(page_num), manifest.entries[page_num], total_pages
+                )
+                for page_num in sorted(processed_pages)
+            )
+            return index.index_document(pdf_path, records, total_pages)
+        finally:
+            store.close()
+            manifest.close()
+
+    def _open_page_state(self, store_file, manifest_file, output_html):
+        """
+        Abre o armazenamento de páginas e o manifesto de um documento
+
+        Saídas antigas, sem manifesto ou sem o arquivo de páginas, são
+        migradas. Retorna (store, manifest, páginas processadas), onde só
+        contam como processadas as páginas cujo conteúdo está íntegro.
+        """
+        has_manifest = os.path.exists(manifest_file)
+        migrate = not os.path.exists(store_file) and os.path.exists(output_html)
+        manifest = PageManifest(manifest_file)
+        store = PageStore(
+            store_file, index=manifest.store_index() if has_manifest else None
+        )
+        if migrate:
+            existing_content = self._extract_existing_content(output_html)
+            for page_num in sorted(existing_content):
+                store.append(page_num, existing_content[page_num])
+        if not has_manifest:
+            for page_num, (offset, length, digest) in store.index().items():
+                manifest.mark_done(page_num, offset, length, digest)
+
+        interrupted = sorted(manifest.interrupted_pages())
+        if interrupted:
+            print(
+                f"Páginas interrompidas que serão refeitas: {', '.join(str(p + 1) for p in interrupted)}"
+            )
+
+        processed_pages = {
+            page_num for page_num in manifest.done_pages() if page_num in store
+        }
+        return store, manifest, processed_pages
+
+    def output_path(self, output_base):
+        """Arquivo devolvido para um documento: o do primeiro formato de saída"""
+        return create_writers(self.output_formats[:1], output_base, self._render_html)[0].path
+
+    def _html_split(self, pdf_document):
+        """
+        Divisão do HTML do documento (ver HtmlWriter): o número de páginas
+        por arquivo, as páginas de início dos capítulos ou None
+        """
+        if self.html_split != "chapters":
+            return self.html_split
+        # Capítulos = entradas de primeiro nível do sumário do PDF
+        starts = {
+            page - 1
+            for level, _, page in pdf_document.get_toc(simple=True)
+            if level == 1 and page >= 1
+        }
+        return sorted(starts | {0}) if len(starts - {0}) else None
+
+    def _assemble_html(self, output_path, store, processed_pages=None, total_pages=None):
+        """Monta o HTML a partir das páginas armazenadas, em ordem (pré-visualização)"""
+        with self.metrics.timer("assemble_html"):
+            HtmlWriter(output_path, self._render_html).finalize(
+                ({"html": content} for content in store.iter_contents()),
+                processed_pages,
+                total_pages,
+            )
+
+    def _finalize_outputs(
+        self, writers, document, store, manifest, processed_pages=None, total_pages=None
+    ):
+        """Gera cada formato de saída a partir das páginas armazenadas, em ordem"""
+        if processed_pages is None:
+            processed_pages = self.processed_pages
+        if total_pages is None:
+            total_pages = self.total_pages
+        with self.metrics.timer("write_outputs"):
+            for writer in writers:
+                records = (
+                    self._page_record(
+                        document,
+                        page_num,
+                        store.read(page_num),
+                        manifest.entries.get(page_num, {}),
+                        total_pages,
+                    )
+                    for page_num in store.pages()
+                )
+                writer.finalize(records, processed_pages, total_pages)
+
+    def _write_page(self, writers, document, page_num, content, manifest, total_pages):
+        """Envia uma página concluída aos formatos gravados página a página"""
+        incremental = [writer for writer in writers if writer.incremental]
+        if not incremental:
+            return
+        record = self._page_record(
+            document, page_num, content, manifest.entries[page_num], total_pages
+        )
+        with self.metrics.timer("write_page"):
+            for writer in incremental:
+                writer.write_page(record)
+
+    def _page_record(self, document, page_num, content, entry, total_pages):
+        """Registro de uma página para os formatos de saída (ver writers.py)"""
+        source = entry.get("source")
+        if source == "blank":
+            text = ""
+        else:
+            text = self._page_body(content)
+            if source == "text_layer":
+                # A camada de texto é escapada antes de entrar no HTML
+                text = html.unescape(text)
+        started_at, finished_at = entry.get("started_at"), entry.get("finished_at")
+        return {
+            "document": document,
+            "page": page_num + 1,
+            "total_pages": total_pages,
+            "text": text,
+            "html": content,
+            "source": source,
+            "sha256": entry.get("sha256"),
+            "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "phash": entry.get("phash"),
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "seconds": round(finished_at - started_at, 4)
+            if started_at and finished_at
+            else None,
+        }
+
     def _extract_existing_content(self, html_path):
         """Extrai o conteúdo existente de páginas já processadas do arquivo HTML"""
         try:
@@ -189,23 +1606,56 @@ class GeminiOCR:
             print(f"Aviso: Não foi possível extrair conteúdo existente: {e}")
             return {}
 
-    def _update_progress_file(self, progress_file, last_processed):
+    def _update_decision_report(self, report_file, decisions):
+        """Acrescenta as decisões desta execução ao relatório por página"""
+        report = {}
+        if os.path.exists(report_file):
+            with open(report_file, "r", encoding="utf-8") as f:
+                report = json.load(f)
+
+        for page_num, decision in decisions.items():
+            report[str(page_num + 1)] = decision
+        report = dict(sorted(report.items(), key=lambda item: int(item[0])))
+
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    def _update_progress_file(
+        self, progress_file, last_processed, processed_pages=None, total_pages=None
+    ):
         """Atualiza o arquivo de controle de progresso"""
+        if processed_pages is None:
+            processed_pages = self.processed_pages
+        if total_pages is None:
+            total_pages = self.total_pages
         progress_data = {
-            "total_pages": self.total_pages,
-            "processed_pages": sorted(self.processed_pages),
+            "total_pages": total_pages,
+            "processed_pages": sorted(processed_pages),
             "last_page": last_processed,
-            "progress_percentage": round(
-                len(self.processed_pages) * 100 / self.total_pages, 2
-            ),
+            "progress_percentage": round(len(processed_pages) * 100 / total_pages, 2),
         }
 
         with open(progress_file, "w", encoding="utf-8") as f:
             json.dump(progress_data, f, indent=2)
 
-    def _save_html_file(self, output_path, content):
+    def _save_html_file(self, output_path, content, processed_pages=None, total_pages=None):
         """Salva o conteúdo no arquivo HTML final"""
-        html = f"""
+        with self.metrics.timer("save_html"):
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(self._render_html(content, processed_pages, total_pages))
+
+    def _render_html(self, content, processed_pages=None, total_pages=None, page_files=None):
+        """
+        Aplica o modelo HTML do documento ao conteúdo
+
+        page_files ({página: arquivo}) aponta os links do índice para o
+        arquivo de cada página quando o HTML é dividido em vários arquivos.
+        """
+        if processed_pages is None:
+            processed_pages = self.processed_pages
+        if total_pages is None:
+            total_pages = self.total_pages
+        return f"""
         <!DOCTYPE html>
         <html lang="pt-BR">
         <head>
@@ -215,6 +1665,33 @@ class GeminiOCR:
             
             <!-- MathJax Config -->
             <script>
+            // As fórmulas de cada página só são processadas quando ela se
+            // aproxima da área visível, em vez de todas ao carregar
+            let typesetQueue = Promise.resolve();
+
+            function typesetPage(page) {{
+                typesetQueue = typesetQueue
+                    .then(() => MathJax.typesetPromise([page]))
+                    .catch(error => console.error(error));
+            }}
+
+            function observePages() {{
+                const pages = document.querySelectorAll('.page-content');
+                if (!('IntersectionObserver' in window)) {{
+                    pages.forEach(typesetPage);
+                    return;
+                }}
+                const observer = new IntersectionObserver(entries => {{
+                    entries.forEach(entry => {{
+                        if (entry.isIntersecting) {{
+                            observer.unobserve(entry.target);
+                            typesetPage(entry.target);
+                        }}
+                    }});
+                }}, {{ rootMargin: '100% 0px' }});
+                pages.forEach(page => observer.observe(page));
+            }}
+
             MathJax = {{
                 tex: {{
                     inlineMath: [['$', '$']],
@@ -223,10 +1700,20 @@ class GeminiOCR:
                 }},
                 svg: {{
                     fontCache: 'global'
+                }},
+                startup: {{
+                    typeset: false,
+                    ready: function() {{
+                        MathJax.startup.defaultReady();
+                        if (document.readyState === 'loading') {{
+                            document.addEventListener('DOMContentLoaded', observePages);
+                        }} else {{
+                            observePages();
+                        }}
+                    }}
                 }}
             }};
             </script>
-            <script src="https://polyfill.io/v3/polyfill.min.js?features=es6"></script>
             <script id="MathJax-script" async src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-svg.js"></script>
             
             <style>
@@ -235,6 +1722,7 @@ class GeminiOCR:
                     --bg-color: #fff;
                     --content-bg: #ffffff;
                     --equation-bg: #f8f9fa;
+                    --note-color: #666;
                     --line-height: 1.6;
                     --font-size: 16px;
                 }}
@@ -283,6 +1771,14 @@ class GeminiOCR:
                     padding-bottom: 10px;
                 }}
                 
+                /* Aviso no lugar do texto (ex.: página em branco) */
+                .page-note {{
+                    color: var(--note-color);
+                    font-style: italic;
+                    text-align: center;
+                    margin: 2em 0;
+                }}
+                
                 .index {{
                     background-color: #f5f5f5;
                     padding: 15px;
@@ -353,6 +1849,7 @@ class GeminiOCR:
                     --bg-color: #1a1a1a;
                     --content-bg: #2d2d2d;
                     --equation-bg: #363636;
+                    --note-color: #aaa;
                 }}
                 
                 body.high-contrast {{
@@ -360,6 +1857,12 @@ class GeminiOCR:
                     --bg-color: #000;
                     --content-bg: #000;
                     --equation-bg: #333;
+                    --note-color: #ff0;
+                }}
+                
+                body.high-contrast .page-note {{
+                    font-style: normal;
+                    font-weight: bold;
                 }}
                 
                 /* Para acomodar o feedback de usuários com deficiência visual */
@@ -420,14 +1923,14 @@ class GeminiOCR:
         <body>
             <header>
                 <h1>Documento Processado</h1>
-                <div id="progress-bar" style="width: {round(len(self.processed_pages) * 100 / self.total_pages, 2)}%;"></div>
-                <p><strong>Progresso:</strong> {len(self.processed_pages)}/{self.total_pages} páginas processadas ({round(len(self.processed_pages) * 100 / self.total_pages, 2)}%)</p>
+                <div id="progress-bar" style="width: {round(len(processed_pages) * 100 / total_pages, 2)}%;"></div>
+                <p><strong>Progresso:</strong> {len(processed_pages)}/{total_pages} páginas processadas ({round(len(processed_pages) * 100 / total_pages, 2)}%)</p>
             </header>
             
             <div class="index">
                 <h2>Índice de Páginas</h2>
                 <div class="index-links">
-                    {self._generate_index_links()}
+                    {self._generate_index_links(processed_pages, page_files)}
                 </div>
             </div>
             
@@ -456,7 +1959,7 @@ class GeminiOCR:
                         const pageId = `page-${{pageNum}}`;
                         
                         // Adiciona links no índice se não existirem
-                        if (!document.querySelector(`.index-link[href="#${{pageId}}"]`)) {{
+                        if (!document.querySelector(`.index-link[href$="#${{pageId}}"]`)) {{
                             const indexLinks = document.querySelector('.index-links');
                             if (indexLinks) {{
                                 const link = document.createElement('a');
@@ -477,29 +1980,27 @@ class GeminiOCR:
                     }}
                 }});
                 
+                // As fórmulas em SVG usam currentColor e medidas relativas à
+                // fonte: tema e tamanho mudam sem processá-las de novo
                 function toggleDarkMode() {{
                     document.body.classList.toggle('dark-mode');
                     document.body.classList.remove('high-contrast');
-                    refreshMathJax();
                 }}
                 
                 function toggleHighContrast() {{
                     document.body.classList.toggle('high-contrast');
                     document.body.classList.remove('dark-mode');
-                    refreshMathJax();
                 }}
                 
                 let currentFontSize = 16;
                 function increaseFontSize() {{
                     currentFontSize = Math.min(currentFontSize * 1.1, 32);
                     document.documentElement.style.setProperty('--font-size', currentFontSize + 'px');
-                    refreshMathJax();
                 }}
                 
                 function decreaseFontSize() {{
                     currentFontSize = Math.max(currentFontSize * 0.9, 12);
                     document.documentElement.style.setProperty('--font-size', currentFontSize + 'px');
-                    refreshMathJax();
                 }}
                 
                 let currentLineHeight = 1.6;
@@ -512,63 +2013,405 @@ class GeminiOCR:
                     currentLineHeight = Math.max(currentLineHeight * 0.9, 1.2);
                     document.documentElement.style.setProperty('--line-height', currentLineHeight);
                 }}
-                
-                function refreshMathJax() {{
-                    if (typeof MathJax !== 'undefined') {{
-                        MathJax.typesetClear();
-                        MathJax.typesetPromise();
-                    }}
-                }}
             </script>
         </body>
         </html>
         """
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html)
-
-    def _generate_index_links(self):
+    def _generate_index_links(self, processed_pages=None, page_files=None):
         """Gera os links para o índice com base nas páginas processadas"""
-        links = ""
-        for page in sorted(self.processed_pages):
+        if processed_pages is None:
+            processed_pages = self.processed_pages
+        page_files = page_files or {}
+        links = []
+        for page in sorted(processed_pages):
             page_num = page + 1  # Página 0 é a página 1 para o usuário
-            links += (
-                f'<a href="#page-{page_num}" class="index-link">Página {page_num}</a>\n'
+            links.append(
+                f'<a href="{page_files.get(page, "")}#page-{page_num}" class="index-link">Página {page_num}</a>\n'
             )
-        return links
+        return "".join(links)
 
-    def _process_page_content(self, image, page_num, total_pages):
-        """Processa o conteúdo de uma página e retorna HTML formatado"""
-        prompt = r"""
-        Analise esta imagem e extraia:
-        1. Texto completo preservando a formatação
-        2. Equações matemáticas em LaTeX (use $$ para display mode, $ para inline)
-        3. Mantenha a precisão técnica do conteúdo
-        4. Preserve símbolos especiais e notações matemáticas
-        
-        IMPORTANTE para notação matemática:
-        1. Use \arcsin (não extarcsen ou arcsen)
-        2. Use \arccos (não extarccos ou arccos)
-        3. Use \arctan (não extarctan ou arctan)
-        4. Use \sin (não sen)
-        5. Use \cos (não cos)
-        6. Use \tan (não tan)
-        7. Use \sqrt{} para raiz quadrada
-        8. Use \frac{}{} para frações
-        
-        Para expressões matemáticas:
-        - Use $ $ para equações inline
-        - Use $$ $$ para equações em display mode
-        - Preserve todos os parênteses e sinais
-        - Mantenha a formatação precisa das funções trigonométricas
-        
-        Mantenha a estrutura do documento e a formatação original.
+    def _process_page_content(
+        self, image, page_num, total_pages, refresh=False, tiles=None, ink=None
+    ):
         """
+        Processa o conteúdo de uma página e retorna (HTML formatado, texto
+        bruto do modelo, rota); refresh=True ignora o cache. Com tiles
+        (recortes da página, ver tiling.py), cada recorte é enviado em
+        paralelo no lugar da imagem inteira. A rota traz os campos da
+        cascata de modelos para o manifesto (vazia sem cascata); ink é a
+        fração de tinta da página, usada pelas regras da cascata.
+        """
+        if self.cascade is None:
+            text, route = self._page_text(image, refresh, tiles), {}
+        else:
+            text, route = self._cascade_text(image, refresh, tiles, ink)
+        return self._format_page(self._clean_text(text), page_num, total_pages), text, route
+
+    async def _process_page_content_async(
+        self, image, page_num, total_pages, tiles=None, ink=None
+    ):
+        """Versão assíncrona de _process_page_content"""
+        if self.cascade is None:
+            text, route = await self._page_text_async(image, tiles), {}
+        else:
+            escalations = []
+            for level, tier in enumerate(self.cascade.tiers):
+                text = await self._page_text_async(image, tiles, tier)
+                reasons = self._escalation_reasons(level, tier, text, ink)
+                if not reasons:
+                    break
+                escalations.append({"tier": tier.name, "reasons": reasons})
+            route = self._cascade_route(tier, escalations)
+        return self._format_page(self._clean_text(text), page_num, total_pages), text, route
+
+    def _page_text(self, image, refresh=False, tiles=None, tier=None):
+        """Texto bruto da página, ou dos recortes unidos, em um modelo"""
+        if not tiles:
+            return self._generate_text(image, refresh, tier=tier)
+        with ThreadPoolExecutor(max_workers=len(tiles)) as executor:
+            texts = list(
+                executor.map(
+                    lambda index: self._generate_text(
+                        tiles[index], refresh, self._tile_prompt(index, len(tiles)), tier
+                    ),
+                    range(len(tiles)),
+                )
+            )
+        return self._join_tiles(texts)
+
+    async def _page_text_async(self, image, tiles=None, tier=None):
+        """Versão assíncrona de _page_text"""
+        if not tiles:
+            return await self._generate_text_async(image, tier=tier)
+        texts = await asyncio.gather(
+            *(
+                self._generate_text_async(tile, self._tile_prompt(index, len(tiles)), tier)
+                for index, tile in enumerate(tiles)
+            )
+        )
+        return self._join_tiles(texts)
 
-        result = self.model.generate_content([prompt, image])
-        cleaned_result = self._clean_text(result)
+    def _cascade_text(self, image, refresh=False, tiles=None, ink=None, first_text=None):
+        """
+        Texto bruto da página pela cascata de modelos e a rota: cada nível
+        só é chamado se a resposta do anterior disparar uma regra.
+        first_text é a resposta do primeiro nível, quando já obtida (lotes).
+        """
+        escalations = []
+        for level, tier in enumerate(self.cascade.tiers):
+            if level == 0 and first_text is not None:
+                text = first_text
+            else:
+                text = self._page_text(image, refresh, tiles, tier)
+            reasons = self._escalation_reasons(level, tier, text, ink)
+            if not reasons:
+                break
+            escalations.append({"tier": tier.name, "reasons": reasons})
+        return text, self._cascade_route(tier, escalations)
+
+    def _escalation_reasons(self, level, tier, text, ink):
+        """Regras disparadas pela resposta do nível (nenhuma no último)"""
+        if level == len(self.cascade.tiers) - 1:
+            return []
+        reasons = self.cascade.escalation_reasons(text, self._clean_text(text), ink)
+        for reason in reasons:
+            self.metrics.increment("escalations_total", tier=tier.name, reason=reason)
+        return reasons
+
+    def _cascade_route(self, tier, escalations):
+        """Campos do manifesto com o nível que respondeu a página"""
+        self.cascade.record_page(tier)
+        self.metrics.increment("cascade_pages_total", tier=tier.name)
+        return {"tier": tier.name, "escalations": escalations}
+
+    def _tile_prompt(self, index, count):
+        """Instruções para o recorte index (a partir de 0) de count"""
+        return self.prompt + self.tile_prompt.format(index=index + 1, count=count)
+
+    def _join_tiles(self, texts):
+        """Une os textos dos recortes, na ordem de leitura, no texto da página"""
+        self.metrics.increment("tiled_pages_total")
+        self.metrics.increment("tiles_total", len(texts))
+        return "\n\n".join(text.strip() for text in texts)
+
+    def _process_page_batch(self, images, page_nums, total_pages, tiles=None, inks=None):
+        """
+        Processa um lote de páginas e retorna (HTML, texto bruto, rota) de
+        cada uma, em ordem; tiles são os recortes de um lote de uma única
+        página e inks a fração de tinta de cada página (ou None)
+        """
+        inks = inks or [None] * len(images)
+        if len(images) == 1:
+            return [
+                self._process_page_content(
+                    images[0], page_nums[0], total_pages, tiles=tiles, ink=inks[0]
+                )
+            ]
+
+        # O lote vai ao primeiro nível da cascata; as páginas que disparam
+        # uma regra sobem de nível uma a uma
+        results = []
+        for image, page_num, ink, text in zip(
+            images, page_nums, inks, self._generate_batch_texts(images, page_nums)
+        ):
+            route = {}
+            if self.cascade is not None:
+                text, route = self._cascade_text(image, ink=ink, first_text=text)
+            results.append(
+                (self._format_page(self._clean_text(text), page_num, total_pages), text, route)
+            )
+        return results
+
+    def _cache_key(self, image, prompt=None, model_name=None):
+        """Chave da página no cache, ou None se o cache estiver desativado"""
+        if self.cache is None:
+            return None
+        if isinstance(image, dict):
+            image_bytes = image["mime_type"].encode() + b":" + image["data"]
+        else:
+            image_bytes = f"{image.mode}:{image.size}:".encode() + image.tobytes()
+        return self.cache.make_key(
+            image_bytes, prompt or self.prompt, model_name or self.model_name
+        )
 
-        # Formata o conteúdo da página com cabeçalho e rodapé identificáveis
+    def _cache_get(self, key):
+        """Texto guardado no cache para a chave, ou None"""
+        if key is None:
+            return None
+        text = self.cache.get(key)
+        self.metrics.increment("cache_hits_total" if text is not None else "cache_misses_total")
+        return text
+
+    def _generate_text(self, image, refresh=False, prompt=None, tier=None):
+        """
+        Obtém o texto bruto da página, consultando o cache antes da API
+
+        image pode ser uma imagem PIL ou um blob {"mime_type", "data"}
+        já codificado pelo PageImageEncoder. Com refresh=True a API é
+        sempre chamada, e a resposta nova substitui a do cache. prompt
+        substitui as instruções padrão (ex.: recortes de página) e tier
+        (cascade.ModelTier) o modelo padrão.
+        """
+        prompt = prompt or self.prompt
+        key = self._cache_key(image, prompt, tier and tier.name)
+        cached = None if refresh else self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        text = self._response_text(self._call_model([prompt, image], tier))
+        if key is not None:
+            self.cache.put(key, text)
+        return text
+
+    async def _generate_text_async(self, image, prompt=None, tier=None):
+        """Versão assíncrona de _generate_text"""
+        prompt = prompt or self.prompt
+        key = self._cache_key(image, prompt, tier and tier.name)
+        text = self._cache_get(key)
+        if text is not None:
+            return text
+        model = self.model if tier is None else tier.model
+
+        async def attempt():
+            self.metrics.increment("api_requests_total")
+            try:
+                result = await model.generate_content_async([prompt, image])
+            except Exception as e:
+                self._record_api_error(e)
+                raise
+            self._record_usage(result, tier)
+            return result
+
+        def call():
+            return self.scheduler.call_async(
+                attempt,
+                estimated_tokens=ESTIMATED_PAGE_TOKENS,
+                used_tokens=self._used_tokens,
+            )
+
+        with self.metrics.timer("api"):
+            if self.hedging is None:
+                result = await call()
+            else:
+                result = await self.hedging.call_async(call, self._record_hedge)
+        text = self._response_text(result)
+        if key is not None:
+            self.cache.put(key, text)
+        return text
+
+    def _generate_batch_texts(self, images, page_nums):
+        """
+        Obtém o texto bruto de várias páginas com uma única chamada
+
+        As páginas já presentes no cache não são enviadas. Se a resposta
+        não puder ser separada com segurança, cada página restante é
+        enviada individualmente.
+        """
+        # Com cascata, os lotes vão ao primeiro nível (ver _cascade_text)
+        tier = self.cascade.tiers[0] if self.cascade else None
+        keys = [self._cache_key(image) for image in images]
+        texts = [self._cache_get(key) for key in keys]
+        missing = [i for i, text in enumerate(texts) if text is None]
+
+        if len(missing) > 1:
+            parts = [
+                self.prompt
+                + self.batch_prompt.format(
+                    count=len(missing),
+                    pages=", ".join(str(page_nums[i]) for i in missing),
+                )
+            ]
+            for i in missing:
+                parts += [f"Página {page_nums[i]}:", images[i]]
+
+            split = self._split_batch_response(
+                self._response_text(self._call_model(parts, tier)),
+                [page_nums[i] for i in missing],
+            )
+            if split is None:
+                print(
+                    f"Resposta ambígua para o lote de páginas {page_nums[missing[0]]}-{page_nums[missing[-1]]}, "
+                    f"processando individualmente"
+                )
+            else:
+                for i, text in zip(missing, split):
+                    texts[i] = text
+                    if keys[i] is not None:
+                        self.cache.put(keys[i], text)
+
+        for i, text in enumerate(texts):
+            if text is None:
+                texts[i] = self._generate_text(images[i], tier=tier)
+        return texts
+
+    def _split_batch_response(self, text, page_nums):
+        """
+        Separa a resposta de um lote pelos marcadores de página
+
+        Retorna a lista de textos na ordem de page_nums, ou None quando os
+        marcadores não correspondem exatamente às páginas esperadas ou
+        alguma página ficou vazia.
+        """
+        markers = list(_BATCH_MARKER.finditer(text))
+        if [int(marker.group(1)) for marker in markers] != list(page_nums):
+            return None
+        if text[: markers[0].start()].strip():
+            return None
+
+        texts = []
+        for marker, next_marker in zip(markers, markers[1:] + [None]):
+            end = next_marker.start() if next_marker else len(text)
+            page_text = text[marker.end() : end].strip()
+            if not page_text:
+                return None
+            texts.append(page_text)
+        return texts
+
+    def _response_text(self, result):
+        """Texto de uma resposta do modelo"""
+        if not hasattr(result, "text"):
+            raise ValueError("Resposta do Gemini não contém texto")
+        text = result.text
+        self.metrics.increment("response_chars_total", len(text))
+        self.metrics.observe("response_chars", len(text), CHAR_BUCKETS)
+        return text
+
+    def _reuse_page_content(self, page_content, page_num, total_pages):
+        """Reaproveita o conteúdo formatado de outra página para page_num"""
+        return self._format_page(self._page_body(page_content), page_num, total_pages)
+
+    def _page_body(self, page_content):
+        """Texto limpo de uma página, como foi inserido por _format_page"""
+        match = re.search(
+            r'<div class="page-content" data-page="\d+">(.*)</div>\s*<div class="page-footer">',
+            page_content,
+            re.DOTALL,
+        )
+        return match.group(1).strip() if match else ""
+
+    def _call_model(self, parts, tier=None):
+        """
+        Chama o modelo (ou o nível tier da cascata) pelo agendador (limites
+        de taxa e novas tentativas)
+        """
+        model = self.model if tier is None else tier.model
+
+        def attempt():
+            self.metrics.increment("api_requests_total")
+            try:
+                result = model.generate_content(parts)
+            except Exception as e:
+                self._record_api_error(e)
+                raise
+            self._record_usage(result, tier)
+            return result
+
+        def call(cancelled=None):
+            return self.scheduler.call(
+                attempt,
+                estimated_tokens=ESTIMATED_PAGE_TOKENS,
+                used_tokens=self._used_tokens,
+                cancelled=cancelled,
+            )
+
+        # O estágio "api" inclui as esperas por limite de taxa, as novas
+        # tentativas e as cópias das chamadas lentas
+        with self.metrics.timer("api"):
+            if self.hedging is None:
+                return call()
+            return self.hedging.call(call, self._record_hedge)
+
+    def _record_hedge(self, won):
+        """Contabiliza uma cópia de chamada lenta e se foi ela que respondeu"""
+        self.metrics.increment("hedges_total")
+        if won:
+            self.metrics.increment("hedges_won_total")
+
+    def _record_api_error(self, error):
+        self.metrics.increment(
+            "api_errors_total", status=error_status(error) or type(error).__name__
+        )
+
+    def _record_usage(self, response, tier=None):
+        """Contabiliza os tokens informados em usage_metadata"""
+        if tier is not None:
+            self.cascade.record_call(tier, self._used_tokens(response))
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        for field, kind in (
+            ("prompt_token_count", "prompt"),
+            ("candidates_token_count", "output"),
+        ):
+            count = getattr(usage, field, 0) or 0
+            if count:
+                self.metrics.increment("tokens_total", count, kind=kind)
+
+    def _record_render(self, rendered):
+        """Registra o tempo das etapas de preparação de uma página"""
+        for stage, seconds in rendered["timings"].items():
+            self.metrics.record_stage(stage, seconds)
+
+    def _record_page(self, document, manifest, page_num, source):
+        """Contabiliza uma página concluída e envia o evento "page" aos sinks"""
+        if not self.metrics.enabled:
+            return
+        self.metrics.increment("pages_total", source=source)
+        entry = manifest.entries[page_num]
+        event = {"event": "page", "document": document, "page": page_num + 1, "source": source}
+        if entry.get("started_at"):
+            event["seconds"] = round(entry["finished_at"] - entry["started_at"], 4)
+            self.metrics.observe("page_seconds", event["seconds"], source=source)
+        self.metrics.emit(event)
+
+    def _used_tokens(self, response):
+        """Total de tokens informado pela API, quando disponível"""
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", 0) or 0
+
+    def _format_page(self, cleaned_result, page_num, total_pages):
+        """Formata o conteúdo da página com cabeçalho e rodapé identificáveis"""
         page_content = f"""
         <div class="page-header" id="page-{page_num}">Página {page_num} de {total_pages}</div>
         <div class="page-content" data-page="{page_num}">
@@ -582,46 +2425,15 @@ class GeminiOCR:
     def _clean_text(self, response):
         """Limpa o texto removendo artefatos indesejados"""
         # Primeiro extraímos o texto do objeto GenerateContentResponse
-        if hasattr(response, "text"):
+        if isinstance(response, str):
+            text = response
+        elif hasattr(response, "text"):
             text = response.text
         else:
             raise ValueError("Resposta do Gemini não contém texto")
 
-        replacements = {
-            r"\u00e7": "ç",
-            r"\u00f5": "õ",
-            r"\u00e3": "ã",
-            r"\n": "\n",
-            r"\t": "    ",
-            "\u2013": "-",
-            "\u2014": "-",
-            r"\u00ed": "í",
-            r"\u00e1": "á",
-            r"\u00e9": "é",
-            r"\u00fa": "ú",
-            r"\u00f3": "ó",
-            "\\\\": "\\",
-            "\u20134": "-",
-            "\u22121": "-",
-            "\u20132": "-",
-            "\u20133": "-",
-        }
-
-        # Remove sequências de escape e códigos Unicode
-        cleaned_text = text
-        for old, new in replacements.items():
-            cleaned_text = cleaned_text.replace(old, new)
-
-        # Remove caracteres de controle remanescentes
-        cleaned_text = re.sub(r"\\u[0-9a-fA-F]{4}", "", cleaned_text)
-
-        # Remove espaços múltiplos
-        cleaned_text = re.sub(r"\s+", " ", cleaned_text)
-
-        # Garante quebras de linha apropriadas
-        cleaned_text = re.sub(r"\\n", "\n", cleaned_text)
-
-        return cleaned_text
+        with self.metrics.timer("clean"):
+            return self.normalizer.normalize(text)
 
     def _process_technical(self, image_path, image):
         """Processa no modo técnico para compatibilidade com o código original"""
@@ -629,18 +2441,361 @@ class GeminiOCR:
         output_path = f"{image_path.rsplit('.', 1)[0]}_tecnico.html"
 
         # Processa a imagem
-        content = self._process_page_content(image, 1, 1)
-        self._save_html_file(output_path, content)
+        content, _, _ = self._process_page_content(image, 1, 1)
+        self._save_html_file(output_path, content, {0}, 1)
 
         return output_path
 
 
-api_key = "suachave"
-ocr = GeminiOCR(api_key)
+def main(argv=None):
+    """
+    Linha de comando: python -m main run <arquivos, pastas ou globs>
+
+    A chave da API vem de --api-key ou da variável GEMINI_API_KEY. Os
+    documentos entram numa fila persistente (--queue) e são processados
+    por um único pool de chamadas à API, compartilhado entre eles; rodar
+    o comando de novo retoma os documentos interrompidos.
+
+    Para dividir PDFs grandes entre processos ou máquinas, cada um roda
+    "run --shard i/n" (ou "--pages a-b") e, com as partes reunidas ao
+    lado dos PDFs, "merge <PDFs>" monta o resultado final.
+    """
+    import argparse
+
+    from jobs import DEFAULT_QUEUE_PATH, JobQueue, JobRunner, collect_documents
+    from sharding import parse_page_range, parse_pages, parse_shard
+
+    def argument_type(parse):
+        """Converte ValueError em erro de uso do argparse"""
+
+        def convert(value):
+            try:
+                return parse(value)
+            except ValueError as e:
+                raise argparse.ArgumentTypeError(str(e))
+
+        return convert
+
+    parser = argparse.ArgumentParser(prog="python -m main", description="OCR de PDFs e imagens com o Gemini")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="arquivo SQLite da fila")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # Parte de cada PDF processada por este comando (cada parte tem sua fila)
+    part = argparse.ArgumentParser(add_help=False)
+    part_options = part.add_mutually_exclusive_group()
+    part_options.add_argument(
+        "--shard", type=argument_type(parse_shard), help="processa só a parte i de n de cada PDF (ex.: 2/4)"
+    )
+    part_options.add_argument(
+        "--pages", type=argument_type(parse_page_range), help="processa só as páginas a-b de cada PDF (ex.: 1-250)"
+    )
+
+    def html_split(value):
+        if value == "chapters":
+            return value
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Divisão inválida: {value} (use um número de páginas ou chapters)")
+        return int(value)
+
+    # Divisão do HTML gerado em vários arquivos e índice de busca
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument(
+        "--html-split",
+        type=argument_type(html_split),
+        help="divide o HTML em arquivos de N páginas ou por capítulo do sumário (chapters)",
+    )
+    output.add_argument(
+        "--index",
+        nargs="?",
+        const=DEFAULT_INDEX_PATH,
+        help="indexa as páginas para o comando search (caminho opcional do índice)",
+    )
+
+    run = commands.add_parser(
+        "run", parents=[part, output], help="enfileira e processa documentos"
+    )
+    run.add_argument("inputs", nargs="*", help="PDFs, imagens, pastas ou padrões glob")
+    run.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    run.add_argument("--model", default="gemini-1.5-flash")
+    run.add_argument(
+        "--escalate-model",
+        nargs="+",
+        help="modelos mais fortes, em ordem, para as páginas duvidosas (ex.: gemini-1.5-pro)",
+    )
+    run.add_argument("--workers", type=int, default=8, help="chamadas simultâneas à API")
+    run.add_argument("--documents", type=int, default=4, help="documentos em andamento ao mesmo tempo")
+    run.add_argument("--cache", nargs="?", const=True, help="cache de respostas (caminho opcional)")
+    run.add_argument("--text-layer", action="store_true", help="usa o texto nativo de PDFs digitais")
+    run.add_argument("--blank-ink", type=float, help="pula páginas com menos tinta que isto (ex.: 0.002)")
+    run.add_argument(
+        "--tile-ink",
+        type=float,
+        help="divide em recortes paralelos as páginas com mais tinta que isto (ex.: 0.1)",
+    )
+    run.add_argument(
+        "--hedge-budget",
+        type=float,
+        help="duplica as chamadas mais lentas que o p95, até esta fração a mais (ex.: 0.05)",
+    )
+    run.add_argument("--rpm", type=int, help="limite de requisições por minuto")
+    run.add_argument("--tpm", type=int, help="limite de tokens por minuto")
+    run.add_argument("--retry-failed", action="store_true", help="reprocessa documentos que falharam")
+    run.add_argument("--metrics-log", help="arquivo JSONL com as métricas de cada página")
+    run.add_argument(
+        "--streaming",
+        action="store_true",
+        help="esvazia o cache do MuPDF a cada página (documentos muito grandes)",
+    )
+    run.add_argument(
+        "--formats",
+        nargs="+",
+        choices=("html", "jsonl", "markdown"),
+        default=["html"],
+        help="arquivos gerados para cada PDF (o primeiro é o principal)",
+    )
+
+    commands.add_parser("status", parents=[part], help="mostra o estado da fila")
+
+    merge = commands.add_parser(
+        "merge", parents=[output], help="junta as partes processadas de cada PDF"
+    )
+    merge.add_argument("inputs", nargs="+", help="PDFs, pastas ou padrões glob")
+    merge.add_argument(
+        "--allow-gaps", action="store_true", help="não trata páginas ausentes como erro"
+    )
+    merge.add_argument(
+        "--formats", nargs="+", choices=("html", "jsonl", "markdown"), default=["html"]
+    )
+
+    reprocess = commands.add_parser(
+        "reprocess",
+        parents=[output],
+        help="refaz só as páginas marcadas pela validação (ou as indicadas)",
+    )
+    reprocess.add_argument("pdf")
+    reprocess.add_argument(
+        "--pages", type=argument_type(parse_pages), help="páginas a refazer (ex.: 3,7,10-12)"
+    )
+    reprocess.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    reprocess.add_argument("--model", default="gemini-1.5-flash")
+    reprocess.add_argument("--escalate-model", nargs="+", help="modelos mais fortes, em ordem")
+    reprocess.add_argument("--workers", type=int, default=8, help="chamadas simultâneas à API")
+    reprocess.add_argument(
+        "--formats", nargs="+", choices=("html", "jsonl", "markdown"), default=["html"]
+    )
+
+    revise = commands.add_parser(
+        "revise",
+        parents=[output],
+        help="processa uma nova edição de um PDF, refazendo só as páginas novas ou alteradas",
+    )
+    revise.add_argument("pdf", help="a nova edição")
+    revise.add_argument("--previous", required=True, help="a edição anterior, já processada")
+    revise.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    revise.add_argument("--model", default="gemini-1.5-flash")
+    revise.add_argument("--workers", type=int, default=8, help="chamadas simultâneas à API")
+    revise.add_argument(
+        "--formats", nargs="+", choices=("html", "jsonl", "markdown"), default=["html"]
+    )
+    search = commands.add_parser("search", help="busca páginas no índice (texto e fórmulas LaTeX)")
+    search.add_argument("query", help='palavras, comandos LaTeX ou fórmulas (ex.: "integral $\\frac{1}{x}$")')
+    search.add_argument("--index", default=DEFAULT_INDEX_PATH, help="arquivo SQLite do índice")
+    search.add_argument("--limit", type=int, default=10)
+    search.add_argument("--document", help="busca só nas páginas deste PDF")
+
+    index_command = commands.add_parser("index", help="indexa documentos já processados")
+    index_command.add_argument("inputs", nargs="+", help="PDFs, pastas ou padrões glob")
+    index_command.add_argument("--index", default=DEFAULT_INDEX_PATH, help="arquivo SQLite do índice")
+    args = parser.parse_args(argv)
+
+    def model_cascade(args):
+        if not args.escalate_model:
+            return None
+        return ModelCascade([ModelTier(name) for name in [args.model] + args.escalate_model])
+
+    # Índices abertos para --index, fechados ao final do comando
+    indexes = []
+
+    def output_formats(args):
+        if not args.index:
+            return args.formats
+        indexes.append(SearchIndex(args.index))
+        return list(args.formats) + [indexes[-1].writer]
+
+    def close_indexes():
+        while indexes:
+            indexes.pop().close()
+
+    def format_counts(counts):
+        return ", ".join(f"{status}: {total}" for status, total in sorted(counts.items())) or "Fila vazia"
+
+    if args.command == "search":
+        index = SearchIndex(args.index)
+        started = time.perf_counter()
+        hits = index.search(args.query, limit=args.limit, document=args.document)
+        elapsed = time.perf_counter() - started
+        for hit in hits:
+            print(f"{hit['document']} p. {hit['page']} ({hit['score']}): {hit['snippet']}")
+        print(f"{len(hits)} páginas encontradas em {elapsed * 1000:.1f} ms")
+        index.close()
+        return 0 if hits else 1
+
+    if args.command == "index":
+        index = SearchIndex(args.index)
+        ocr = GeminiOCR(os.environ.get("GEMINI_API_KEY"))
+        for path in collect_documents(args.inputs):
+            if path.lower().endswith(".pdf"):
+                print(f"{path}: {ocr.index_document(path, index)} páginas indexadas")
+        stats = index.stats()
+        print(f"Índice {args.index}: {stats['documents']} documentos, {stats['pages']} páginas")
+        index.close()
+        return 0
+
+    if args.command == "merge":
+        ocr = GeminiOCR(
+            os.environ.get("GEMINI_API_KEY"),
+            output_formats=output_formats(args),
+            html_split=args.html_split,
+        )
+        incomplete = False
+        try:
+            for path in collect_documents(args.inputs):
+                if not path.lower().endswith(".pdf"):
+                    continue
+                result = ocr.merge_shards(path)
+                if result is None or (result["gaps"] and not args.allow_gaps):
+                    incomplete = True
+        finally:
+            close_indexes()
+        return 1 if incomplete else 0
+
+    if args.command == "reprocess":
+        if not args.api_key:
+            parser.error("informe a chave com --api-key ou GEMINI_API_KEY")
+        ocr = GeminiOCR(
+            args.api_key,
+            max_workers=args.workers,
+            model_name=args.model,
+            cascade=model_cascade(args),
+            output_formats=output_formats(args),
+            html_split=args.html_split,
+        )
+        try:
+            ocr.reprocess_pages(args.pdf, args.pages)
+        finally:
+            close_indexes()
+        return 0
+
+    if args.command == "revise":
+        if not args.api_key:
+            parser.error("informe a chave com --api-key ou GEMINI_API_KEY")
+        ocr = GeminiOCR(
+            args.api_key,
+            max_workers=args.workers,
+            model_name=args.model,
+            output_formats=output_formats(args),
+            html_split=args.html_split,
+        )
+        try:
+            report = ocr.process_revision(args.pdf, args.previous)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            close_indexes()
+        return 0 if report["output"] else 1
+
+    # Partes diferentes do mesmo PDF na mesma máquina não podem dividir a
+    # fila, que identifica os documentos pelo caminho
+    queue_path = args.queue
+    if queue_path == DEFAULT_QUEUE_PATH and (args.shard or args.pages):
+        if args.shard:
+            label = f"{args.shard[0]}de{args.shard[1]}"
+        else:
+            label = f"{args.pages[0] + 1}-{args.pages[1] or 'fim'}"
+        queue_path = queue_path.replace(".sqlite3", f"_parte_{label}.sqlite3")
+
+    queue = JobQueue(queue_path)
+    try:
+        if args.command == "status":
+            print(format_counts(queue.counts()))
+            for document in queue.documents():
+                pages = (
+                    f"{document['done_pages']}/{document['total_pages']} páginas"
+                    if document["total_pages"]
+                    else ""
+                )
+                print(f"[{document['status']:>7}] {document['path']} {pages}")
+                if document["error"]:
+                    print(f"          {document['error']}")
+            return 0
+
+        if not args.api_key:
+            parser.error("informe a chave com --api-key ou GEMINI_API_KEY")
+
+        documents = collect_documents(args.inputs)
+        if args.shard or args.pages:
+            # Imagens têm uma única página: ficam para a execução sem partes
+            documents = [path for path in documents if path.lower().endswith(".pdf")]
+        added = queue.add(documents, requeue_failed=args.retry_failed)
+        print(
+            f"{len(documents)} documentos encontrados, {added} adicionados à fila ({queue_path})"
+        )
+
+        metrics = None
+        if args.metrics_log:
+            from metrics import JsonLogSink, Metrics
+
+            metrics = Metrics([JsonLogSink(args.metrics_log)])
+
+        ocr = GeminiOCR(
+            args.api_key,
+            max_workers=args.workers,
+            cache=args.cache,
+            model_name=args.model,
+            cascade=model_cascade(args),
+            text_layer=args.text_layer,
+            blank_ink_threshold=args.blank_ink,
+            scheduler=RequestScheduler(
+                requests_per_minute=args.rpm,
+                tokens_per_minute=args.tpm,
+                max_concurrency=args.workers,
+            ),
+            metrics=metrics,
+            streaming=args.streaming,
+            output_formats=output_formats(args),
+            html_split=args.html_split,
+            tiler=PageTiler(min_ink=args.tile_ink) if args.tile_ink else None,
+            hedging=(
+                # Pool com folga para a original e a cópia de cada worker
+                HedgePolicy(budget=args.hedge_budget, max_workers=2 * args.workers)
+                if args.hedge_budget
+                else None
+            ),
+        )
+
+        def on_document(path, output, error):
+            if error is None:
+                print(f"Documento concluído: {path} -> {output}")
+
+        try:
+            counts = JobRunner(
+                ocr,
+                queue,
+                documents=args.documents,
+                on_document=on_document,
+                page_range=args.pages,
+                shard=args.shard,
+            ).run()
+        finally:
+            ocr.close()
+        print(format_counts(counts))
+        return 1 if counts.get("failed") else 0
+    finally:
+        queue.close()
+        close_indexes()
+
+
+if __name__ == "__main__":
+    import sys
 
-# Para processar um PDF:
-output = ocr.process_document("caminho_arquivo.pdf ou png")
-# Para retomar o processamento a partir de uma página específica:
-# output = ocr.process_document("caminho/para/documento.pdf", start_page=5)  # Começa da página 6
-# Para processar uma imagem (como antes):
-# output = ocr.process_document("caminho/para/imagem.png")
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Manifesto por página do processamento de um documento
+"""
+
+import json
+import os
+import time
+
+
+class PageManifest:
+    """
+    Registro só de acréscimo (JSON por linha) do estado de cada página.
+
+    Cada linha descreve um evento de uma página: "started" quando ela é
+    enviada para processamento e "done" depois que o conteúdo foi gravado
+    no PageStore, com a posição, o tamanho e o hash do conteúdo. Vale o
+    evento mais recente de cada página; uma página "started" sem "done"
+    correspondente foi interrompida no meio e deve ser refeita.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # página -> último registro conhecido
+        self.entries = {}
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # Linha final incompleta, deixada por uma interrupção
+                data = data[: data.rfind(b"\n") + 1]
+                f.truncate(len(data))
+
+        for line in data.decode("utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self.entries[entry["page"]] = entry
+
+    def _write(self, entry):
+        self.entries[entry["page"]] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def mark_started(self, page_num):
+        """Registra que a página começou a ser processada"""
+        self._write({"page": page_num, "status": "started", "started_at": time.time()})
+
+    def mark_done(self, page_num, offset, length, sha256, **extra):
+        """Registra a página concluída e onde o conteúdo foi gravado"""
+        previous = self.entries.get(page_num, {})
+        entry = {
+            "page": page_num,
+            "status": "done",
+            "offset": offset,
+            "length": length,
+            "sha256": sha256,
+            "started_at": previous.get("started_at"),
+            "finished_at": time.time(),
+        }
+        entry.update(extra)
+        self._write(entry)
+
+    def done_pages(self):
+        """Conjunto das páginas concluídas"""
+        return {
+            page for page, entry in self.entries.items() if entry["status"] == "done"
+        }
+
+    def interrupted_pages(self):
+        """Páginas iniciadas que não chegaram a ser concluídas"""
+        return {
+            page
+            for page, entry in self.entries.items()
+            if entry["status"] == "started"
+        }
+
+    def store_index(self):
+        """Índice página -> (posição, tamanho, hash) para o PageStore"""
+        return {
+            page: (entry["offset"], entry["length"], entry["sha256"])
+            for page, entry in self.entries.items()
+            if entry["status"] == "done"
+        }
+
+    def close(self):
+        self._file.close()
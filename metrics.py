@@ -0,0 +1,316 @@
+"""
+Métricas de desempenho: tempo por estágio, contadores e histogramas
+"""
+
+import json
+import os
+import threading
+import time
+
+# Limites (em segundos) dos histogramas de tempo
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Limites dos histogramas de tamanho
+CHAR_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+BYTE_BUCKETS = (25e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2e6, 5e6)
+
+
+def _key(name, labels):
+    """Nome da série no formato do Prometheus: nome{rótulo="valor"}"""
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{value}"' for label, value in sorted(labels.items()))
+    return f"{name}{{{pairs}}}"
+
+
+class Histogram:
+    """Histograma cumulativo com soma, contagem e máximo"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+
+class _Timer:
+    """Mede o tempo de um bloco with e o registra como estágio"""
+
+    __slots__ = ("_metrics", "_stage", "_start")
+
+    def __init__(self, metrics, stage):
+        self._metrics = metrics
+        self._stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.record_stage(self._stage, time.perf_counter() - self._start)
+        return False
+
+
+class Metrics:
+    """
+    Coleta as métricas do processamento e as repassa aos sinks
+
+    Cada sink é chamado como sink(event, metrics) a cada evento ("page"
+    quando uma página é concluída, "document" com o resumo ao fim de cada
+    documento); ver JsonLogSink, PrometheusFileSink e serve_prometheus.
+    Qualquer função com essa assinatura serve como callback.
+
+    Os tempos por estágio ficam no histograma stage_seconds, rotulado pelo
+    estágio (render, encode, api, clean, store, assemble_html...). Com
+    vários documentos em paralelo os contadores são compartilhados, então
+    o resumo de cada documento inclui o que os outros fizeram no período.
+    """
+
+    enabled = True
+
+    def __init__(self, sinks=(), prefix="gemini_ocr"):
+        self.sinks = list(sinks)
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, stage):
+        """Context manager que registra a duração do bloco no estágio"""
+        return _Timer(self, stage)
+
+    def record_stage(self, stage, seconds):
+        """Registra a duração de um estágio medida em outro lugar"""
+        self.observe("stage_seconds", seconds, stage=stage)
+
+    def emit(self, event):
+        """Envia um evento (dicionário) a todos os sinks"""
+        event.setdefault("timestamp", time.time())
+        for sink in self.sinks:
+            sink(event, self)
+
+    def snapshot(self):
+        """Estado atual dos contadores e estágios, base para finish_document"""
+        with self._lock:
+            return {
+                "time": time.perf_counter(),
+                "counters": dict(self.counters),
+                "stages": {
+                    key: (histogram.sum, histogram.count)
+                    for key, histogram in self.histograms.items()
+                    if key.startswith("stage_seconds{")
+                },
+            }
+
+    def finish_document(self, document, start, **extra):
+        """
+        Calcula o resumo de desempenho do documento desde o snapshot start,
+        envia o evento "document" aos sinks e devolve o resumo
+        """
+        end = self.snapshot()
+        seconds = end["time"] - start["time"]
+        counters = {
+            key: value - start["counters"].get(key, 0)
+            for key, value in end["counters"].items()
+            if value != start["counters"].get(key, 0)
+        }
+        stages = {}
+        for key, (total, count) in end["stages"].items():
+            old_total, old_count = start["stages"].get(key, (0.0, 0))
+            if count != old_count:
+                stage = key[len('stage_seconds{stage="') : -2]
+                stages[stage] = {
+                    "seconds": round(total - old_total, 4),
+                    "count": count - old_count,
+                }
+        pages = sum(value for key, value in counters.items() if key.startswith("pages_total"))
+
+        summary = {
+            "event": "document",
+            "document": document,
+            "seconds": round(seconds, 4),
+            "pages": pages,
+            "pages_per_second": round(pages / seconds, 3) if seconds else None,
+            "stages": stages,
+            "counters": counters,
+        }
+        summary.update(extra)
+        self.emit(summary)
+        return summary
+
+    def to_prometheus(self):
+        """Todas as métricas no formato de texto do Prometheus"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for key, value in sorted(self.counters.items()):
+                name = f"{self.prefix}_{key.split('{')[0]}"
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{self.prefix}_{key} {value}")
+
+            for key, histogram in sorted(self.histograms.items()):
+                base, _, labels = key.partition("{")
+                name = f"{self.prefix}_{base}"
+                labels = labels.rstrip("}")
+                separator = "," if labels else ""
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{name}_sum{suffix} {histogram.sum}")
+                lines.append(f"{name}_count{suffix} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Métricas desativadas: mesma interface de Metrics, sem custo"""
+
+    enabled = False
+
+    def increment(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        pass
+
+    def timer(self, stage):
+        return _NULL_TIMER
+
+    def record_stage(self, stage, seconds):
+        pass
+
+    def emit(self, event):
+        pass
+
+    def snapshot(self):
+        return None
+
+    def finish_document(self, document, start, **extra):
+        return None
+
+
+NULL_METRICS = NullMetrics()
+
+
+class JsonLogSink:
+    """Grava cada evento como uma linha JSON (log estruturado)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event, metrics):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusFileSink:
+    """
+    Mantém um arquivo no formato de texto do Prometheus (ex.: para o
+    textfile collector do node_exporter), regravado ao fim de cada
+    documento e, durante o processamento, no máximo a cada min_interval
+    segundos
+    """
+
+    def __init__(self, path, min_interval=5.0):
+        self.path = path
+        self.min_interval = min_interval
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, event, metrics):
+        now = time.monotonic()
+        with self._lock:
+            if event["event"] != "document" and now - self._last_write < self.min_interval:
+                return
+            self._last_write = now
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus())
+            os.replace(temp_path, self.path)
+
+
+def serve_prometheus(metrics, port=9464, host="127.0.0.1"):
+    """
+    Expõe as métricas em http://host:port/metrics numa thread em segundo
+    plano; devolve o servidor (use server.shutdown() para encerrar)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def format_summary(summary):
+    """Resumo de desempenho de um documento em texto, para o terminal"""
+    lines = [
+        f"Desempenho: {summary['pages']} páginas em {summary['seconds']:.1f}s"
+        + (f" ({summary['pages_per_second']:.2f} páginas/s)" if summary["pages_per_second"] else "")
+    ]
+    total = sum(stage["seconds"] for stage in summary["stages"].values()) or 1
+    for stage, values in sorted(
+        summary["stages"].items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
+        lines.append(
+            f"  {stage:<14} {values['seconds']:>9.3f}s ({values['seconds'] * 100 / total:4.1f}%) "
+            f"em {values['count']} medições"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,200 @@
+"""
+Normalização do texto devolvido pelo modelo, em poucas passadas sobre a
+string
+"""
+
+import re
+import time
+
+# Caracteres trocados diretamente (str.replace, uma passada por caractere)
+TRANSLATION = {
+    "\u2013": "-",  # travessão curto
+    "\u2014": "-",  # travessão
+    "\u2212": "-",  # sinal de menos
+}
+
+# Escapes \uXXXX decodificados no modo "known": letras acentuadas do Latin-1
+KNOWN_ESCAPES = {
+    f"{code:04x}": chr(code)
+    for code in range(0x00C0, 0x0100)
+    if chr(code).isalpha()
+}
+
+# Escapes literais, lidos da esquerda para a direita: \uXXXX, barra dupla
+# e \n ou \t. Um \n ou \t seguido de letra é o início de um comando LaTeX
+# (\nabla, \tag, \notag, \textcolor, \newcommand...) e fica como está.
+_ESCAPE = re.compile(r"\\(?:u[0-9a-fA-F]{4}|\\|[nt](?![A-Za-z]))")
+
+# Espaços a normalizar: sequências de dois ou mais ou uma quebra de linha
+# ou tabulação isolada (um espaço simples já está normalizado)
+_SPACE_RUN = re.compile(r"\s{2,}|[^\S ]")
+
+# Blocos $$ ... $$, separados do restante em preserve_math_newlines
+_MATH_BLOCK = re.compile(r"(\$\$.*?\$\$)", re.DOTALL)
+
+
+class TextNormalizer:
+    """
+    Limpa o texto do modelo
+
+    Regras configuráveis:
+    - collapse_whitespace: reduz sequências de espaços (e de \\n e \\t
+      literais) a um único espaço;
+    - preserve_newlines: ao reduzir, mantém uma quebra de linha quando a
+      sequência contém alguma, preservando a estrutura das linhas;
+    - preserve_math_newlines: mantém as quebras de linha dentro de blocos
+      $$ ... $$, mesmo sem preserve_newlines;
+    - unicode_escapes: "known" decodifica \\uXXXX de letras acentuadas e
+      remove os demais, "all" decodifica todos e "strip" remove todos.
+
+    Cada etapa é uma passada do re ou de str.replace, e as que não se
+    aplicam ao texto (sem barras invertidas, sem blocos $$) são puladas.
+    """
+
+    def __init__(
+        self,
+        collapse_whitespace=True,
+        preserve_newlines=False,
+        preserve_math_newlines=False,
+        unicode_escapes="known",
+    ):
+        if unicode_escapes not in ("known", "all", "strip"):
+            raise ValueError(f"Modo de escapes inválido: {unicode_escapes}")
+        self.collapse_whitespace = collapse_whitespace
+        self.preserve_newlines = preserve_newlines
+        self.preserve_math_newlines = preserve_math_newlines
+        self.unicode_escapes = unicode_escapes
+        # Substituição de cada escape; os \uXXXX entram à medida que aparecem
+        self._escapes = {"\\n": "\n", "\\t": "\t", "\\\\": "\\"}
+
+    def normalize(self, text):
+        """Aplica todas as regras ao texto"""
+        for char, replacement in TRANSLATION.items():
+            if char in text:
+                text = text.replace(char, replacement)
+        if "\\" in text:
+            text = _ESCAPE.sub(self._escape, text)
+
+        if not self.collapse_whitespace:
+            return text.replace("\t", "    ")
+        if self.preserve_math_newlines and not self.preserve_newlines and "$$" in text:
+            # Partes ímpares de split são os blocos $$ ... $$
+            parts = _MATH_BLOCK.split(text)
+            return "".join(
+                self._collapse(part, keep_newline=index % 2 == 1)
+                for index, part in enumerate(parts)
+            )
+        return self._collapse(text, self.preserve_newlines)
+
+    def _collapse(self, text, keep_newline=False):
+        if keep_newline:
+            return _SPACE_RUN.sub(self._space_run, text)
+        return _SPACE_RUN.sub(" ", text)
+
+    @staticmethod
+    def _space_run(match):
+        return "\n" if "\n" in match.group() else " "
+
+    def _escape(self, match):
+        escape = match.group()
+        replacement = self._escapes.get(escape)
+        if replacement is None:
+            replacement = self._escapes[escape] = self._unicode(escape[2:])
+        return replacement
+
+    def _unicode(self, hex_code):
+        if self.unicode_escapes == "all":
+            return chr(int(hex_code, 16))
+        if self.unicode_escapes == "known":
+            return KNOWN_ESCAPES.get(hex_code.lower(), "")
+        return ""
+
+
+def legacy_clean_text(text):
+    """Implementação anterior (várias passadas), mantida para comparação"""
+    replacements = {
+        r"\u00e7": "ç",
+        r"\u00f5": "õ",
+        r"\u00e3": "ã",
+        r"\n": "\n",
+        r"\t": "    ",
+        "\u2013": "-",
+        "\u2014": "-",
+        r"\u00ed": "í",
+        r"\u00e1": "á",
+        r"\u00e9": "é",
+        r"\u00fa": "ú",
+        r"\u00f3": "ó",
+        "\\\\": "\\",
+        "\u20134": "-",
+        "\u22121": "-",
+        "\u20132": "-",
+        "\u20133": "-",
+    }
+    cleaned_text = text
+    for old, new in replacements.items():
+        cleaned_text = cleaned_text.replace(old, new)
+    cleaned_text = re.sub(r"\\u[0-9a-fA-F]{4}", "", cleaned_text)
+    cleaned_text = re.sub(r"\s+", " ", cleaned_text)
+    cleaned_text = re.sub(r"\\n", "\n", cleaned_text)
+    return cleaned_text
+
+
+# Trechos das respostas sintéticas: "typical" imita uma página comum
+# (texto corrido, linhas, LaTeX ocasional); "escapes" concentra escapes
+# literais e espaços repetidos, o pior caso para o despacho
+SYNTHETIC_CHUNKS = {
+    "typical": (
+        "Seja $f: \\mathbb{R} \\to \\mathbb{R}$ uma função contínua no intervalo "
+        "fechado $[a, b]$ e derivável em $(a, b)$. Então existe $c \\in (a, b)$ "
+        "tal que a reta tangente ao gráfico em $c$ é paralela à secante.\n"
+        "$$\nf'(c) = \\frac{f(b) - f(a)}{b - a}\n$$\n"
+        "Esse resultado, conhecido como Teorema do Valor Médio, é usado para "
+        "estimar o erro de aproximações lineares \u2013 por exemplo, "
+        "$|\\sin x - x| \\leq \\frac{|x|^3}{6}$ para todo $x$.\n\n"
+    ),
+    "escapes": (
+        "A fun\\u00e7\\u00e3o $f(x) = \\frac{1}{x}$ \u2013 definida para x \u2260 0.\\n"
+        "$$\n\\int_0^1 \\sqrt{x}\\, dx = \\frac{2}{3}\n$$\n"
+        "Texto   com    espa\\u00e7os\t e \\\\alpha, \\theta e \\nabla.\n\n"
+    ),
+}
+
+
+def synthetic_response(size, profile="typical"):
+    """Resposta sintética de ~size caracteres (ver SYNTHETIC_CHUNKS)"""
+    chunk = SYNTHETIC_CHUNKS[profile]
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+
+def benchmark(
+    sizes=(10_000, 1_000_000, 10_000_000), profiles=("typical", "escapes"), repeat=3
+):
+    """Compara a vazão (MB/s) do normalizador com a implementação anterior"""
+    results = []
+    for profile in profiles:
+        for size in sizes:
+            text = synthetic_response(size, profile)
+            megabytes = len(text.encode("utf-8")) / 1e6
+            row = {"profile": profile, "chars": size}
+            for name, function in (
+                ("legacy", legacy_clean_text),
+                ("normalizer", TextNormalizer().normalize),
+            ):
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    function(text)
+                    best = min(best, time.perf_counter() - start)
+                row[f"{name}_mb_s"] = round(megabytes / best, 1)
+            results.append(row)
+            print(
+                f"{profile:>8} {size:>12,} caracteres: "
+                f"anterior {row['legacy_mb_s']:>7} MB/s, "
+                f"normalizador {row['normalizer_mb_s']:>7} MB/s"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,172 @@
+"""
+Detecção de páginas em branco e de páginas quase repetidas
+"""
+
+# Tons abaixo deste valor (0-255) contam como tinta
+INK_LEVEL = 128
+
+
+def pixmap_gray(pix):
+    """Pixels do pixmap em tons de cinza (0-255), como matriz NumPy"""
+    import numpy as np
+
+    data = np.frombuffer(pix.samples, dtype=np.uint8)
+    pixels = data.reshape(pix.height, pix.stride)[:, : pix.width * pix.n]
+    pixels = pixels.reshape(pix.height, pix.width, pix.n)
+    return pixels[:, :, :3].mean(axis=2) if pix.n >= 3 else pixels[:, :, 0].astype(float)
+
+
+def _pixmap_gray_sum(pix, step=1):
+    """
+    Soma inteira dos canais de cor de cada pixel (de um a cada step, nas
+    duas direções) e quantos canais foram somados: o mesmo que pixmap_gray
+    multiplicado por esse número, sem converter a página inteira para float
+    """
+    import numpy as np
+
+    # samples_mv lê os pixels sem copiá-los
+    data = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    pixels = data.reshape(pix.height, pix.stride)[:, : pix.width * pix.n]
+    pixels = pixels.reshape(pix.height, pix.width, pix.n)[::step, ::step]
+    total = pixels[:, :, 0].astype(np.int32)
+    if pix.n < 3:
+        return total, 1
+    total += pixels[:, :, 1]
+    total += pixels[:, :, 2]
+    return total, 3
+
+
+def page_ink(pix, step=2):
+    """
+    Fração da página coberta por tinta, estimada com um pixel a cada step
+    nas duas direções (bem mais barata que page_signature, para quando o
+    hash não é necessário)
+    """
+    gray, channels = _pixmap_gray_sum(pix, step)
+    return round(float((gray < INK_LEVEL * channels).mean()), 5)
+
+
+def page_signature(pix, hash_size=16):
+    """
+    Calcula a assinatura de um pixmap: hash perceptual (dHash) e a fração
+    da página coberta por tinta
+
+    O dHash compara a média de blocos vizinhos de uma versão reduzida da
+    página em tons de cinza, então pequenas diferenças de digitalização
+    mudam poucos bits.
+    """
+    import numpy as np
+
+    gray, channels = _pixmap_gray_sum(pix)
+    ink = float((gray < INK_LEVEL * channels).mean())
+
+    # Reduz a página a hash_size x (hash_size + 1) blocos pela média
+    rows = np.linspace(0, gray.shape[0], hash_size + 1).astype(int)[:-1]
+    cols = np.linspace(0, gray.shape[1], hash_size + 2).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(gray, rows, axis=0, dtype=np.int64), cols, axis=1)
+    counts = np.outer(
+        np.diff(np.append(rows, gray.shape[0])), np.diff(np.append(cols, gray.shape[1]))
+    )
+    small = sums / counts
+
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    phash = 0
+    for bit in bits:
+        phash = (phash << 1) | int(bit)
+
+    return {"phash": f"{phash:0{hash_size * hash_size // 4}x}", "ink": round(ink, 5)}
+
+
+def hamming_distance(hash_a, hash_b):
+    """Número de bits diferentes entre dois hashes hexadecimais"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def _hash_chunks(phash, parts):
+    """
+    Divide os bits de um hash hexadecimal em parts pedaços contíguos:
+    lista de (número do pedaço, bits do hash inteiro, valor do pedaço),
+    para que hashes de tamanhos diferentes não caiam no mesmo balde
+    """
+    value = int(phash, 16)
+    bits = len(phash) * 4
+    chunks = []
+    for index in range(parts):
+        start = index * bits // parts
+        size = (index + 1) * bits // parts - start
+        chunks.append((index, bits, (value >> start) & ((1 << size) - 1)))
+    return chunks
+
+
+class PageFilter:
+    """
+    Decide, a partir da assinatura, se uma página pode dispensar a API
+
+    Páginas com cobertura de tinta abaixo de blank_ink são consideradas em
+    branco. Com max_distance definido, uma página cujo hash esteja a no
+    máximo max_distance bits de uma página anterior reaproveita o
+    resultado dela. O estado vale para um único documento.
+    """
+
+    def __init__(self, blank_ink=None, max_distance=None):
+        self.blank_ink = blank_ink
+        self.max_distance = max_distance
+        # (hash, página) das páginas com conteúdo já vistas, em ordem
+        self._seen = []
+        # Pedaço do hash -> posições em _seen. Dois hashes a no máximo
+        # max_distance bits um do outro têm ao menos um dos
+        # max_distance + 1 pedaços idêntico, então basta comparar com as
+        # páginas que compartilham algum pedaço
+        self._buckets = {}
+        self.blank_pages = 0
+        self.duplicate_pages = 0
+
+    def _add(self, phash, page_num):
+        position = len(self._seen)
+        self._seen.append((phash, page_num))
+        if self.max_distance is not None:
+            for chunk in _hash_chunks(phash, self.max_distance + 1):
+                self._buckets.setdefault(chunk, []).append(position)
+
+    def _find(self, phash):
+        """Primeira página já vista a no máximo max_distance bits, ou None"""
+        if self.max_distance >= len(phash) * 4:
+            # Qualquer hash do mesmo tamanho serve
+            for seen, original in self._seen:
+                if hamming_distance(seen, phash) <= self.max_distance:
+                    return original
+            return None
+        candidates = set()
+        for chunk in _hash_chunks(phash, self.max_distance + 1):
+            candidates.update(self._buckets.get(chunk, ()))
+        for position in sorted(candidates):
+            seen, original = self._seen[position]
+            if hamming_distance(seen, phash) <= self.max_distance:
+                return original
+        return None
+
+    def remember(self, page_num, signature):
+        """Registra uma página de execução anterior como possível original"""
+        if signature and not self._is_blank(signature):
+            self._add(signature["phash"], page_num)
+
+    def _is_blank(self, signature):
+        return self.blank_ink is not None and signature["ink"] < self.blank_ink
+
+    def check(self, page_num, signature):
+        """
+        Devolve ("blank", None), ("duplicate", página original) ou
+        (None, None) quando a página deve ser processada normalmente
+        """
+        if self._is_blank(signature):
+            self.blank_pages += 1
+            return "blank", None
+
+        if self.max_distance is not None:
+            original = self._find(signature["phash"])
+            if original is not None:
+                self.duplicate_pages += 1
+                return "duplicate", original
+
+        self._add(signature["phash"], page_num)
+        return None, None
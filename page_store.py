@@ -0,0 +1,124 @@
+"""
+Armazenamento só de acréscimo dos fragmentos HTML de cada página
+"""
+
+import hashlib
+import os
+
+
+class PageStore:
+    """
+    Cada página processada é anexada ao final do arquivo como um registro
+
+        PAGE <página> <tamanho> <sha256>\\n<conteúdo>\\n
+
+    de modo que salvar uma página custa apenas o tamanho dela. O índice
+    normalmente vem do manifesto (PageManifest.store_index); sem ele, os
+    cabeçalhos são percorridos (sem ler os conteúdos) para reconstruí-lo.
+    Registros incompletos no final, deixados por uma interrupção, são
+    descartados. Se a mesma página for gravada mais de uma vez, vale o
+    registro mais recente.
+    """
+
+    def __init__(self, path, index=None, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        # página -> (posição do conteúdo, tamanho em bytes, sha256)
+        self._index = {}
+        self._file = open(path, "a+b")
+        if index is None:
+            self._load_index()
+        else:
+            self._check_index(index)
+
+    def _check_index(self, index):
+        """Aceita apenas os registros do índice que estão inteiros no arquivo"""
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        valid_end = 0
+        for page_num, (offset, length, digest) in index.items():
+            end = offset + length + 1
+            if end <= file_size:
+                self._index[page_num] = (offset, length, digest)
+                valid_end = max(valid_end, end)
+
+        if valid_end < file_size:
+            # Tudo após o último registro conhecido foi gravado pela metade
+            self._file.truncate(valid_end)
+        self._file.seek(0, os.SEEK_END)
+
+    def _load_index(self):
+        """Percorre os cabeçalhos e descarta um registro final incompleto"""
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        self._file.seek(0)
+        valid_end = 0
+
+        while valid_end < file_size:
+            header = self._file.readline()
+            parts = header.split()
+            if not header.endswith(b"\n") or len(parts) != 4 or parts[0] != b"PAGE":
+                break
+            page_num, length = int(parts[1]), int(parts[2])
+            digest = parts[3].decode("ascii")
+            offset = self._file.tell()
+            if offset + length + 1 > file_size:
+                break
+            self._file.seek(offset + length + 1)
+            self._index[page_num] = (offset, length, digest)
+            valid_end = self._file.tell()
+
+        if valid_end < file_size:
+            print(f"Aviso: descartando registro incompleto no final de {self.path}")
+            self._file.truncate(valid_end)
+        self._file.seek(0, os.SEEK_END)
+
+    def append(self, page_num, content):
+        """
+        Anexa o conteúdo de uma página ao final do arquivo e devolve
+        (posição, tamanho, sha256) do registro gravado
+        """
+        payload = content.encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest()
+        header = f"PAGE {page_num} {len(payload)} {digest}\n".encode("ascii")
+
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell() + len(header)
+        self._file.write(header + payload + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._index[page_num] = (offset, len(payload), digest)
+        return self._index[page_num]
+
+    def __contains__(self, page_num):
+        return page_num in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def pages(self):
+        """Páginas armazenadas, em ordem"""
+        return sorted(self._index)
+
+    def read(self, page_num):
+        """Lê o conteúdo de uma página, conferindo o hash gravado"""
+        offset, length, digest = self._index[page_num]
+        self._file.seek(offset)
+        payload = self._file.read(length)
+        self._file.seek(0, os.SEEK_END)
+        if hashlib.sha256(payload).hexdigest() != digest:
+            raise ValueError(f"Conteúdo corrompido da página {page_num + 1} em {self.path}")
+        return payload.decode("utf-8")
+
+    def index(self):
+        """Cópia do índice página -> (posição, tamanho, sha256)"""
+        return dict(self._index)
+
+    def iter_contents(self):
+        """Gera o conteúdo das páginas na ordem do documento"""
+        for page_num in self.pages():
+            yield self.read(page_num)
+
+    def close(self):
+        self._file.close()
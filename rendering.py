@@ -0,0 +1,226 @@
+"""
+Rasterização das páginas do PDF, opcionalmente em processos separados
+"""
+
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from image_encoder import PageImageEncoder
+from page_filters import page_ink, page_signature
+from text_layer import classify_page
+
+# Documento aberto por cada processo de renderização (um por processo)
+_worker_document = None
+
+
+def _init_render_worker(pdf_path):
+    """Abre o PDF uma única vez em cada processo do pool"""
+    global _worker_document
+    import fitz  # PyMuPDF
+
+    _worker_document = fitz.open(pdf_path)
+
+
+def _render_in_worker(page_num, encoder, text_layer, signature, release_memory, tiler):
+    """Executado no processo de renderização"""
+    return render_page(
+        _worker_document, page_num, encoder, text_layer, signature, release_memory, tiler
+    )
+
+
+def render_page(
+    pdf_document,
+    page_num,
+    encoder,
+    text_layer=False,
+    signature=False,
+    release_memory=False,
+    tiler=None,
+):
+    """
+    Prepara uma página para o OCR
+
+    Devolve um dicionário com "image" (o blob {"mime_type", "data"} gerado
+    pelo encoder), "text" (o texto nativo, quando a camada de texto
+    dispensa a API), "decision" (o motivo da escolha, ou None se não
+    houve classificação) e "signature" (hash perceptual e cobertura de
+    tinta, quando signature=True, ou só a tinta, estimada mais depressa,
+    quando signature="ink"). "timings" traz a duração, em segundos,
+    de cada etapa executada (classify, rasterize, signature, encode,
+    tile), medida inclusive quando a página é preparada em outro processo.
+
+    Com um tiler (tiling.PageTiler), páginas densas também são divididas
+    em recortes, em "tiles" (lista de blobs na ordem de leitura, ou None).
+
+    Com release_memory=True o cache de recursos do MuPDF (imagens e fontes
+    já decodificadas) é esvaziado após a página, para que a memória não
+    cresça com o número de páginas do documento.
+    """
+    page = pdf_document[page_num]
+    timings = {}
+    rendered = {
+        "image": None,
+        "text": None,
+        "decision": None,
+        "signature": None,
+        "tiles": None,
+        "timings": timings,
+    }
+
+    start = time.perf_counter()
+    if text_layer:
+        rendered["decision"], rendered["text"] = classify_page(page)
+        timings["classify"] = time.perf_counter() - start
+        if rendered["text"] is not None:
+            # Página com texto nativo: não precisa ser rasterizada
+            if release_memory:
+                import fitz  # PyMuPDF
+
+                fitz.TOOLS.store_shrink(100)
+            return rendered
+        start = time.perf_counter()
+
+    pix = encoder.render(page)
+    timings["rasterize"] = time.perf_counter() - start
+    if signature:
+        start = time.perf_counter()
+        if signature == "ink":
+            rendered["signature"] = {"ink": page_ink(pix)}
+        else:
+            rendered["signature"] = page_signature(pix)
+        timings["signature"] = time.perf_counter() - start
+    start = time.perf_counter()
+    rendered["image"] = {"mime_type": encoder.mime_type, "data": encoder.encode_pixmap(pix)}
+    timings["encode"] = time.perf_counter() - start
+    if tiler is not None:
+        start = time.perf_counter()
+        regions = tiler.split(pix)
+        if regions:
+            import fitz  # PyMuPDF
+
+            # Pixels do pixmap -> pontos da página
+            scale_x = page.rect.width / pix.width
+            scale_y = page.rect.height / pix.height
+            rendered["tiles"] = [
+                {
+                    "mime_type": encoder.mime_type,
+                    "data": encoder.encode_pixmap(
+                        encoder.render(
+                            page,
+                            clip=fitz.Rect(
+                                page.rect.x0 + x0 * scale_x,
+                                page.rect.y0 + y0 * scale_y,
+                                page.rect.x0 + x1 * scale_x,
+                                page.rect.y0 + y1 * scale_y,
+                            ),
+                        )
+                    ),
+                }
+                for x0, y0, x1, y1 in regions
+            ]
+        timings["tile"] = time.perf_counter() - start
+    if release_memory:
+        import fitz  # PyMuPDF
+
+        del pix
+        fitz.TOOLS.store_shrink(100)
+    return rendered
+
+
+class PageRenderer:
+    """
+    Produz as imagens das páginas à frente do consumidor (OCR)
+
+    Com workers > 0 as páginas são renderizadas por um pool de processos,
+    cada um com seu próprio documento aberto, e no máximo queue_depth
+    páginas ficam prontas (ou em renderização) aguardando consumo. Com
+    workers = 0 a renderização acontece sob demanda no próprio processo.
+    """
+
+    def __init__(
+        self,
+        pdf_path,
+        workers=0,
+        queue_depth=None,
+        encoder=None,
+        text_layer=False,
+        signature=False,
+        release_memory=False,
+        tiler=None,
+    ):
+        self.pdf_path = pdf_path
+        self.release_memory = release_memory
+        self.tiler = tiler
+        self.text_layer = text_layer
+        self.signature = signature
+        self.workers = max(0, int(workers))
+        self.queue_depth = max(1, int(queue_depth or 2 * max(1, self.workers)))
+        self.encoder = encoder or PageImageEncoder()
+
+    def iter_pages(self, page_nums):
+        """Gera (page_num, rendered) na ordem de page_nums (ver render_page)"""
+        if self.workers == 0:
+            yield from self._iter_local(page_nums)
+        else:
+            yield from self._iter_pool(page_nums)
+
+    def _iter_local(self, page_nums):
+        import fitz  # PyMuPDF
+
+        pdf_document = fitz.open(self.pdf_path)
+        try:
+            for page_num in page_nums:
+                yield page_num, render_page(
+                    pdf_document,
+                    page_num,
+                    self.encoder,
+                    self.text_layer,
+                    self.signature,
+                    self.release_memory,
+                    self.tiler,
+                )
+        finally:
+            pdf_document.close()
+
+    def _iter_pool(self, page_nums):
+        # "spawn" evita herdar locks das threads de OCR já em execução
+        context = multiprocessing.get_context("spawn")
+        page_iter = iter(page_nums)
+        queue = deque()
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_render_worker,
+            initargs=(self.pdf_path,),
+        ) as executor:
+            try:
+                # A fila limitada controla quantas páginas ficam em memória
+                for page_num in page_iter:
+                    queue.append((page_num, self._submit(executor, page_num)))
+                    if len(queue) >= self.queue_depth:
+                        break
+
+                while queue:
+                    page_num, future = queue.popleft()
+                    rendered = future.result()
+                    next_page = next(page_iter, None)
+                    if next_page is not None:
+                        queue.append((next_page, self._submit(executor, next_page)))
+                    yield page_num, rendered
+            finally:
+                for _, future in queue:
+                    future.cancel()
+
+    def _submit(self, executor, page_num):
+        return executor.submit(
+            _render_in_worker,
+            page_num,
+            self.encoder,
+            self.text_layer,
+            self.signature,
+            self.release_memory,
+            self.tiler,
+        )
@@ -0,0 +1,117 @@
+"""
+Comparação entre edições de um PDF, para refazer apenas as páginas novas
+ou alteradas
+"""
+
+import hashlib
+from difflib import SequenceMatcher
+
+from page_filters import hamming_distance, page_signature
+
+# Escala da rasterização usada apenas para a impressão digital das páginas
+FINGERPRINT_SCALE = 0.5
+
+
+def page_fingerprint(page):
+    """
+    Impressão digital de uma página: hash perceptual da página rasterizada
+    em baixa resolução ("phash") e sha256 da camada de texto, com os
+    espaços normalizados ("text_layer_sha256"; vazio em páginas digitalizadas)
+    """
+    import fitz  # PyMuPDF
+
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(FINGERPRINT_SCALE, FINGERPRINT_SCALE), colorspace=fitz.csGRAY
+    )
+    text = " ".join(page.get_text("text").split())
+    return {
+        "phash": page_signature(pix)["phash"],
+        "text_layer_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest() if text else "",
+    }
+
+
+def document_fingerprints(pdf_document, release_memory=False):
+    """Impressões digitais de todas as páginas, em ordem"""
+    fingerprints = []
+    for page in pdf_document:
+        fingerprints.append(page_fingerprint(page))
+        if release_memory:
+            import fitz  # PyMuPDF
+
+            fitz.TOOLS.store_shrink(100)
+    return fingerprints
+
+
+def _key(fingerprint):
+    return fingerprint["text_layer_sha256"], fingerprint["phash"]
+
+
+def _similar(old, new, max_distance):
+    """Mesma camada de texto e imagem quase idêntica (ex.: nova digitalização)"""
+    return (
+        old["text_layer_sha256"] == new["text_layer_sha256"]
+        and hamming_distance(old["phash"], new["phash"]) <= max_distance
+    )
+
+
+def align_revisions(old_fingerprints, new_fingerprints, max_distance=4):
+    """
+    Alinha as páginas da edição anterior às da nova
+
+    old_fingerprints é {página: impressão digital} (páginas sem impressão
+    digital ficam de fora) e new_fingerprints a lista da nova edição.
+    As sequências são alinhadas pelo SequenceMatcher, que tolera páginas
+    inseridas e removidas; páginas iguais fora da ordem (reordenadas) são
+    procuradas depois entre as que sobraram. Em um trecho substituído, as
+    páginas são comparadas na ordem e aceitas se estiverem a no máximo
+    max_distance bits do hash perceptual.
+
+    Devolve (alterações, removidas): alterações é a lista, na ordem da nova
+    edição, de (página nova, status, página anterior ou None), com status
+    "unchanged", "moved", "modified" ou "inserted"; removidas são as
+    páginas anteriores que não aparecem na nova edição.
+    """
+    old_pages = sorted(old_fingerprints)
+    old_keys = [_key(old_fingerprints[page_num]) for page_num in old_pages]
+    new_keys = [_key(fingerprint) for fingerprint in new_fingerprints]
+
+    matches = {}
+    modified = {}
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, old_start, old_stop, new_start, new_stop in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(new_stop - new_start):
+                matches[new_start + offset] = old_pages[old_start + offset]
+        elif tag == "replace":
+            for old_index, new_index in zip(range(old_start, old_stop), range(new_start, new_stop)):
+                old_page = old_pages[old_index]
+                if _similar(old_fingerprints[old_page], new_fingerprints[new_index], max_distance):
+                    matches[new_index] = old_page
+                else:
+                    modified[new_index] = old_page
+
+    # Páginas reordenadas: a mesma página, fora da sequência alinhada
+    matched = set(matches.values())
+    unmatched = {}
+    for page_num in old_pages:
+        if page_num not in matched:
+            unmatched.setdefault(_key(old_fingerprints[page_num]), []).append(page_num)
+    moved = {}
+    for new_index, key in enumerate(new_keys):
+        if new_index not in matches and unmatched.get(key):
+            moved[new_index] = unmatched[key].pop(0)
+
+    used = matched | set(moved.values())
+    changes = []
+    for new_index in range(len(new_fingerprints)):
+        if new_index in matches:
+            changes.append((new_index, "unchanged", matches[new_index]))
+        elif new_index in moved:
+            changes.append((new_index, "moved", moved[new_index]))
+        elif new_index in modified and modified[new_index] not in used:
+            changes.append((new_index, "modified", modified[new_index]))
+            used.add(modified[new_index])
+        else:
+            changes.append((new_index, "inserted", None))
+    removed = [page_num for page_num in old_pages if page_num not in used]
+    return changes, removed
@@ -0,0 +1,297 @@
+"""
+Agendamento das chamadas ao modelo: limite de taxa, novas tentativas e
+concorrência adaptativa
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import CancelledError
+
+from metrics import NULL_METRICS
+
+# Códigos HTTP que indicam falha temporária
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Códigos que indicam limite de uso (cota/taxa) atingido
+THROTTLE_STATUS = {429}
+
+
+def error_status(error):
+    """Extrai o código HTTP de uma exceção do SDK (ou de um modelo falso)"""
+    for attr in ("code", "status_code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(error):
+    """Falhas temporárias que valem uma nova tentativa"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUS
+
+
+def is_throttle(error):
+    return error_status(error) in THROTTLE_STATUS
+
+
+class TokenBucket:
+    """Balde de fichas reabastecido continuamente a rate_per_minute"""
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _try_acquire(self, amount):
+        """Consome as fichas e retorna 0, ou retorna quanto falta esperar"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate
+
+    def acquire(self, amount=1):
+        """Bloqueia até haver fichas suficientes e as consome"""
+        amount = min(amount, self.capacity)
+        while True:
+            wait_time = self._try_acquire(amount)
+            if not wait_time:
+                return
+            self._sleep(wait_time)
+
+    async def acquire_async(self, amount=1):
+        """Versão assíncrona de acquire, sem bloquear o loop de eventos"""
+        amount = min(amount, self.capacity)
+        while True:
+            wait_time = self._try_acquire(amount)
+            if not wait_time:
+                return
+            await asyncio.sleep(wait_time)
+
+    def adjust(self, amount):
+        """Corrige o consumo estimado (positivo consome, negativo devolve)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RequestScheduler:
+    """
+    Executa as chamadas ao modelo respeitando limites de requisições e de
+    tokens por minuto, com novas tentativas em falhas temporárias (espera
+    exponencial com jitter) e concorrência AIMD: o limite de chamadas
+    simultâneas cai pela metade quando a API sinaliza limite de uso (429)
+    e sobe de um em um após increase_after sucessos seguidos.
+
+    metrics (metrics.Metrics) recebe as novas tentativas
+    (api_retries_total, rotulado pelo código do erro), os limites de uso
+    (api_throttled_total) e as mudanças de concorrência
+    (concurrency_decreases_total e concurrency_increases_total); o
+    GeminiOCR passa as suas métricas a um agendador que não tenha.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_concurrency=64,
+        min_concurrency=1,
+        max_retries=6,
+        base_delay=1.0,
+        max_delay=60.0,
+        increase_after=10,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        metrics=None,
+    ):
+        self.request_bucket = (
+            TokenBucket(requests_per_minute, clock=clock, sleep=sleep)
+            if requests_per_minute
+            else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute, clock=clock, sleep=sleep)
+            if tokens_per_minute
+            else None
+        )
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min_concurrency)
+        self.concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase_after = increase_after
+        self._sleep = sleep
+        self.metrics = metrics or NULL_METRICS
+
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+        # Contadores para o resumo da execução
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        # Mudanças do limite de concorrência e o menor valor atingido
+        self.decreases = 0
+        self.increases = 0
+        self.lowest_concurrency = max_concurrency
+
+    def _acquire_slot(self):
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+            self.requests += 1
+
+    def _try_acquire_slot(self):
+        """Ocupa uma vaga sem bloquear; retorna False se não houver"""
+        with self._condition:
+            if self._in_flight >= self.concurrency:
+                return False
+            self._in_flight += 1
+            self.requests += 1
+            return True
+
+    async def _acquire_slot_async(self):
+        # Consulta periódica: a vaga é liberada pelo mesmo loop ou por threads
+        while not self._try_acquire_slot():
+            await asyncio.sleep(0.01)
+
+    def _release_slot(self, throttled=False, success=False, retry=False):
+        with self._condition:
+            self._in_flight -= 1
+            if retry:
+                self.retries += 1
+                self.throttled += int(throttled)
+            if throttled:
+                # Diminuição multiplicativa
+                lowered = max(self.min_concurrency, self.concurrency // 2)
+                if lowered < self.concurrency:
+                    self.decreases += 1
+                    self.metrics.increment("concurrency_decreases_total")
+                self.concurrency = lowered
+                self.lowest_concurrency = min(self.lowest_concurrency, lowered)
+                self._successes = 0
+            elif success:
+                # Aumento aditivo
+                self._successes += 1
+                if (
+                    self._successes >= self.increase_after
+                    and self.concurrency < self.max_concurrency
+                ):
+                    self.concurrency += 1
+                    self.increases += 1
+                    self.metrics.increment("concurrency_increases_total")
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def _record_failure(self, error, throttled, retry):
+        if throttled:
+            self.metrics.increment("api_throttled_total")
+        if retry:
+            self.metrics.increment(
+                "api_retries_total", status=error_status(error) or type(error).__name__
+            )
+
+    def backoff_delay(self, attempt):
+        """Espera exponencial com jitter completo"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(self, fn, estimated_tokens=0, used_tokens=None, cancelled=None):
+        """
+        Executa fn() dentro dos limites, repetindo em falhas temporárias
+
+        estimated_tokens é reservado do limite de tokens antes da chamada;
+        used_tokens(resultado), se informado, devolve o consumo real para
+        corrigir a reserva. cancelled (threading.Event), se informado e
+        ligado, interrompe as novas tentativas e a espera entre elas com
+        concurrent.futures.CancelledError, sem ocupar outra vaga.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire_slot()
+            if cancelled is not None and cancelled.is_set():
+                self._release_slot()
+                raise CancelledError()
+            try:
+                if self.request_bucket is not None:
+                    self.request_bucket.acquire(1)
+                if self.token_bucket is not None and estimated_tokens:
+                    self.token_bucket.acquire(estimated_tokens)
+                result = fn()
+            except Exception as e:
+                throttled = is_throttle(e)
+                retry = is_retryable(e) and attempt < self.max_retries
+                self._release_slot(throttled=throttled, retry=retry)
+                self._record_failure(e, throttled, retry)
+                if not retry:
+                    raise
+
+                delay = self.backoff_delay(attempt)
+                print(
+                    f"Falha temporária da API ({error_status(e) or type(e).__name__}), "
+                    f"nova tentativa em {delay:.1f}s (concorrência {self.concurrency})"
+                )
+                if cancelled is None:
+                    self._sleep(delay)
+                elif cancelled.wait(delay):
+                    raise CancelledError() from e
+                continue
+
+            self._release_slot(success=True)
+            if self.token_bucket is not None and used_tokens is not None:
+                actual = used_tokens(result)
+                if actual:
+                    self.token_bucket.adjust(actual - estimated_tokens)
+            return result
+
+    async def call_async(self, fn, estimated_tokens=0, used_tokens=None):
+        """Versão assíncrona de call: fn() deve retornar um awaitable"""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_slot_async()
+            try:
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire_async(1)
+                if self.token_bucket is not None and estimated_tokens:
+                    await self.token_bucket.acquire_async(estimated_tokens)
+                result = await fn()
+            except Exception as e:
+                throttled = is_throttle(e)
+                retry = is_retryable(e) and attempt < self.max_retries
+                self._release_slot(throttled=throttled, retry=retry)
+                self._record_failure(e, throttled, retry)
+                if not retry:
+                    raise
+
+                delay = self.backoff_delay(attempt)
+                print(
+                    f"Falha temporária da API ({error_status(e) or type(e).__name__}), "
+                    f"nova tentativa em {delay:.1f}s (concorrência {self.concurrency})"
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Tarefa cancelada: libera a vaga sem alterar a concorrência
+                self._release_slot()
+                raise
+
+            self._release_slot(success=True)
+            if self.token_bucket is not None and used_tokens is not None:
+                actual = used_tokens(result)
+                if actual:
+                    self.token_bucket.adjust(actual - estimated_tokens)
+            return result
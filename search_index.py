@@ -0,0 +1,345 @@
+"""
+Índice de busca (SQLite FTS5) das páginas processadas, com o texto e os
+comandos LaTeX das fórmulas
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from writers import OutputWriter
+
+DEFAULT_INDEX_PATH = "gemini_ocr_indice.sqlite3"
+
+# Fórmulas: $$...$$, $...$, \[...\] e \(...\)
+_MATH = re.compile(r"\$\$(.+?)\$\$|\$(.+?)\$|\\\[(.+?)\\\]|\\\((.+?)\\\)", re.DOTALL)
+# Comandos (\frac), nomes e números dentro de uma fórmula
+_LATEX_TOKEN = re.compile(r"\\([A-Za-z]+)|([A-Za-z]+|\d+)")
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"\w+\*?")
+
+# Comandos equivalentes, indexados com o mesmo nome
+LATEX_ALIASES = {
+    "dfrac": "frac",
+    "tfrac": "frac",
+    "le": "leq",
+    "ge": "geq",
+    "ne": "neq",
+    "to": "rightarrow",
+    "gets": "leftarrow",
+    "iff": "Leftrightarrow",
+    "implies": "Rightarrow",
+}
+# Comandos só de formatação, que não ajudam a encontrar a fórmula
+LATEX_IGNORED = {
+    "left",
+    "right",
+    "big",
+    "Big",
+    "bigg",
+    "Bigg",
+    "bigl",
+    "bigr",
+    "displaystyle",
+    "textstyle",
+    "limits",
+    "nolimits",
+    "quad",
+    "qquad",
+}
+
+
+def latex_tokens(formula):
+    """
+    Termos de uma fórmula LaTeX, na ordem: nomes dos comandos sem a barra
+    (normalizados por LATEX_ALIASES, sem os de LATEX_IGNORED), nomes e
+    números; "\\dfrac{1}{x^2}" -> ["frac", "1", "x", "2"]
+    """
+    tokens = []
+    for command, word in _LATEX_TOKEN.findall(formula):
+        if command:
+            if command in LATEX_IGNORED:
+                continue
+            tokens.append(LATEX_ALIASES.get(command, command))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def split_math(text):
+    """
+    Separa o texto de uma página em (prosa, termos das fórmulas): as
+    fórmulas viram os termos de latex_tokens e ficam na prosa apenas como
+    "$…$", e as tags HTML são removidas
+    """
+    math = []
+    for match in _MATH.finditer(text):
+        formula = next(group for group in match.groups() if group is not None)
+        math.extend(latex_tokens(formula))
+    prose = _TAG.sub(" ", _MATH.sub("$…$", text))
+    return prose, " ".join(math)
+
+
+def _quote(term):
+    """Termo entre aspas na sintaxe do FTS5 (um * final vira busca por prefixo)"""
+    if term.endswith("*"):
+        return '"' + term[:-1].replace('"', '""') + '"*'
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_query(query):
+    """
+    Converte a busca do usuário em uma expressão MATCH do FTS5, ou None se
+    não houver termos
+
+    Palavras são procuradas na prosa e nas fórmulas ("integral", "deriv*"
+    por prefixo); comandos LaTeX ("\\frac") apenas nas fórmulas, e uma
+    fórmula entre $ ("$\\frac{1}{x}$") como a sequência dos seus termos.
+    Todos os termos precisam aparecer na página.
+    """
+    terms = []
+
+    def add_words(text):
+        for token in text.split():
+            if token.startswith("\\"):
+                terms.extend(f"math : {_quote(term)}" for term in latex_tokens(token))
+            else:
+                terms.extend(_quote(word) for word in _WORD.findall(token))
+
+    position = 0
+    for match in _MATH.finditer(query):
+        add_words(query[position : match.start()])
+        formula = next(group for group in match.groups() if group is not None)
+        tokens = latex_tokens(formula)
+        if tokens:
+            terms.append(f"math : {_quote(' '.join(tokens))}")
+        position = match.end()
+    add_words(query[position:])
+    return " AND ".join(terms) or None
+
+
+class SearchIndex:
+    """
+    Índice invertido persistente das páginas de todos os documentos
+
+    Cada página é indexada em duas colunas do FTS5: a prosa (sem acentos
+    nem maiúsculas, pelo tokenizador unicode61) e os termos das fórmulas
+    (ver latex_tokens). As páginas são atualizadas uma a uma, à medida
+    que ficam prontas; uma página cujo texto não mudou (mesmo sha256) não
+    é reescrita. search devolve as páginas ordenadas pelo bm25, em que os
+    termos das fórmulas pesam math_weight vezes mais que os da prosa.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, math_weight=2.0):
+        self.path = path
+        self.math_weight = math_weight
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                total_pages INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                document_id INTEGER NOT NULL REFERENCES documents (id),
+                page INTEGER NOT NULL,
+                text_sha256 TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (document_id, page)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5(
+                text, math, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _document_id(self, document, total_pages=None):
+        path = os.path.abspath(document)
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO documents (path, total_pages, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET "
+            "total_pages = COALESCE(excluded.total_pages, total_pages), updated_at = excluded.updated_at",
+            (path, total_pages, now),
+        )
+        return self._conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()[0]
+
+    def _add_page(self, document_id, page, text, text_sha256=None):
+        """Indexa uma página (a partir de 1); False se já estava indexada igual"""
+        if text_sha256 is None:
+            text_sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        row = self._conn.execute(
+            "SELECT id, text_sha256 FROM pages WHERE document_id = ? AND page = ?",
+            (document_id, page),
+        ).fetchone()
+        if row is not None and row["text_sha256"] == text_sha256:
+            return False
+
+        prose, math = split_math(text)
+        now = time.time()
+        if row is None:
+            page_id = self._conn.execute(
+                "INSERT INTO pages (document_id, page, text_sha256, updated_at) VALUES (?, ?, ?, ?)",
+                (document_id, page, text_sha256, now),
+            ).lastrowid
+        else:
+            page_id = row["id"]
+            self._conn.execute(
+                "UPDATE pages SET text_sha256 = ?, updated_at = ? WHERE id = ?",
+                (text_sha256, now, page_id),
+            )
+            self._conn.execute("DELETE FROM page_text WHERE rowid = ?", (page_id,))
+        self._conn.execute(
+            "INSERT INTO page_text (rowid, text, math) VALUES (?, ?, ?)", (page_id, prose, math)
+        )
+        return True
+
+    def add_page(self, document, page, text, total_pages=None, text_sha256=None):
+        """
+        Indexa (ou atualiza) a página page (a partir de 1) do documento;
+        devolve False se o texto não mudou desde a última indexação
+        """
+        with self._lock:
+            added = self._add_page(self._document_id(document, total_pages), page, text, text_sha256)
+            self._conn.commit()
+            return added
+
+    def index_document(self, document, records, total_pages=None):
+        """
+        Indexa de uma vez os registros de páginas de um documento (ver
+        writers.OutputWriter) e remove as páginas além de total_pages (ex.:
+        de uma edição anterior mais longa). Devolve quantas páginas foram
+        (re)indexadas.
+        """
+        indexed = 0
+        with self._lock:
+            document_id = self._document_id(document, total_pages)
+            for record in records:
+                indexed += self._add_page(
+                    document_id, record["page"], record["text"], record.get("text_sha256")
+                )
+            if total_pages is not None:
+                stale = [
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT id FROM pages WHERE document_id = ? AND page > ?",
+                        (document_id, total_pages),
+                    )
+                ]
+                for page_id in stale:
+                    self._conn.execute("DELETE FROM page_text WHERE rowid = ?", (page_id,))
+                    self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+            self._conn.commit()
+        return indexed
+
+    def remove_document(self, document):
+        """Remove do índice todas as páginas do documento"""
+        path = os.path.abspath(document)
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM page_text WHERE rowid IN ("
+                "SELECT pages.id FROM pages JOIN documents ON documents.id = pages.document_id "
+                "WHERE documents.path = ?)",
+                (path,),
+            )
+            self._conn.execute(
+                "DELETE FROM pages WHERE document_id IN (SELECT id FROM documents WHERE path = ?)",
+                (path,),
+            )
+            self._conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def search(self, query, limit=10, document=None):
+        """
+        Páginas que contêm todos os termos da busca (ver build_query), da
+        mais à menos relevante: lista de {"document", "page", "score",
+        "snippet"}, com os termos encontrados entre [ ] no trecho. document
+        restringe a busca a um PDF.
+        """
+        expression = build_query(query)
+        if expression is None:
+            return []
+        sql = (
+            "SELECT documents.path, pages.page, bm25(page_text, 1.0, ?) AS rank, "
+            "snippet(page_text, -1, '[', ']', '…', 12) AS snippet "
+            "FROM page_text "
+            "JOIN pages ON pages.id = page_text.rowid "
+            "JOIN documents ON documents.id = pages.document_id "
+            "WHERE page_text MATCH ?"
+        )
+        params = [self.math_weight, expression]
+        if document is not None:
+            sql += " AND documents.path = ?"
+            params.append(os.path.abspath(document))
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "document": row["path"],
+                "page": row["page"],
+                "score": round(-row["rank"], 4),
+                "snippet": " ".join(row["snippet"].split()),
+            }
+            for row in rows
+        ]
+
+    def stats(self):
+        """Quantidade de documentos e de páginas indexadas"""
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return {"documents": documents, "pages": pages}
+
+    def writer(self, output_base):
+        """
+        Formato de saída que mantém o índice atualizado, para output_formats
+        do GeminiOCR (ex.: ["html", index.writer])
+        """
+        return IndexWriter(self, output_base)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IndexWriter(OutputWriter):
+    """
+    Formato de saída que indexa cada página assim que ela é concluída e,
+    ao final, confere o documento inteiro (páginas refeitas, removidas ou
+    processadas antes do índice existir)
+    """
+
+    def __init__(self, index, output_base):
+        super().__init__(index.path)
+        self.index = index
+        self.output_base = output_base
+
+    def write_page(self, record):
+        self.index.add_page(
+            record["document"],
+            record["page"],
+            record["text"],
+            record["total_pages"],
+            record["text_sha256"],
+        )
+
+    def finalize(self, records, processed_pages, total_pages):
+        records = iter(records)
+        first = next(records, None)
+        if first is not None:
+            self.index.index_document(
+                first["document"], itertools.chain([first], records), total_pages
+            )
@@ -0,0 +1,164 @@
+"""
+Divisão de um PDF em partes (intervalos de páginas) processadas por
+processos ou máquinas diferentes, e plano da junção dos resultados
+"""
+
+import os
+import re
+
+
+def parse_shard(spec):
+    """Converte "i/n" (ex.: "2/4", a segunda de quatro partes) em (i, n)"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+    if not match:
+        raise ValueError(f"Parte inválida: {spec} (use i/n, ex.: 2/4)")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Parte inválida: {spec} (i deve estar entre 1 e n)")
+    return index, count
+
+
+def parse_page_range(spec):
+    """
+    Converte um intervalo de páginas "a-b" (numeração do usuário, a partir
+    de 1, inclusivo) em (início, fim) no formato de range: base 0, fim
+    exclusivo. "a-" vai até o fim do documento.
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d*)\s*", spec)
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f"Intervalo de páginas inválido: {spec} (use a-b, ex.: 1-250)")
+    start = int(match.group(1)) - 1
+    stop = int(match.group(2)) if match.group(2) else None
+    if stop is not None and stop <= start:
+        raise ValueError(f"Intervalo de páginas inválido: {spec}")
+    return start, stop
+
+
+def shard_range(total_pages, index, count):
+    """
+    Intervalo (início, fim) da parte index de count: partes contíguas e
+    de tamanhos que diferem em no máximo uma página
+    """
+    return (index - 1) * total_pages // count, index * total_pages // count
+
+
+def resolve_page_range(total_pages, page_range=None, shard=None):
+    """
+    Intervalo (início, fim) efetivo de páginas, ou None para o documento
+    inteiro. page_range é (início, fim) como em range (fim None = até o
+    final); shard é (i, n) ou "i/n".
+    """
+    if page_range is not None and shard is not None:
+        raise ValueError("Use page_range ou shard, não os dois")
+    if shard is not None:
+        if isinstance(shard, str):
+            shard = parse_shard(shard)
+        return shard_range(total_pages, *shard)
+    if page_range is not None:
+        start, stop = page_range
+        stop = total_pages if stop is None else min(stop, total_pages)
+        start = max(0, start)
+        if start >= stop:
+            raise ValueError(
+                f"Intervalo de páginas vazio: {start + 1}-{stop} (documento com {total_pages} páginas)"
+            )
+        return start, stop
+    return None
+
+
+def shard_file_base(file_base, page_range):
+    """
+    Nome base dos arquivos de uma parte: cada intervalo grava os próprios
+    arquivos (HTML, páginas, manifesto, progresso) ao lado do PDF, então
+    partes diferentes nunca escrevem no mesmo arquivo
+    """
+    start, stop = page_range
+    return f"{file_base}_parte_{start + 1}-{stop}"
+
+
+def document_output_base(pdf_path, total_pages, page_range=None, shard=None):
+    """
+    Caminho base (sem sufixo) dos arquivos de saída do PDF e o intervalo
+    de páginas a processar: (caminho base, início, fim)
+    """
+    file_base = os.path.basename(pdf_path).rsplit(".", 1)[0]
+    page_range = resolve_page_range(total_pages, page_range, shard)
+    if page_range is not None:
+        file_base = shard_file_base(file_base, page_range)
+    start, stop = page_range or (0, total_pages)
+    return os.path.join(os.path.dirname(pdf_path), file_base), start, stop
+
+
+def find_shards(output_dir, file_base):
+    """
+    Partes encontradas em output_dir, ordenadas pela primeira página:
+    lista de (início, fim, nome base dos arquivos)
+    """
+    pattern = re.compile(re.escape(file_base) + r"_parte_(\d+)-(\d+)_manifesto\.jsonl")
+    shards = []
+    for name in os.listdir(output_dir or "."):
+        match = pattern.fullmatch(name)
+        if match:
+            start, stop = int(match.group(1)) - 1, int(match.group(2))
+            shards.append((start, stop, shard_file_base(file_base, (start, stop))))
+    return sorted(shards)
+
+
+def plan_merge(total_pages, shard_pages):
+    """
+    Decide de qual parte vem cada página
+
+    shard_pages é uma lista de (nome da parte, {página: sha256}) na ordem
+    das partes. Uma página presente em várias partes vem da primeira delas,
+    o que torna a junção determinística. Devolve (origem, lacunas,
+    sobreposições): origem é {página: nome da parte}, lacunas a lista das
+    páginas ausentes e sobreposições a lista de (página, partes, conteúdos
+    iguais?).
+    """
+    source = {}
+    digests = {}
+    seen_in = {}
+    for name, pages in shard_pages:
+        for page_num, digest in pages.items():
+            seen_in.setdefault(page_num, []).append(name)
+            digests.setdefault(page_num, set()).add(digest)
+            source.setdefault(page_num, name)
+
+    gaps = [page_num for page_num in range(total_pages) if page_num not in source]
+    overlaps = [
+        (page_num, names, len(digests[page_num]) == 1)
+        for page_num, names in sorted(seen_in.items())
+        if len(names) > 1
+    ]
+    return source, gaps, overlaps
+
+
+def format_pages(page_nums):
+    """Páginas (base 0) como texto compacto para o usuário: "1-3, 7, 9-10\""""
+    ranges = []
+    for page_num in sorted(page_nums):
+        if ranges and page_num == ranges[-1][1] + 1:
+            ranges[-1][1] = page_num
+        else:
+            ranges.append([page_num, page_num])
+    return ", ".join(
+        f"{start + 1}" if start == stop else f"{start + 1}-{stop + 1}" for start, stop in ranges
+    )
+
+
+def parse_pages(spec):
+    """
+    Converte uma lista de páginas para o usuário ("3,7,10-12", a partir
+    de 1) nas páginas base 0 correspondentes, em ordem
+    """
+    pages = set()
+    for part in spec.split(","):
+        match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Lista de páginas inválida: {spec} (use ex.: 3,7,10-12)")
+        start = int(match.group(1))
+        stop = int(match.group(2) or start)
+        if stop < start:
+            raise ValueError(f"Lista de páginas inválida: {spec}")
+        pages.update(range(start - 1, stop))
+    return sorted(pages)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import FakeGeminiModel, make_synthetic_pdf  # noqa: E402
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """PDF sintético de 6 páginas em um diretório vazio"""
+    return make_synthetic_pdf(str(tmp_path / "documento.pdf"), pages=6, density=0.3)
+
+
+@pytest.fixture
+def fake_model():
+    return FakeGeminiModel(latency=0.0, jitter=0.0, seed=1)
@@ -0,0 +1,17 @@
+import asyncio
+import shutil
+
+from benchmark import FakeGeminiModel
+from main import GeminiOCR
+
+
+def test_two_event_loops_on_one_instance(pdf_path, tmp_path):
+    # Latência > 0 e uma única vaga: as páginas esperam no semáforo
+    fake_model = FakeGeminiModel(latency=0.01, jitter=0.0, seed=1)
+    ocr = GeminiOCR("teste", model=fake_model, max_workers=1)
+    assert asyncio.run(ocr.process_document_async(pdf_path)) is not None
+
+    # Um segundo asyncio.run cria outro loop de eventos
+    other_path = shutil.copy(pdf_path, str(tmp_path / "outro.pdf"))
+    assert asyncio.run(ocr.process_document_async(other_path)) is not None
+    assert fake_model.calls == 12
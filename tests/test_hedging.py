@@ -0,0 +1,90 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from benchmark import FakeAPIError
+from hedging import HedgePolicy
+from scheduler import RequestScheduler
+
+
+def warm_policy(latency=0.01):
+    policy = HedgePolicy(budget=1.0, min_samples=3)
+    for _ in range(3):
+        policy._finish(latency)
+    return policy
+
+
+def test_warm_up_calls_run_inline():
+    policy = HedgePolicy(budget=1.0, min_samples=3)
+    callers = []
+
+    def fn(cancelled):
+        callers.append(threading.current_thread())
+        return "ok"
+
+    assert policy.call(fn) == "ok"
+    assert callers == [threading.current_thread()]
+    assert policy.hedges == 0
+    policy.close()
+
+
+def test_fast_call_gets_no_hedge():
+    policy = warm_policy(latency=1.0)
+    assert policy.call(lambda cancelled: "ok") == "ok"
+    assert policy.hedges == 0
+    policy.close()
+
+
+def test_hedge_wins_without_waiting_for_a_blocked_primary():
+    policy = warm_policy()
+    calls = []
+    won = []
+
+    def fn(cancelled):
+        calls.append(threading.current_thread())
+        if len(calls) == 1:
+            # Original presa em uma requisição que não pode ser interrompida
+            time.sleep(1.0)
+            return "original"
+        return "copia"
+
+    started = time.monotonic()
+    assert policy.call(fn, won.append) == "copia"
+    assert time.monotonic() - started < 0.5
+    assert won == [True]
+    assert policy.summary()["hedges_won"] == 1
+    policy.close()
+
+
+def test_loser_is_told_to_give_up():
+    policy = warm_policy()
+    events = []
+
+    def fn(cancelled):
+        events.append(cancelled)
+        if len(events) == 1:
+            cancelled.wait(1.0)
+            return "original"
+        return "copia"
+
+    assert policy.call(fn) == "copia"
+    assert events[0].is_set() and not events[1].is_set()
+    policy.close()
+
+
+def test_scheduler_stops_retrying_when_cancelled():
+    scheduler = RequestScheduler(max_concurrency=2, base_delay=10, max_delay=10)
+    cancelled = threading.Event()
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        cancelled.set()
+        raise FakeAPIError(503)
+
+    with pytest.raises(CancelledError):
+        scheduler.call(fn, cancelled=cancelled)
+    assert len(attempts) == 1
+    assert scheduler._in_flight == 0
@@ -0,0 +1,26 @@
+import pytest
+
+from normalizer import TextNormalizer
+
+
+@pytest.mark.parametrize(
+    "command",
+    [r"\tag{1}", r"\notag", r"\textcolor{red}{x}", r"\newcommand", r"\ntriangleleft", r"\nabla", r"\theta"],
+)
+def test_latex_commands_starting_with_n_or_t_are_kept(command):
+    assert TextNormalizer().normalize(f"$x = 1 {command}$") == f"$x = 1 {command}$"
+
+
+def test_literal_escapes():
+    normalizer = TextNormalizer()
+    assert normalizer.normalize(r"fim.\n 2\t  x") == "fim. 2 x"
+    assert normalizer.normalize(r"fun\u00e7\u00e3o \u1234") == "função "
+    assert normalizer.normalize(r"\\nabla") == r"\nabla"
+    assert normalizer.normalize("a – b − c") == "a - b - c"
+
+
+def test_newlines():
+    text = "a\n\n  b $$\nx\n$$ c"
+    assert TextNormalizer().normalize(text) == "a b $$ x $$ c"
+    assert TextNormalizer(preserve_newlines=True).normalize(text) == "a\nb $$\nx\n$$ c"
+    assert TextNormalizer(preserve_math_newlines=True).normalize(text) == "a b $$\nx\n$$ c"
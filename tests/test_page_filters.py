@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from page_filters import PageFilter, hamming_distance
+
+
+def linear_check(hashes, max_distance):
+    """Busca linear de referência: a primeira página anterior próxima o bastante"""
+    seen = []
+    originals = []
+    for page, phash in enumerate(hashes):
+        original = next(
+            (page for seen_hash, page in seen if hamming_distance(seen_hash, phash) <= max_distance),
+            None,
+        )
+        if original is None:
+            seen.append((phash, page))
+        originals.append(original)
+    return originals
+
+
+@pytest.mark.parametrize("max_distance", [0, 1, 4, 12, 300])
+def test_duplicates_match_linear_scan(max_distance):
+    rng = random.Random(max_distance)
+    originals = [rng.getrandbits(256) for _ in range(30)]
+    hashes = []
+    for _ in range(300):
+        value = rng.choice(originals)
+        for _ in range(rng.randint(0, 8)):
+            value ^= 1 << rng.randrange(256)
+        hashes.append(f"{value:064x}")
+
+    page_filter = PageFilter(max_distance=max_distance)
+    found = [
+        page_filter.check(page, {"phash": phash, "ink": 0.5})[1]
+        for page, phash in enumerate(hashes)
+    ]
+    assert found == linear_check(hashes, max_distance)
+
+
+def test_remembered_page_is_an_original():
+    page_filter = PageFilter(blank_ink=0.01, max_distance=2)
+    page_filter.remember(3, {"phash": "f" * 64, "ink": 0.2})
+    assert page_filter.check(7, {"phash": "f" * 63 + "e", "ink": 0.2}) == ("duplicate", 3)
+    assert page_filter.check(8, {"phash": "0" * 64, "ink": 0.0}) == ("blank", None)
+    assert page_filter.duplicate_pages == 1
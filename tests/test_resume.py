@@ -0,0 +1,62 @@
+import os
+
+from benchmark import FakeAPIError, FakeGeminiModel
+from main import GeminiOCR
+from manifest import PageManifest
+from scheduler import RequestScheduler
+
+
+class FailingModel(FakeGeminiModel):
+    """Modelo falso que recusa, com 503, as chamadas de número fail_on"""
+
+    def __init__(self, fail_on):
+        super().__init__(latency=0.0, jitter=0.0, seed=1)
+        self.fail_on = set(fail_on)
+
+    def generate_content(self, parts, **kwargs):
+        if self.calls + 1 in self.fail_on:
+            self.calls += 1
+            raise FakeAPIError(503)
+        return super().generate_content(parts, **kwargs)
+
+
+def done_pages(pdf_path):
+    manifest = PageManifest(pdf_path.rsplit(".", 1)[0] + "_manifesto.jsonl")
+    try:
+        return set(manifest.done_pages())
+    finally:
+        manifest.close()
+
+
+def test_resume_after_failure_only_redoes_missing_pages(pdf_path):
+    failing = FailingModel(fail_on={3})
+    ocr = GeminiOCR(
+        "teste", model=failing, max_workers=1, scheduler=RequestScheduler(max_retries=0)
+    )
+    ocr.process_document(pdf_path)
+    first_run = done_pages(pdf_path)
+    assert 0 < len(first_run) < 6
+
+    model = FakeGeminiModel(latency=0.0, jitter=0.0, seed=1)
+    output = GeminiOCR("teste", model=model, max_workers=1).process_document(pdf_path)
+    assert done_pages(pdf_path) == set(range(6))
+    assert model.calls == 6 - len(first_run)
+    assert os.path.exists(output)
+
+
+def test_resume_ignores_a_stale_progress_file(pdf_path):
+    ocr = GeminiOCR(
+        "teste",
+        model=FailingModel(fail_on={4}),
+        max_workers=1,
+        scheduler=RequestScheduler(max_retries=0),
+    )
+    ocr.process_document(pdf_path)
+    first_run = done_pages(pdf_path)
+
+    # O manifesto é a fonte da verdade: um progresso apagado ou antigo não muda nada
+    os.remove(pdf_path.rsplit(".", 1)[0] + "_progresso.json")
+    model = FakeGeminiModel(latency=0.0, jitter=0.0, seed=1)
+    GeminiOCR("teste", model=model, max_workers=1).process_document(pdf_path)
+    assert model.calls == 6 - len(first_run)
+    assert done_pages(pdf_path) == set(range(6))
@@ -0,0 +1,76 @@
+import fitz  # PyMuPDF
+
+from main import GeminiOCR
+from revisions import align_revisions
+
+
+def make_pdf(path, texts):
+    document = fitz.open()
+    for text in texts:
+        page = document.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text * 30, fontsize=11)
+    document.save(path)
+    document.close()
+    return path
+
+
+def fingerprint(text, phash="0" * 64):
+    return {"text_layer_sha256": text, "phash": phash}
+
+
+def test_align_revisions_statuses():
+    old = {page_num: fingerprint(text) for page_num, text in enumerate("abcdef")}
+    new = [
+        fingerprint("a"),
+        fingerprint("x"),  # inserida
+        fingerprint("b"),
+        fingerprint("c2"),  # alterada (no lugar de c)
+        fingerprint("e"),  # e e d trocadas de lugar
+        fingerprint("d"),
+    ]  # f removida
+    changes, removed = align_revisions(old, new)
+    statuses = {new_page: (status, old_page) for new_page, status, old_page in changes}
+    assert statuses[0] == ("unchanged", 0)
+    assert statuses[1] == ("inserted", None)
+    assert statuses[2] == ("unchanged", 1)
+    assert statuses[3] == ("modified", 2)
+    assert {statuses[4][1], statuses[5][1]} == {3, 4}
+    assert "moved" in (statuses[4][0], statuses[5][0])
+    assert removed == [5]
+
+
+def test_near_identical_scan_is_unchanged():
+    old = {0: fingerprint("", "f" * 64)}
+    new = [fingerprint("", "f" * 63 + "e")]
+    assert align_revisions(old, new, max_distance=4) == ([(0, "unchanged", 0)], [])
+    assert align_revisions(old, new, max_distance=0) == ([(0, "modified", 0)], [])
+
+
+def test_process_revision_only_sends_new_pages(tmp_path, fake_model):
+    v1 = [f"Capitulo {i} texto " for i in range(8)]
+    # Insere uma página, altera a 3ª, troca a 4ª e a 5ª de lugar e remove a 6ª
+    v2 = [v1[0], "Nova pagina ", v1[1], v1[2] + "errata ", v1[4], v1[3], v1[6], v1[7]]
+    previous = make_pdf(str(tmp_path / "v1.pdf"), v1)
+    current = make_pdf(str(tmp_path / "v2.pdf"), v2)
+
+    ocr = GeminiOCR("teste", model=fake_model, max_workers=2)
+    ocr.process_document(previous)
+    assert fake_model.calls == 8
+
+    report = ocr.process_revision(current, previous)
+    assert fake_model.calls == 10
+    assert report["summary"] == {
+        "unchanged": 5,
+        "moved": 1,
+        "modified": 1,
+        "inserted": 1,
+        "removed": 1,
+    }
+    assert report["removed"] == [6]
+    assert [(page["page"], page["status"]) for page in report["pages"]][:5] == [
+        (1, "unchanged"),
+        (2, "inserted"),
+        (3, "unchanged"),
+        (4, "modified"),
+        (5, "moved"),
+    ]
@@ -0,0 +1,71 @@
+from benchmark import FakeAPIError, FakeGeminiModel
+from main import GeminiOCR
+from metrics import Metrics
+from scheduler import RequestScheduler
+
+
+def test_429_halves_concurrency_and_retries():
+    scheduler = RequestScheduler(max_concurrency=8, base_delay=0, sleep=lambda seconds: None)
+    failures = [FakeAPIError(429), FakeAPIError(429)]
+
+    def call():
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    assert scheduler.call(call) == "ok"
+    assert scheduler.retries == 2
+    assert scheduler.throttled == 2
+    assert scheduler.concurrency == 2
+    assert scheduler.decreases == 2
+    assert scheduler.lowest_concurrency == 2
+
+
+def test_fake_model_throttle_rate():
+    model = FakeGeminiModel(latency=0.0, jitter=0.0, throttle_rate=1.0, seed=0)
+    scheduler = RequestScheduler(max_concurrency=4, max_retries=2, base_delay=0, sleep=lambda seconds: None)
+    try:
+        scheduler.call(lambda: model.generate_content(["prompt"]))
+    except FakeAPIError as e:
+        assert e.code == 429
+    else:
+        raise AssertionError("esperava um 429")
+    assert model.throttled == 3
+    assert scheduler.concurrency == 1
+
+
+def test_retries_and_throttles_reach_metrics():
+    metrics = Metrics()
+    scheduler = RequestScheduler(
+        max_concurrency=8, base_delay=0, sleep=lambda seconds: None, metrics=metrics
+    )
+    failures = [FakeAPIError(503), FakeAPIError(429), FakeAPIError(429)]
+
+    def call():
+        if failures:
+            raise failures.pop()
+        return "ok"
+
+    assert scheduler.call(call) == "ok"
+    assert metrics.counters['api_retries_total{status="429"}'] == 2
+    assert metrics.counters['api_retries_total{status="503"}'] == 1
+    assert metrics.counters["api_throttled_total"] == 2
+    assert metrics.counters["concurrency_decreases_total"] == 2
+    assert "gemini_ocr_api_retries_total" in metrics.to_prometheus()
+
+
+def test_ocr_shares_its_metrics_with_the_scheduler(pdf_path):
+    metrics = Metrics()
+    model = FakeGeminiModel(latency=0.0, jitter=0.0, error_rate=0.5, seed=1)
+    ocr = GeminiOCR(
+        "teste",
+        model=model,
+        metrics=metrics,
+        scheduler=RequestScheduler(base_delay=0, sleep=lambda seconds: None),
+    )
+    ocr.process_document(pdf_path)
+    retries = sum(
+        value for key, value in metrics.counters.items() if key.startswith("api_retries_total")
+    )
+    assert model.errors > 0
+    assert retries == ocr.scheduler.retries == model.errors
@@ -0,0 +1,47 @@
+import pytest
+
+from search_index import SearchIndex, build_query, latex_tokens, split_math
+
+
+def test_latex_tokens_normalizes_commands():
+    assert latex_tokens(r"\dfrac{1}{x^2}") == ["frac", "1", "x", "2"]
+    assert latex_tokens(r"\left( a \le b \right)") == ["a", "leq", "b"]
+
+
+def test_split_math_separates_prose_and_formulas():
+    prose, math = split_math(r"<b>Seja</b> $\frac{1}{x}$ e \[ \int f \]")
+    assert "$…$" in prose and "<b>" not in prose
+    assert math == "frac 1 x int f"
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("integral", '"integral"'),
+        ("deriv*", '"deriv"*'),
+        (r"\frac", 'math : "frac"'),
+        (r"área $\dfrac{1}{x}$", '"área" AND math : "frac 1 x"'),
+        ('aspas"', '"aspas"'),
+        ("   ", None),
+    ],
+)
+def test_build_query(query, expected):
+    assert build_query(query) == expected
+
+
+def test_search_finds_formulas_and_skips_unchanged_pages(tmp_path):
+    index = SearchIndex(str(tmp_path / "indice.sqlite3"))
+    try:
+        assert index.add_page("a.pdf", 1, r"Seja $\frac{1}{x}$ a função", total_pages=2)
+        assert index.add_page("a.pdf", 2, "Apenas prosa sobre integrais", total_pages=2)
+        assert not index.add_page("a.pdf", 1, r"Seja $\frac{1}{x}$ a função")
+
+        results = index.search(r"$\dfrac{1}{x}$")
+        assert [result["page"] for result in results] == [1]
+        assert [result["page"] for result in index.search("integr*")] == [2]
+        assert index.stats() == {"documents": 1, "pages": 2}
+
+        index.remove_document("a.pdf")
+        assert index.search("prosa") == []
+    finally:
+        index.close()
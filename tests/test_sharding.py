@@ -0,0 +1,33 @@
+import json
+
+from main import GeminiOCR
+
+
+def test_shards_merge_into_the_whole_document(pdf_path, fake_model):
+    ocr = GeminiOCR("teste", model=fake_model, max_workers=2, output_formats=("html", "jsonl"))
+    assert ocr.process_document(pdf_path, shard="1/2") is not None
+    assert ocr.process_document(pdf_path, shard="2/2") is not None
+    assert fake_model.calls == 6
+
+    result = ocr.merge_shards(pdf_path)
+    assert result["pages"] == result["total_pages"] == 6
+    assert len(result["shards"]) == 2
+    assert result["gaps"] == []
+    assert result["overlaps"] == []
+    # A junção não chama o modelo de novo
+    assert fake_model.calls == 6
+
+    with open(pdf_path.rsplit(".", 1)[0] + "_paginas.jsonl", encoding="utf-8") as f:
+        pages = [json.loads(line)["page"] for line in f]
+    assert pages == [1, 2, 3, 4, 5, 6]
+
+
+def test_overlapping_shards_are_reported(pdf_path, fake_model):
+    ocr = GeminiOCR("teste", model=fake_model, max_workers=2)
+    ocr.process_document(pdf_path, page_range=(0, 4))
+    ocr.process_document(pdf_path, page_range=(3, 5))
+
+    result = ocr.merge_shards(pdf_path)
+    assert result["pages"] == 5
+    assert result["gaps"] == [5]
+    assert [page_num for page_num, _, _ in result["overlaps"]] == [3]
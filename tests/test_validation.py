@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from benchmark import FakeGeminiModel, make_synthetic_pdf
+from main import GeminiOCR
+from manifest import PageManifest
+
+
+class ShortAnswerModel(FakeGeminiModel):
+    """Modelo falso que devolve uma única frase curta para qualquer página"""
+
+    def __init__(self):
+        super().__init__(latency=0.0, jitter=0.0, seed=1)
+        self._page_text = "Seja x um número real e positivo."
+
+
+@pytest.mark.parametrize("mode", ["threads", "asyncio"])
+def test_short_answer_on_inked_page_is_flagged(tmp_path, mode):
+    # Páginas densas: bem mais tinta do que a frase do modelo explica
+    pdf_path = make_synthetic_pdf(str(tmp_path / "denso.pdf"), pages=6, density=1.0)
+    ocr = GeminiOCR("teste", model=ShortAnswerModel(), max_workers=2)
+    if mode == "asyncio":
+        asyncio.run(ocr.process_document_async(pdf_path))
+    else:
+        ocr.process_document(pdf_path)
+
+    manifest = PageManifest(pdf_path.rsplit(".", 1)[0] + "_manifesto.jsonl")
+    try:
+        entries = [manifest.entries[page_num] for page_num in range(6)]
+    finally:
+        manifest.close()
+    for entry in entries:
+        assert entry["ink"] > 0
+        assert "low_text_density" in entry["quality_flags"]
+        assert entry["quality"] < 1.0
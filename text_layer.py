@@ -0,0 +1,93 @@
+"""
+Classificação das páginas que já possuem camada de texto utilizável
+"""
+
+# Fontes típicas de fórmulas (TeX, MathType, Symbol...)
+MATH_FONT_HINTS = (
+    "cmmi",
+    "cmsy",
+    "cmex",
+    "msbm",
+    "msam",
+    "rsfs",
+    "eufm",
+    "symbol",
+    "math",
+    "stix",
+    "mtpro",
+    "mt extra",
+)
+
+# Símbolos que indicam fórmulas que o texto puro não representa bem
+MATH_CHARS = set("∑∏∫∮√∞≤≥≠≈≡±∓∂∇∈∉⊂⊃⊆⊇∪∩∀∃→←↔⇒⇐⇔αβγδεζηθλμνξπρστφχψωΓΔΘΛΞΠΣΦΨΩ")
+
+
+def _is_bad_char(char):
+    """Caracteres que indicam codificação quebrada na camada de texto"""
+    code = ord(char)
+    return (
+        char == "�"
+        or 0xE000 <= code <= 0xF8FF  # Área de uso privado (glifos sem mapeamento)
+        or (code < 32 and char not in "\n\t")
+    )
+
+
+def classify_page(page, min_chars=200, max_bad_ratio=0.01, max_math_ratio=0.002, max_image_coverage=0.5):
+    """
+    Decide se o texto nativo da página pode substituir o OCR
+
+    Devolve (decisão, texto), onde decisão é um dicionário com
+    "use_text_layer" e "reason" (o motivo, para o relatório) e texto é o
+    conteúdo extraído, ou None quando a página deve ir para a API.
+    """
+    page_dict = page.get_text("dict")
+    page_area = page.rect.width * page.rect.height
+
+    lines = []
+    fonts = set()
+    image_area = 0.0
+    for block in page_dict.get("blocks", []):
+        if block.get("type") == 1:
+            x0, y0, x1, y1 = block["bbox"]
+            image_area += max(0, x1 - x0) * max(0, y1 - y0)
+            continue
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            fonts.update(span.get("font", "") for span in spans)
+            lines.append("".join(span.get("text", "") for span in spans))
+        lines.append("")
+
+    text = "\n".join(lines).strip()
+    chars = len(text.replace(" ", "").replace("\n", ""))
+    decision = {"use_text_layer": False, "chars": chars}
+
+    if chars < min_chars:
+        decision["reason"] = f"camada de texto ausente ou curta ({chars} caracteres)"
+        return decision, None
+
+    if page_area and image_area / page_area > max_image_coverage:
+        decision["reason"] = (
+            f"página digitalizada (imagens cobrem {image_area * 100 / page_area:.0f}% da área)"
+        )
+        return decision, None
+
+    math_fonts = sorted(
+        font for font in fonts if any(hint in font.lower() for hint in MATH_FONT_HINTS)
+    )
+    if math_fonts:
+        decision["reason"] = f"fontes matemáticas: {', '.join(math_fonts)}"
+        return decision, None
+
+    math_chars = sum(1 for char in text if char in MATH_CHARS)
+    if math_chars / chars > max_math_ratio:
+        decision["reason"] = f"símbolos matemáticos no texto ({math_chars})"
+        return decision, None
+
+    bad_chars = sum(1 for char in text if _is_bad_char(char))
+    if bad_chars / chars > max_bad_ratio:
+        decision["reason"] = f"codificação quebrada ({bad_chars} caracteres inválidos)"
+        return decision, None
+
+    decision["use_text_layer"] = True
+    decision["reason"] = "texto nativo utilizável"
+    return decision, text
@@ -0,0 +1,159 @@
+"""
+Divisão de páginas densas em recortes (colunas e blocos) enviados em
+paralelo ao modelo
+"""
+
+from page_filters import INK_LEVEL, pixmap_gray
+
+
+def _segments(profile, min_gap, noise=0):
+    """
+    Trechos (início, fim) com tinta de um perfil de projeção, separados por
+    pelo menos min_gap posições sem tinta (valores até noise)
+    """
+    segments = []
+    start = None
+    blank = 0
+    for position, value in enumerate(profile):
+        if value > noise:
+            if start is None:
+                start = position
+            elif blank >= min_gap:
+                segments.append((start, position - blank))
+                start = position
+            blank = 0
+        elif start is not None:
+            blank += 1
+    if start is not None:
+        segments.append((start, len(profile) - blank))
+    return segments
+
+
+def _gutters(columns):
+    return [(left[1], right[0]) for left, right in zip(columns, columns[1:])]
+
+
+def _aligned(gutters_a, gutters_b):
+    """Mesma quantidade de colunas, com os espaços entre elas sobrepostos"""
+    return len(gutters_a) == len(gutters_b) and all(
+        a_start < b_stop and b_start < a_stop
+        for (a_start, a_stop), (b_start, b_stop) in zip(gutters_a, gutters_b)
+    )
+
+
+def find_regions(ink, max_tiles=4, min_gap=0.01, min_gutter=0.02, min_height=0.1, padding=0):
+    """
+    Regiões (x0, y0, x1, y1), em pixels e na ordem de leitura, de uma
+    máscara de tinta (matriz booleana da página)
+
+    Perfis de projeção: a página é cortada em faixas nas linhas sem tinta
+    (de pelo menos min_gap da altura) e cada faixa em colunas nos espaços
+    verticais sem tinta (de pelo menos min_gutter da largura); faixas
+    vizinhas com as mesmas colunas são unidas, para que um texto em duas
+    colunas seja lido coluna a coluna. Regiões vizinhas são então unidas,
+    ou as mais altas divididas entre parágrafos (sem ficar abaixo de
+    min_height da altura da página), até chegar a max_tiles regiões.
+    padding (em pixels, menor que metade dos espaços mínimos) é a margem
+    mantida em volta da tinta; as divisões entre parágrafos já caem no
+    meio do espaço entre as linhas.
+    """
+    height, width = ink.shape
+    min_gap_rows = max(1, int(min_gap * height))
+    min_gutter_cols = max(1, int(min_gutter * width))
+
+    # Faixas horizontais e as colunas de cada uma
+    bands = []
+    for top, bottom in _segments(ink.sum(axis=1), min_gap_rows):
+        columns = _segments(ink[top:bottom].sum(axis=0), min_gutter_cols)
+        if bands and _aligned(_gutters(bands[-1][2]), _gutters(columns)):
+            previous_top = bands[-1][0]
+            merged = _segments(ink[previous_top:bottom].sum(axis=0), min_gutter_cols)
+            bands[-1] = (previous_top, bottom, merged)
+        else:
+            bands.append((top, bottom, columns))
+
+    regions = [
+        [
+            max(0, left - padding),
+            max(0, top - padding),
+            min(width, right + padding),
+            min(height, bottom + padding),
+        ]
+        for top, bottom, columns in bands
+        for left, right in columns
+    ]
+    if not regions:
+        return []
+
+    # Poucas regiões grandes: une as vizinhas de menor área somada
+    def area(region):
+        return (region[2] - region[0]) * (region[3] - region[1])
+
+    def union(a, b):
+        return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+    while len(regions) > max_tiles:
+        index = min(
+            range(len(regions) - 1), key=lambda i: area(union(regions[i], regions[i + 1]))
+        )
+        regions[index : index + 2] = [union(regions[index], regions[index + 1])]
+
+    # Regiões altas demais: divide entre parágrafos, perto do meio
+    min_rows = int(min_height * height)
+    splittable = [True] * len(regions)
+    while len(regions) < max_tiles and any(splittable):
+        index = max(
+            (i for i in range(len(regions)) if splittable[i]),
+            key=lambda i: regions[i][3] - regions[i][1],
+        )
+        left, top, right, bottom = regions[index]
+        lines = _segments(ink[top:bottom, left:right].sum(axis=1), 1)
+        cuts = [
+            top + (stop + start) // 2
+            for (_, stop), (start, _) in zip(lines, lines[1:])
+            if min_rows <= (stop + start) // 2 <= bottom - top - min_rows
+        ]
+        if not cuts:
+            splittable[index] = False
+            continue
+        middle = (top + bottom) // 2
+        cut = min(cuts, key=lambda row: abs(row - middle))
+        regions[index : index + 1] = [[left, top, right, cut], [left, cut, right, bottom]]
+        splittable[index : index + 1] = [True, True]
+
+    return [tuple(region) for region in regions]
+
+
+class PageTiler:
+    """
+    Decide quais páginas dividir em recortes e onde cortar
+
+    Páginas com fração de tinta a partir de min_ink (ex.: folhas de
+    fórmulas em duas colunas, tabelas) ou com pelo menos max_pixels pixels
+    na resolução de envio são divididas em até max_tiles recortes, ao longo
+    de colunas e parágrafos (ver find_regions); cada recorte vai em uma
+    chamada à API, em paralelo, e os textos são unidos na ordem de leitura.
+    Respostas menores chegam mais rápido e não são cortadas pelo limite de
+    tamanho da resposta do modelo. padding (em pixels) é a margem mantida
+    em volta da tinta de cada recorte.
+    """
+
+    def __init__(self, min_ink=0.1, max_pixels=None, max_tiles=4, padding=8):
+        self.min_ink = min_ink
+        self.max_pixels = max_pixels
+        self.max_tiles = max(2, int(max_tiles))
+        self.padding = padding
+
+    def split(self, pix):
+        """
+        Recortes (x0, y0, x1, y1), em pixels do pixmap e na ordem de
+        leitura, ou None se a página não precisa ser dividida
+        """
+        ink = pixmap_gray(pix) < INK_LEVEL
+        dense = self.min_ink is not None and ink.mean() >= self.min_ink
+        large = self.max_pixels is not None and pix.width * pix.height >= self.max_pixels
+        if not (dense or large):
+            return None
+
+        regions = find_regions(ink, self.max_tiles, padding=self.padding)
+        return regions if len(regions) >= 2 else None
@@ -0,0 +1,168 @@
+"""
+Validação automática do texto devolvido pelo modelo para cada página
+"""
+
+import re
+
+# Escapes \uXXXX que sobraram na resposta (o normalizador os remove)
+_UNICODE_ESCAPE = re.compile(r"\\u[0-9a-fA-F]{4}")
+
+# Caracteres que indicam codificação quebrada: o caractere de substituição
+# e UTF-8 lido como Latin-1 ("Ã§", "Ã£", "â€")
+_MOJIBAKE = re.compile("\ufffd|Ã[\u0080-\u00bf]|â€")
+
+# Blocos $$ ... $$ e trechos $ ... $, ignorando \$
+_DISPLAY_MATH = re.compile(r"(?<!\\)\$\$(.*?)(?<!\\)\$\$", re.DOTALL)
+_INLINE_MATH = re.compile(r"(?<!\\)\$(.+?)(?<!\\)\$", re.DOTALL)
+_DOLLAR = re.compile(r"(?<!\\)\$")
+_DISPLAY_DELIMITER = re.compile(r"(?<!\\)\$\$")
+
+_ENVIRONMENT = re.compile(r"\\(begin|end)\{([^}]*)\}")
+_FRAC = re.compile(r"\\[dt]?frac(?![A-Za-z])")
+_SINGLE_ARGUMENT = re.compile(r"\\(?:[A-Za-z]+|.)|[A-Za-z0-9]")
+
+# Penalidade de cada problema na nota da página (1 = sem problemas)
+PENALTIES = {
+    "empty": 1.0,
+    "unbalanced_math": 0.4,
+    "unbalanced_braces": 0.3,
+    "broken_frac": 0.3,
+    "unbalanced_environment": 0.3,
+    "encoding_artifacts": 0.3,
+    "low_text_density": 0.4,
+}
+
+
+def _braces_balanced(latex):
+    """Chaves { } equilibradas, ignorando \\{ e \\}"""
+    depth = 0
+    escaped = False
+    for char in latex:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0:
+                return False
+    return depth == 0
+
+
+def _argument_end(latex, position):
+    """Posição logo após o argumento LaTeX em position, ou None se não houver"""
+    while position < len(latex) and latex[position].isspace():
+        position += 1
+    if position >= len(latex):
+        return None
+    if latex[position] == "{":
+        depth = 0
+        while position < len(latex):
+            char = latex[position]
+            if char == "\\":
+                position += 1
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return position + 1
+            position += 1
+        return None
+    # Argumento de um caractere ou comando: \frac12, \frac\pi2
+    match = _SINGLE_ARGUMENT.match(latex, position)
+    return match.end() if match else None
+
+
+def _broken_fracs(latex):
+    """Número de \\frac que não são seguidos de dois argumentos"""
+    broken = 0
+    for match in _FRAC.finditer(latex):
+        position = _argument_end(latex, match.end())
+        if position is None or _argument_end(latex, position) is None:
+            broken += 1
+    return broken
+
+
+def math_density(text):
+    """Fração dos caracteres do texto que está dentro de fórmulas ($ e $$)"""
+    if not text:
+        return 0.0
+    display = _DISPLAY_MATH.findall(text)
+    inline = _INLINE_MATH.findall(_DISPLAY_MATH.sub(" ", text))
+    return sum(len(formula) for formula in display + inline) / len(text)
+
+
+class PageValidator:
+    """
+    Dá uma nota de 0 a 1 ao resultado de uma página e aponta os problemas
+
+    Verifica o equilíbrio de $ e $$, das chaves e de \\begin/\\end dentro
+    das fórmulas, se cada \\frac tem dois argumentos, escapes \\uXXXX e
+    sinais de codificação quebrada no texto bruto do modelo, texto vazio e,
+    quando a cobertura de tinta da página é conhecida, se há texto
+    suficiente para a tinta (min_chars_per_ink caracteres por unidade de
+    tinta; uma página de texto corrido costuma ter 0,05 a 0,1 de tinta e
+    mais de 1500 caracteres). Páginas com nota abaixo de threshold ficam
+    marcadas para reprocessamento (ver GeminiOCR.reprocess_pages).
+    """
+
+    def __init__(self, threshold=0.8, min_chars=20, min_ink=0.01, min_chars_per_ink=2000):
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.min_ink = min_ink
+        self.min_chars_per_ink = min_chars_per_ink
+
+    def validate(self, raw_text, text, ink=None):
+        """
+        Avalia uma página a partir do texto bruto do modelo e do texto
+        limpo; devolve {"quality": nota, "quality_flags": [problemas]}
+        """
+        flags = []
+        stripped = text.strip()
+        if len(stripped) < self.min_chars:
+            flags.append("empty")
+        else:
+            flags.extend(self._math_flags(stripped))
+            if ink is not None and ink >= self.min_ink:
+                if len(stripped) < ink * self.min_chars_per_ink:
+                    flags.append("low_text_density")
+
+        if _UNICODE_ESCAPE.search(raw_text) or _MOJIBAKE.search(raw_text):
+            flags.append("encoding_artifacts")
+
+        quality = max(0.0, 1.0 - sum(PENALTIES[flag] for flag in flags))
+        return {"quality": round(quality, 2), "quality_flags": flags}
+
+    def _math_flags(self, text):
+        flags = []
+        rest = _DISPLAY_MATH.sub(" ", text)
+        if len(_DISPLAY_DELIMITER.findall(text)) % 2 or len(_DOLLAR.findall(rest)) % 2:
+            flags.append("unbalanced_math")
+
+        formulas = _DISPLAY_MATH.findall(text) + _INLINE_MATH.findall(rest)
+        if not all(_braces_balanced(formula) for formula in formulas):
+            flags.append("unbalanced_braces")
+        if any(_broken_fracs(formula) for formula in formulas):
+            flags.append("broken_frac")
+
+        # \begin e \end aninhados corretamente
+        environments = []
+        for kind, name in _ENVIRONMENT.findall(text):
+            if kind == "begin":
+                environments.append(name)
+            elif environments and environments[-1] == name:
+                environments.pop()
+            else:
+                environments.append(None)
+                break
+        if environments:
+            flags.append("unbalanced_environment")
+        return flags
+
+    def is_flagged(self, entry):
+        """Se a página do manifesto ficou abaixo da nota mínima"""
+        quality = entry.get("quality")
+        return quality is not None and quality < self.threshold
@@ -0,0 +1,213 @@
+"""
+Formatos de saída dos documentos processados (HTML, JSONL, Markdown)
+"""
+
+import bisect
+import json
+import os
+
+# Marca usada para separar o modelo HTML em cabeçalho e rodapé
+_CONTENT_MARKER = "\x00conteudo\x00"
+
+
+class OutputWriter:
+    """
+    Interface dos formatos de saída de um documento
+
+    write_page(record) recebe cada página assim que ela é concluída (fora
+    de ordem, no processamento paralelo) e deve custar apenas o tamanho
+    da página; finalize(records, processed_pages, total_pages) recebe, ao
+    fim do processamento (ou da junção das partes), os registros de todas
+    as páginas armazenadas, em ordem. Um registro é um dicionário com
+    "document", "page" (a partir de 1), "total_pages", "text" (o texto
+    limpo da página), "html" (o fragmento HTML da página), "source",
+    "sha256" (do fragmento, como no manifesto), "text_sha256", "phash",
+    "started_at", "finished_at" e "seconds".
+
+    incremental = False indica que o formato só é gerado em finalize, e
+    os registros por página nem chegam a ser montados para ele.
+    """
+
+    incremental = True
+
+    def __init__(self, path):
+        self.path = path
+
+    def write_page(self, record):
+        pass
+
+    def finalize(self, records, processed_pages, total_pages):
+        pass
+
+    def close(self):
+        pass
+
+
+class _AppendWriter(OutputWriter):
+    """
+    Formato acrescentado a cada página concluída e regravado em ordem ao
+    final; o arquivo é aberto apenas na primeira página
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = None
+
+    def _format(self, record):
+        raise NotImplementedError
+
+    def write_page(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(self._format(record))
+        self._file.flush()
+
+    def finalize(self, records, processed_pages, total_pages):
+        self.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(self._format(record))
+        # Substitui o arquivo anterior de uma vez, sem deixá-lo pela metade
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonlWriter(_AppendWriter):
+    """
+    Um registro JSON por linha e por página, sem o fragmento HTML
+
+    Durante o processamento as linhas seguem a ordem de conclusão e uma
+    página refeita aparece de novo (vale a última linha); ao final o
+    arquivo fica com uma linha por página, em ordem.
+    """
+
+    def _format(self, record):
+        record = {key: value for key, value in record.items() if key != "html"}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class MarkdownWriter(_AppendWriter):
+    """Texto das páginas em Markdown, com um título por página"""
+
+    def _format(self, record):
+        return f"## Página {record['page']}\n\n{record['text'].strip()}\n\n"
+
+
+class HtmlWriter(OutputWriter):
+    """
+    O documento HTML completo, montado só ao final: render(conteúdo,
+    páginas processadas, total, arquivos das páginas) aplica o modelo, e as
+    páginas são copiadas entre o cabeçalho e o rodapé sem montar o
+    documento em memória
+
+    split divide documentos grandes em vários arquivos: um número de
+    páginas por arquivo ou a lista das páginas (base 0) em que cada parte
+    começa. A primeira parte fica em path e as seguintes em path com
+    _02, _03, ... antes da extensão; todas têm o índice completo, com
+    links para os outros arquivos.
+    """
+
+    incremental = False
+
+    def __init__(self, path, render, split=None):
+        super().__init__(path)
+        self.render = render
+        self.split = split
+
+    def part_path(self, part):
+        """Arquivo da parte part (a partir de 0)"""
+        if part == 0:
+            return self.path
+        root, extension = os.path.splitext(self.path)
+        return f"{root}_{part + 1:02d}{extension}"
+
+    def _part_starts(self, total_pages):
+        if isinstance(self.split, int):
+            return list(range(0, total_pages, max(1, self.split)))
+        return sorted(set(self.split) | {0})
+
+    def finalize(self, records, processed_pages, total_pages):
+        if not self.split or processed_pages is None:
+            header, footer = self.render(_CONTENT_MARKER, processed_pages, total_pages).split(
+                _CONTENT_MARKER
+            )
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(header)
+                for record in records:
+                    f.write(record["html"])
+                f.write(footer)
+            os.replace(temp_path, self.path)
+            return
+
+        starts = self._part_starts(total_pages)
+        page_files = {
+            page_num: os.path.basename(self.part_path(bisect.bisect_right(starts, page_num) - 1))
+            for page_num in processed_pages
+        }
+        header, footer = self.render(
+            _CONTENT_MARKER, processed_pages, total_pages, page_files
+        ).split(_CONTENT_MARKER)
+
+        # As páginas chegam em ordem: cada parte é aberta na sua primeira
+        # página e fechada quando a seguinte começa
+        part, f, written = None, None, []
+        try:
+            for record in records:
+                page_part = bisect.bisect_right(starts, record["page"] - 1) - 1
+                if page_part != part:
+                    if f is not None:
+                        f.write(footer)
+                        f.close()
+                    part = page_part
+                    f = open(self.part_path(part) + ".tmp", "w", encoding="utf-8")
+                    written.append(self.part_path(part))
+                    f.write(header)
+                f.write(record["html"])
+            if f is None:
+                f = open(self.path + ".tmp", "w", encoding="utf-8")
+                written.append(self.path)
+                f.write(header)
+            f.write(footer)
+        finally:
+            if f is not None:
+                f.close()
+        for path in written:
+            os.replace(path + ".tmp", path)
+
+
+# Sufixo do arquivo de cada formato, após o nome base do documento
+OUTPUT_SUFFIXES = {
+    "html": "_processado.html",
+    "jsonl": "_paginas.jsonl",
+    "markdown": "_processado.md",
+}
+
+
+def create_writers(formats, output_base, render_html, html_split=None):
+    """
+    Cria os writers de um documento: formats contém nomes de OUTPUT_SUFFIXES
+    ou funções que recebem o nome base dos arquivos e devolvem um
+    OutputWriter (formatos personalizados); html_split é o split do
+    HtmlWriter
+    """
+    writers = []
+    for output_format in formats:
+        if callable(output_format):
+            writers.append(output_format(output_base))
+        elif output_format == "html":
+            writers.append(
+                HtmlWriter(output_base + OUTPUT_SUFFIXES["html"], render_html, html_split)
+            )
+        elif output_format == "jsonl":
+            writers.append(JsonlWriter(output_base + OUTPUT_SUFFIXES["jsonl"]))
+        elif output_format == "markdown":
+            writers.append(MarkdownWriter(output_base + OUTPUT_SUFFIXES["markdown"]))
+        else:
+            raise ValueError(f"Formato de saída desconhecido: {output_format}")
+    return writers